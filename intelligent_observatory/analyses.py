@@ -0,0 +1,191 @@
+import os
+import pickle
+import pandas as pd
+import numpy as np
+from datetime import datetime
+from config import Config
+from metrics import timed
+from features import POSITIVE_WORDS, NEGATIVE_WORDS, score_sentiment, extract_features, blocked_correlation, correlation_result
+
+# 数据分析方法实现（由 analysis_registry 在第一次使用时导入）
+
+def records_to_dataframe(items):
+    """将爬取数据记录转换为DataFrame"""
+    return pd.DataFrame([{
+        'id': item.id,
+        'title': item.title,
+        'content': item.content,
+        'url': item.url,
+        'metadata': item.metadata_dict,
+        'crawled_at': item.crawled_at
+    } for item in items])
+
+def iter_dataframes(query, chunk_size):
+    """按块流式读取查询结果，每次产出一个DataFrame"""
+    for batch in query.iter_batches(chunk_size):
+        yield records_to_dataframe(batch)
+
+@timed('analysis_duration_seconds', analysis='basic_stats')
+def basic_statistics(df, params):
+    """基础统计分析"""
+    result = {
+        'summary': df.describe(include='all').to_dict(),
+        'total_records': len(df),
+        'columns': list(df.columns),
+        'null_values': df.isnull().sum().to_dict(),
+        'data_types': df.dtypes.astype(str).to_dict()
+    }
+    
+    return result
+
+@timed('analysis_duration_seconds', analysis='text_analysis')
+def text_analysis(df, params):
+    """文本分析"""
+    from sklearn.feature_extraction.text import CountVectorizer
+    
+    # 文本长度统计
+    df['title_length'] = df['title'].str.len()
+    df['content_length'] = df['content'].str.len()
+    df['word_count'] = df['content'].str.split().str.len()
+    
+    # 最常见的词语
+    text_column = params.get('text_column', 'content')
+    n_words = params.get('n_words', 20)
+    
+    # 提取关键词
+    vectorizer = CountVectorizer(stop_words='english' if params.get('language') == 'english' else None, max_features=n_words)
+    X = vectorizer.fit_transform(df[text_column].fillna(''))
+    word_counts = np.asarray(X.sum(axis=0)).ravel()
+    word_list = vectorizer.get_feature_names_out()
+    
+    # 构建词频字典
+    word_frequency = {word_list[i]: int(word_counts[i]) for i in range(len(word_list))}
+    word_frequency = dict(sorted(word_frequency.items(), key=lambda x: x[1], reverse=True))
+    
+    result = {
+        'text_statistics': {
+            'title_length': df['title_length'].describe().to_dict(),
+            'content_length': df['content_length'].describe().to_dict(),
+            'word_count': df['word_count'].describe().to_dict()
+        },
+        'most_common_words': word_frequency,
+        'total_unique_words': len(set(' '.join(df[text_column].fillna('')).split()))
+    }
+    
+    return result
+
+@timed('analysis_duration_seconds', analysis='sentiment_analysis')
+def sentiment_analysis(df, params):
+    """情感分析（简单实现）"""
+    # 简单的情感分析实现
+    positive_words = params.get('positive_words', POSITIVE_WORDS)
+    negative_words = params.get('negative_words', NEGATIVE_WORDS)
+    
+    # 分析标题和内容的情感
+    df['title_sentiment'] = df['title'].apply(score_sentiment, args=(positive_words, negative_words))
+    df['content_sentiment'] = df['content'].apply(score_sentiment, args=(positive_words, negative_words))
+    
+    # 计算情感分布
+    sentiment_distribution = {
+        'title_sentiment': df['title_sentiment'].value_counts().to_dict(),
+        'content_sentiment': df['content_sentiment'].value_counts().to_dict()
+    }
+    
+    result = {
+        'sentiment_distribution': sentiment_distribution,
+        'average_sentiment': {
+            'title': float(df['title_sentiment'].mean()),
+            'content': float(df['content_sentiment'].mean())
+        },
+        'sentiment_words': {
+            'positive': positive_words,
+            'negative': negative_words
+        }
+    }
+    
+    return result
+
+@timed('analysis_duration_seconds', analysis='machine_learning')
+def machine_learning_analysis(df, params):
+    """机器学习分析"""
+    from sklearn.model_selection import train_test_split
+    from sklearn.feature_extraction.text import CountVectorizer
+    from sklearn.naive_bayes import MultinomialNB
+    from sklearn.metrics import classification_report, confusion_matrix
+    
+    # 简单的分类示例
+    text_column = params.get('text_column', 'content')
+    target_column = params.get('target_column')
+    
+    if not target_column:
+        # 如果没有提供目标列，使用模拟的情感标签
+        def get_sample_label(text):
+            if len(text) > 500:
+                return 1  # 长文本
+            else:
+                return 0  # 短文本
+        
+        df['sample_label'] = df[text_column].apply(get_sample_label)
+        target_column = 'sample_label'
+    
+    # 准备数据
+    X = df[text_column].fillna('')
+    y = df[target_column]
+    
+    # 划分训练集和测试集
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    
+    # 特征提取
+    vectorizer = CountVectorizer(max_features=1000)
+    X_train_vec = vectorizer.fit_transform(X_train)
+    X_test_vec = vectorizer.transform(X_test)
+    
+    # 训练模型
+    model = MultinomialNB()
+    model.fit(X_train_vec, y_train)
+    
+    # 预测
+    y_pred = model.predict(X_test_vec)
+    
+    # 评估
+    report = classification_report(y_test, y_pred, output_dict=True)
+    confusion = confusion_matrix(y_test, y_pred).tolist()
+    
+    # 保存模型
+    model_filename = f'model_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pkl'
+    model_path = os.path.join(Config.DATA_STORAGE_PATH, model_filename)
+    
+    with open(model_path, 'wb') as f:
+        pickle.dump((model, vectorizer), f)
+    
+    result = {
+        'model_info': {
+            'type': 'Naive Bayes Classifier',
+            'features': X_train_vec.shape[1],
+            'training_samples': len(X_train),
+            'test_samples': len(X_test)
+        },
+        'classification_report': report,
+        'confusion_matrix': confusion,
+        'model_file': model_filename
+    }
+    
+    return result
+
+@timed('analysis_duration_seconds', analysis='correlation')
+def correlation_analysis(df, params):
+    """相关性分析"""
+    # 从元数据、文本长度、情感得分和时间提取数值特征
+    matrix, columns = extract_features(df, params)
+    
+    if len(columns) < 2:
+        return {
+            'error': '需要至少两列数值数据来进行相关性分析'
+        }
+    
+    # 按行分块计算相关系数
+    method = params.get('method', 'pearson')
+    block_size = int(params.get('block_size', 10000))
+    corr, n_samples = blocked_correlation(matrix, method, block_size)
+    
+    return correlation_result(corr, columns, n_samples, method, params)
@@ -0,0 +1,84 @@
+import importlib
+import importlib.util
+import threading
+
+class AnalysisSpec:
+    """分析类型描述
+
+    target / chunked 为 '模块:函数' 形式的路径，只在第一次使用时导入，
+    requires 列出该分析依赖的第三方包，用于在导入前检查是否可用。
+    """
+
+    def __init__(self, name, target, requires=(), label=None, chunked=None):
+        self.name = name
+        self.target = target
+        self.requires = tuple(requires)
+        self.label = label or name
+        self.chunked = chunked
+
+    def missing_dependencies(self):
+        """未安装的依赖包"""
+        return [package for package in self.requires if importlib.util.find_spec(package) is None]
+
+# 已注册的分析类型
+_registry = {}
+# 已导入的分析函数缓存
+_loaded = {}
+_lock = threading.Lock()
+
+def register_analysis(name, target, requires=(), label=None, chunked=None):
+    """注册分析类型（插件模块在导入时调用）"""
+    _registry[name] = AnalysisSpec(name, target, requires, label, chunked)
+    _loaded.pop(name, None)
+    _loaded.pop((name, 'chunked'), None)
+
+def get_analysis_spec(name):
+    """返回分析类型描述，未注册时返回None"""
+    return _registry.get(name)
+
+def available_analyses():
+    """依赖齐全、可以使用的分析类型列表"""
+    return [spec for spec in _registry.values() if not spec.missing_dependencies()]
+
+def _resolve(target):
+    """导入 '模块:函数' 并返回函数"""
+    module_name, _, attr = target.partition(':')
+    return getattr(importlib.import_module(module_name), attr)
+
+def load_analysis(name, chunked=False):
+    """返回分析函数，第一次调用时才导入实现模块及其依赖"""
+    key = (name, 'chunked') if chunked else name
+    func = _loaded.get(key)
+    if func is not None:
+        return func
+
+    spec = _registry.get(name)
+    if spec is None:
+        raise ValueError(f'不支持的分析类型: {name}')
+
+    target = spec.chunked if chunked else spec.target
+    if target is None:
+        raise ValueError(f'分析类型 {name} 不支持分块计算')
+
+    missing = spec.missing_dependencies()
+    if missing:
+        raise ValueError(f'分析类型 {name} 缺少依赖: {", ".join(missing)}')
+
+    with _lock:
+        func = _loaded.get(key)
+        if func is None:
+            func = _loaded[key] = _resolve(target)
+    return func
+
+def load_plugins(module_names):
+    """导入配置的插件模块，插件模块通过 register_analysis 注册自己的分析类型"""
+    for module_name in module_names:
+        importlib.import_module(module_name)
+
+# 内置分析类型
+register_analysis('basic_stats', 'analyses:basic_statistics', ('pandas',), '基础统计')
+register_analysis('text_analysis', 'analyses:text_analysis', ('pandas', 'numpy', 'sklearn'), '文本分析')
+register_analysis('sentiment_analysis', 'analyses:sentiment_analysis', ('pandas',), '情感分析')
+register_analysis('machine_learning', 'analyses:machine_learning_analysis', ('pandas', 'sklearn'), '机器学习')
+register_analysis('correlation', 'analyses:correlation_analysis', ('pandas', 'numpy'), '相关性分析',
+                  chunked='features:chunked_correlation')
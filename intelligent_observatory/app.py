@@ -1,8 +1,17 @@
 from flask import Flask, render_template, request, redirect, url_for, flash
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from config import config
-from models import db, User, init_db
+from models import db, User, init_db, upgrade_schema, backfill_promoted_metadata
+from metrics import init_metrics
+from db_routing import configure_engines
+from user_cache import user_cache, load_cached_user
+from analysis_registry import load_plugins
+from charts import chart_worker
+from resilience import circuit_breakers
+from replay import fixtures
 import os
+import time
+import click
 
 # 创建应用工厂函数
 def create_app(config_name='default'):
@@ -12,9 +21,13 @@ def create_app(config_name='default'):
     # 加载配置
     app.config.from_object(config[config_name])
     
-    # 初始化数据库
+    # 初始化数据库（连接池与只读副本）
+    configure_engines(app)
     db.init_app(app)
     
+    # 初始化性能监控
+    init_metrics(app)
+    
     # 创建数据存储目录
     if not os.path.exists(app.config['DATA_STORAGE_PATH']):
         os.makedirs(app.config['DATA_STORAGE_PATH'])
@@ -25,10 +38,24 @@ def create_app(config_name='default'):
     login_manager.login_view = 'auth.login'
     login_manager.login_message = '请先登录'
     
+    # 登录用户缓存
+    user_cache.configure(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+    
     @login_manager.user_loader
     def load_user(user_id):
-        """加载用户"""
-        return User.query.get(int(user_id))
+        """加载用户（优先使用进程内缓存）"""
+        return load_cached_user(int(user_id))
+    
+    # 后台图表渲染
+    chart_worker.configure(app.config['CHART_WORKERS'])
+    
+    # 数据源熔断器
+    circuit_breakers.configure(app.config['BREAKER_FAILURE_THRESHOLD'], app.config['BREAKER_RESET_TIMEOUT'],
+                               app.config['BREAKER_MAX_RESET_TIMEOUT'])
+    
+    # 爬虫请求录制与回放
+    fixtures.configure(app.config['CRAWL_FIXTURE_MODE'], app.config['DATA_STORAGE_PATH'],
+                       app.config['CRAWL_REPLAY_URL'], app.config['CRAWL_MAX_BYTES'])
     
     # 注册蓝图
     from auth import auth_bp
@@ -41,6 +68,67 @@ def create_app(config_name='default'):
     app.register_blueprint(crawler_bp, url_prefix='/crawler')
     app.register_blueprint(analyzer_bp, url_prefix='/analyzer')
     
+    # 加载分析插件
+    load_plugins(app.config['ANALYSIS_PLUGINS'])
+    
+    # 命令行：升级已有数据库（补齐新增的列和索引，并回填提升字段）
+    @app.cli.command('upgrade-db')
+    def upgrade_db_command():
+        """为已有数据库补齐新增的列和索引，并回填提升的元数据索引列"""
+        db.create_all()
+        for column in upgrade_schema():
+            print(f'已新增列 {column}')
+        updated = backfill_promoted_metadata()
+        print(f'已回填 {updated} 条数据')
+    
+    # 命令行：回填提升的元数据字段
+    @app.cli.command('backfill-metadata')
+    def backfill_metadata_command():
+        """为已有爬取数据回填提升的元数据索引列"""
+        updated = backfill_promoted_metadata()
+        print(f'已回填 {updated} 条数据')
+    
+    # 命令行：按保留策略归档冷数据
+    @app.cli.command('apply-retention')
+    def apply_retention_command():
+        """把超过保留期的爬取数据归档到 DATA_STORAGE_PATH/archive/ 并从数据库删除"""
+        from archive import apply_retention
+        results = apply_retention(app.config['DATA_STORAGE_PATH'], app.config['RETENTION_DAYS'],
+                                  app.config['ARCHIVE_FORMAT'])
+        for source_id, rows in results.items():
+            print(f'数据源 {source_id}: 归档 {rows} 条数据')
+    
+    # 命令行：定时爬取全部数据源
+    @app.cli.command('crawl-all')
+    @click.option('--interval', default=0, type=float, help='循环间隔（秒），0表示只执行一次')
+    def crawl_all_command(interval):
+        """依次爬取全部数据源，熔断中的数据源会被跳过"""
+        from crawler import crawl_all_sources
+        while True:
+            for source_id, status, saved in crawl_all_sources():
+                print(f'数据源 {source_id}: {status}，保存 {saved} 条数据')
+            if interval <= 0:
+                break
+            time.sleep(interval)
+    
+    # 命令行：回放服务器
+    @app.cli.command('replay-server')
+    @click.option('--host', default='127.0.0.1', help='监听地址')
+    @click.option('--port', default=8765, type=int, help='监听端口')
+    @click.option('--latency', default=0.0, type=float, help='每个响应的首字节延迟（秒）')
+    @click.option('--recorded-latency', is_flag=True, help='使用录制时的响应耗时作为延迟')
+    @click.option('--bandwidth', default=0, type=int, help='每个连接的带宽（字节/秒），0表示不限速')
+    def replay_server_command(host, port, latency, recorded_latency, bandwidth):
+        """按 DATA_STORAGE_PATH/fixtures/ 中的录制内容响应回放模式下的爬虫请求"""
+        from replay import FixtureStore, ReplayServer
+        server = ReplayServer(FixtureStore(app.config['DATA_STORAGE_PATH']), host, port, latency,
+                              bandwidth or None, recorded_latency)
+        print(f'回放服务器: {server.base_url}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.stop()
+    
     # 主页路由
     @app.route('/')
     def index():
@@ -67,8 +155,7 @@ if __name__ == '__main__':
     app = create_app('development')
     
     # 初始化数据库
-    with app.app_context():
-        db.create_all()
+    init_db(app)
     
     # 启动应用
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
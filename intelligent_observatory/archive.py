@@ -0,0 +1,321 @@
+import os
+import json
+import gzip
+import threading
+import importlib.util
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from models import db, DataSource, CrawledData
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# 冷数据归档：超过保留期的爬取数据按 数据源/月份 分区写入压缩文件，并从热表删除
+#
+# 目录结构：
+#   <DATA_STORAGE_PATH>/archive/manifest.json
+#   <DATA_STORAGE_PATH>/archive/source=<id>/<YYYY-MM>/part-<时间>.jsonl.gz 或 .parquet
+
+# 支持的归档格式 -> 文件扩展名
+ARCHIVE_FORMATS = {'jsonl': '.jsonl.gz', 'parquet': '.parquet'}
+
+# 归档文件中的字段
+ARCHIVE_FIELDS = ('id', 'source_id', 'title', 'content', 'url', 'metadata', 'crawled_at')
+
+# 清单的读-改-写在进程内由这把锁串行化，进程之间再用清单旁的文件锁串行化
+_manifest_lock = threading.Lock()
+
+def _lock_file(f):
+    """对打开的文件加排他锁（POSIX 使用 flock，Windows 使用 msvcrt.locking 锁第一个字节）"""
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            # LK_LOCK 重试约10秒后仍未拿到锁时抛出 OSError，继续等待
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_UN)
+        return
+    f.seek(0)
+    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def archive_dir(storage_path):
+    """归档根目录"""
+    return os.path.join(os.path.abspath(storage_path), 'archive')
+
+def _month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def _next_month(value):
+    return (value.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+class ArchiveManifest:
+    """归档清单：记录每个分区文件的数据源、月份、行数、id和时间范围
+
+    清单写入时先写临时文件再替换，读取方看到的总是完整的清单。
+    多个实例、多个线程或进程同时追加时，读-改-写在模块锁和文件锁内完成，不会丢失记录。
+    """
+
+    def __init__(self, storage_path):
+        self.root = archive_dir(storage_path)
+        self.path = os.path.join(self.root, 'manifest.json')
+        self.lock_path = f'{self.path}.lock'
+
+    def load(self):
+        """读取清单，不存在时返回空清单"""
+        if not os.path.exists(self.path):
+            return {'version': 1, 'partitions': []}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def add(self, entry):
+        """追加一个分区记录"""
+        os.makedirs(self.root, exist_ok=True)
+        with _manifest_lock, open(self.lock_path, 'a') as lock_file:
+            _lock_file(lock_file)
+            try:
+                manifest = self.load()
+                manifest['partitions'].append(entry)
+                tmp_path = f'{self.path}.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(manifest, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, self.path)
+            finally:
+                _unlock_file(lock_file)
+
+    def contains(self, path):
+        """清单中是否已登记该分区文件（相对路径）"""
+        return any(entry['path'] == path for entry in self.load()['partitions'])
+
+    def partitions(self, source_ids=None, start=None, end=None):
+        """按数据源和时间范围筛选分区（分区裁剪）"""
+        selected = []
+        for entry in self.load()['partitions']:
+            if source_ids and entry['source_id'] not in source_ids:
+                continue
+            if start is not None and datetime.fromisoformat(entry['max_crawled_at']) < start:
+                continue
+            if end is not None and datetime.fromisoformat(entry['min_crawled_at']) >= end:
+                continue
+            selected.append(entry)
+        return selected
+
+    def summary(self):
+        """按数据源汇总归档行数和分区数"""
+        totals = {}
+        for entry in self.load()['partitions']:
+            item = totals.setdefault(entry['source_id'], {'partitions': 0, 'rows': 0, 'bytes': 0})
+            item['partitions'] += 1
+            item['rows'] += entry['rows']
+            item['bytes'] += entry['bytes']
+        return totals
+
+def _require_format(fmt):
+    """检查归档格式及其依赖"""
+    if fmt not in ARCHIVE_FORMATS:
+        raise ValueError(f'不支持的归档格式: {fmt}')
+    if fmt == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+        raise Exception('Parquet归档需要安装pyarrow')
+
+class _JsonlWriter:
+    """逐行写入gzip压缩的JSON Lines"""
+
+    def __init__(self, path):
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+
+    def write(self, rows):
+        for row in rows:
+            row = dict(row, crawled_at=row['crawled_at'].isoformat())
+            self._file.write(json.dumps(row, ensure_ascii=False))
+            self._file.write('\n')
+
+    def close(self):
+        self._file.close()
+
+class _ParquetWriter:
+    """按批写入Parquet行组"""
+
+    def __init__(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa = pa
+        self._schema = pa.schema([
+            ('id', pa.int64()), ('source_id', pa.int64()), ('title', pa.string()), ('content', pa.string()),
+            ('url', pa.string()), ('metadata', pa.string()), ('crawled_at', pa.timestamp('us'))
+        ])
+        self._writer = pq.ParquetWriter(path, self._schema, compression='zstd')
+
+    def write(self, rows):
+        columns = {field: [row[field] for row in rows] for field in ARCHIVE_FIELDS}
+        columns['metadata'] = [json.dumps(m, ensure_ascii=False) for m in columns['metadata']]
+        self._writer.write_table(self._pa.table(columns, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+def _open_writer(path, fmt):
+    return _ParquetWriter(path) if fmt == 'parquet' else _JsonlWriter(path)
+
+def read_partition(root, entry):
+    """逐行读取分区文件，产出与 ARCHIVE_FIELDS 对应的字典"""
+    path = os.path.join(root, entry['path'])
+    if entry['format'] == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches():
+            for row in batch.to_pylist():
+                row['metadata'] = json.loads(row['metadata']) if row['metadata'] else {}
+                yield row
+        return
+
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            row = json.loads(line)
+            row['crawled_at'] = datetime.fromisoformat(row['crawled_at'])
+            yield row
+
+def archived_record(row):
+    """把归档行还原为不属于任何会话的 CrawledData 对象，供分析方法使用"""
+    item = CrawledData(
+        id=row['id'],
+        source_id=row['source_id'],
+        title=row['title'],
+        content=row['content'],
+        url=row['url'],
+        meta_data=row['metadata'],
+        crawled_at=row['crawled_at'],
+        content_length=len(row['content']) if row['content'] else 0
+    )
+    item.sync_promoted_metadata()
+    return item
+
+def _row_dict(row):
+    row = {field: getattr(row, field) for field in ARCHIVE_FIELDS}
+    # 兼容以JSON字符串保存的旧数据
+    if isinstance(row['metadata'], str):
+        row['metadata'] = json.loads(row['metadata'])
+    return row
+
+def archive_source(source_id, cutoff, storage_path, fmt='jsonl', batch_size=5000):
+    """把数据源中 crawled_at 早于 cutoff 的数据按月归档，返回归档行数
+
+    每个月份分区先完整写入文件并登记到清单，重新读取清单确认登记成功后再按id从热表删除。
+    若在删除前中断，重新执行会产生重复的分区，读取归档时按id去重。
+    """
+    _require_format(fmt)
+    manifest = ArchiveManifest(storage_path)
+    table = CrawledData.__table__
+    columns = [table.c.id, table.c.source_id, table.c.title, table.c.content, table.c.url,
+               table.c.metadata, table.c.crawled_at]
+    archived = 0
+
+    while True:
+        # 下一个有待归档数据的月份（走 source_id + crawled_at 组合索引）
+        first = db.session.query(func.min(CrawledData.crawled_at))\
+                          .filter(CrawledData.source_id == source_id, CrawledData.crawled_at < cutoff)\
+                          .scalar()
+        if first is None:
+            break
+        month_start = _month_start(first)
+        month_end = min(_next_month(month_start), cutoff)
+        month = month_start.strftime('%Y-%m')
+
+        relative_path = os.path.join(f'source={source_id}', month,
+                                     f'part-{datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")}{ARCHIVE_FORMATS[fmt]}')
+        path = os.path.join(manifest.root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        statement = select(*columns).where(table.c.source_id == source_id,
+                                           table.c.crawled_at >= month_start,
+                                           table.c.crawled_at < month_end).order_by(table.c.id)
+        ids = []
+        min_crawled_at = max_crawled_at = None
+        writer = _open_writer(f'{path}.tmp', fmt)
+        try:
+            for partition in db.session.execute(statement).yield_per(batch_size).partitions():
+                rows = [_row_dict(row) for row in partition]
+                writer.write(rows)
+                for row in rows:
+                    ids.append(row['id'])
+                    if min_crawled_at is None or row['crawled_at'] < min_crawled_at:
+                        min_crawled_at = row['crawled_at']
+                    if max_crawled_at is None or row['crawled_at'] > max_crawled_at:
+                        max_crawled_at = row['crawled_at']
+        finally:
+            writer.close()
+        os.replace(f'{path}.tmp', path)
+
+        manifest.add({
+            'path': relative_path,
+            'source_id': source_id,
+            'month': month,
+            'format': fmt,
+            'rows': len(ids),
+            'bytes': os.path.getsize(path),
+            'min_id': min(ids),
+            'max_id': max(ids),
+            'min_crawled_at': min_crawled_at.isoformat(),
+            'max_crawled_at': max_crawled_at.isoformat(),
+            'created_at': datetime.utcnow().isoformat()
+        })
+        if not manifest.contains(relative_path):
+            raise RuntimeError(f'归档分区未登记到清单，未删除热数据: {relative_path}')
+
+        for start in range(0, len(ids), batch_size):
+            db.session.execute(table.delete().where(table.c.id.in_(ids[start:start + batch_size])))
+            db.session.commit()
+        archived += len(ids)
+
+    return archived
+
+def retention_days(source, default_days):
+    """数据源的保留天数：数据源配置中的 retention_days 优先，0或空表示不归档"""
+    try:
+        config = json.loads(source.config) if source.config else {}
+    except ValueError:
+        config = {}
+    days = config.get('retention_days', default_days)
+    return int(days) if days else 0
+
+def apply_retention(storage_path, default_days=0, fmt='jsonl', now=None, batch_size=5000):
+    """对所有数据源执行保留策略，返回 {数据源id: 归档行数}"""
+    now = now or datetime.utcnow()
+    results = {}
+    for source in DataSource.query.order_by(DataSource.id).all():
+        days = retention_days(source, default_days)
+        if days <= 0:
+            continue
+        results[source.id] = archive_source(source.id, now - timedelta(days=days), storage_path, fmt, batch_size)
+    return results
+
+def iter_archived_records(storage_path, source_ids=None, start=None, end=None):
+    """读取时间范围内的归档记录（按清单裁剪分区，按id去重）
+
+    重复的记录只会出现在同一数据源、同一月份的分区之间（归档中断后重新执行），
+    所以逐个 数据源/月份 去重，内存只与一个月份的行数有关，不随整个归档增长。
+    """
+    manifest = ArchiveManifest(storage_path)
+    groups = {}
+    for entry in manifest.partitions(source_ids, start, end):
+        groups.setdefault((entry['source_id'], entry['month']), []).append(entry)
+    for entries in groups.values():
+        seen = set()
+        for entry in entries:
+            for row in read_partition(manifest.root, entry):
+                if row['id'] in seen:
+                    continue
+                if start is not None and row['crawled_at'] < start:
+                    continue
+                if end is not None and row['crawled_at'] >= end:
+                    continue
+                seen.add(row['id'])
+                yield archived_record(row)
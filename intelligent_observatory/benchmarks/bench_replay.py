@@ -0,0 +1,122 @@
+# 爬虫回放基准测试：按录制内容在本地回放服务器上重复爬取，测量爬取吞吐量（不需要网络）
+#
+# 先在录制模式下爬取一次（CRAWL_FIXTURE_MODE=record flask crawl-all），然后（在 intelligent_observatory 目录下）：
+#   python benchmarks/bench_replay.py --fixtures data --repeat 20
+#   python benchmarks/bench_replay.py --fixtures data --latency 0.2 --bandwidth 1048576 --concurrency 8
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, PROJECT_DIR)
+
+def replay_sources(store, source_ids=None):
+    """由录制文件中的数据源快照构造（不入库的）数据源对象"""
+    from models import DataSource
+    sources = []
+    for source_id in source_ids or store.source_ids():
+        snapshot, responses = store.load(source_id)
+        if snapshot is None or not responses:
+            continue
+        sources.append(DataSource(id=snapshot['id'], name=snapshot['name'], type=snapshot['source_type'],
+                                  url=snapshot['url'], config=json.dumps(snapshot['config'])))
+    return sources
+
+def main():
+    parser = argparse.ArgumentParser(description='爬虫回放基准测试')
+    parser.add_argument('--fixtures', required=True, help='录制时的 DATA_STORAGE_PATH（包含 fixtures/ 目录）')
+    parser.add_argument('--sources', help='只回放这些数据源（逗号分隔的id）')
+    parser.add_argument('--repeat', type=int, default=10, help='每个数据源的爬取次数')
+    parser.add_argument('--concurrency', type=int, default=1, help='同时爬取的线程数')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个响应的首字节延迟（秒）')
+    parser.add_argument('--recorded-latency', action='store_true', help='使用录制时的响应耗时作为延迟')
+    parser.add_argument('--bandwidth', type=int, default=0, help='每个连接的带宽（字节/秒），0表示不限速')
+    parser.add_argument('--unlimited', action='store_true', help='忽略主机限流配置，只测量爬取本身')
+    parser.add_argument('--output', help='结果JSON路径（默认 benchmarks/results/replay_<时间>.json）')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='observatory_replay_')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(work_dir, "bench.db")}'
+    os.environ['DATA_STORAGE_PATH'] = os.path.join(work_dir, 'data')
+
+    from app import create_app
+    from replay import FixtureStore, ReplayServer, fixtures
+    from crawler import crawl_source
+    from resilience import CrawlError
+
+    app = create_app('testing')
+    store = FixtureStore(args.fixtures)
+    source_ids = [int(s) for s in args.sources.split(',')] if args.sources else None
+    sources = replay_sources(store, source_ids)
+    if not sources:
+        print(f'{store.root} 中没有录制内容')
+        return
+    if args.unlimited:
+        for source in sources:
+            config = json.loads(source.config)
+            config['rate_limit'] = {'rate': 1e6, 'burst': 1000000, 'max_concurrency': 1000}
+            source.config = json.dumps(config)
+
+    results = {}
+    server = ReplayServer(store, latency=args.latency, bandwidth=args.bandwidth or None,
+                          recorded_latency=args.recorded_latency)
+    with app.app_context(), server:
+        fixtures.configure('replay', args.fixtures, server.base_url, app.config['CRAWL_MAX_BYTES'])
+
+        def crawl_once(source):
+            start = time.perf_counter()
+            try:
+                items, error = len(crawl_source(source)), None
+            except CrawlError as e:
+                items, error = len(e.partial_results), e.kind
+            return time.perf_counter() - start, items, error
+
+        for source in sources:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(args.concurrency) as pool:
+                runs = list(pool.map(crawl_once, [source] * args.repeat))
+            wall = time.perf_counter() - start
+
+            times = [t for t, _, _ in runs]
+            items = sum(n for _, n, _ in runs)
+            errors = [e for _, _, e in runs if e]
+            results[str(source.id)] = {
+                'name': source.name,
+                'type': source.type,
+                'runs': args.repeat,
+                'items': items,
+                'errors': len(errors),
+                'median': statistics.median(times),
+                'min': min(times),
+                'items_per_second': items / wall if wall else None
+            }
+            print(f'{source.id:>4} {source.name[:24]:<24} {source.type:<4} '
+                  f'中位数 {statistics.median(times) * 1000:>9.2f} ms  {items / wall:>10.1f} 条/秒'
+                  + (f'  失败 {len(errors)} 次（{errors[0]}）' if errors else ''))
+
+    output = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'repeat': args.repeat,
+            'concurrency': args.concurrency,
+            'latency': 'recorded' if args.recorded_latency else args.latency,
+            'bandwidth': args.bandwidth,
+            'unlimited': args.unlimited
+        },
+        'results': results
+    }
+    output_path = args.output or os.path.join(BENCH_DIR, 'results', f'replay_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+    print(f'结果已保存: {output_path}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+# 启动耗时基准：在独立子进程中测量 create_app 的导入与初始化耗时、峰值内存以及加载了哪些重量级模块
+#
+# 用法（在 intelligent_observatory 目录下）：
+#   python benchmarks/bench_startup.py --repeat 10
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+
+# 轻量进程不应加载的模块
+HEAVY_MODULES = ['pandas', 'numpy', 'sklearn', 'matplotlib', 'seaborn', 'scipy']
+
+# 子进程中执行的测量代码
+CHILD_CODE = '''
+import sys, time, json, resource
+start = time.perf_counter()
+from app import create_app
+app = create_app('testing')
+elapsed = time.perf_counter() - start
+analysis_elapsed = None
+if {load_analysis!r}:
+    from analysis_registry import load_analysis
+    start = time.perf_counter()
+    load_analysis({load_analysis!r})
+    analysis_elapsed = time.perf_counter() - start
+print(json.dumps({{
+    'startup': elapsed,
+    'first_analysis': analysis_elapsed,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'heavy_modules': [m for m in {heavy!r} if m in sys.modules]
+}}))
+'''
+
+def run_child(load_analysis, env):
+    """在全新的Python进程中测量一次"""
+    code = CHILD_CODE.format(load_analysis=load_analysis, heavy=HEAVY_MODULES)
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=PROJECT_DIR, env=env)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description='应用启动耗时基准')
+    parser.add_argument('--repeat', type=int, default=5, help='重复次数')
+    parser.add_argument('--analysis', default='correlation', help='测量首次加载该分析类型的耗时')
+    parser.add_argument('--output', help='结果JSON路径（默认 benchmarks/results/startup_<时间>.json）')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='observatory_startup_')
+    env = dict(os.environ)
+    env['DATABASE_URL'] = f'sqlite:///{os.path.join(work_dir, "startup.db")}'
+    env['DATA_STORAGE_PATH'] = os.path.join(work_dir, 'data')
+
+    runs = [run_child(None, env) for _ in range(args.repeat)]
+    analysis_runs = [run_child(args.analysis, env) for _ in range(args.repeat)]
+
+    startup = [r['startup'] for r in runs]
+    first_analysis = [r['first_analysis'] for r in analysis_runs]
+    results = {
+        'startup': {
+            'median': statistics.median(startup),
+            'min': min(startup),
+            'max': max(startup),
+            'max_rss_mb': max(r['max_rss_mb'] for r in runs),
+            'heavy_modules': runs[-1]['heavy_modules']
+        },
+        'first_analysis': {
+            'analysis': args.analysis,
+            'median': statistics.median(first_analysis),
+            'min': min(first_analysis),
+            'max': max(first_analysis),
+            'max_rss_mb': max(r['max_rss_mb'] for r in analysis_runs),
+            'heavy_modules': analysis_runs[-1]['heavy_modules']
+        }
+    }
+
+    print(f'create_app 启动耗时（中位数）: {results["startup"]["median"] * 1000:.1f} ms，'
+          f'峰值内存 {results["startup"]["max_rss_mb"]:.1f} MB，'
+          f'已加载重量级模块: {results["startup"]["heavy_modules"] or "无"}')
+    print(f'首次加载 {args.analysis}（中位数）: {results["first_analysis"]["median"] * 1000:.1f} ms，'
+          f'峰值内存 {results["first_analysis"]["max_rss_mb"]:.1f} MB')
+
+    output = {
+        'meta': {'timestamp': datetime.now().isoformat(), 'python': sys.version.split()[0], 'repeat': args.repeat},
+        'results': results
+    }
+    output_path = args.output or os.path.join(BENCH_DIR, 'results', f'startup_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+    print(f'结果已保存: {output_path}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# 登录用户缓存负载测试：对比开启/关闭缓存时每个已登录请求的SQL数量和耗时
+#
+# 用法（在 intelligent_observatory 目录下）：
+#   python benchmarks/bench_user_cache.py --requests 2000
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import tempfile
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, PROJECT_DIR)
+
+def run_load(app, n_requests):
+    """登录后连续请求一个需要登录的轻量接口，返回每请求SQL数量和耗时"""
+    client = app.test_client()
+    client.post('/auth/login', data={'username': 'bench', 'password': 'bench-password'})
+
+    queries = []
+    latencies = []
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        response = client.get('/bench/ping')
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+        queries.append(int(response.headers['X-Query-Count']))
+
+    return {
+        'requests': n_requests,
+        'queries_per_request': statistics.mean(queries),
+        'latency_median_ms': statistics.median(latencies) * 1000,
+        'latency_p95_ms': sorted(latencies)[int(len(latencies) * 0.95) - 1] * 1000
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='登录用户缓存负载测试')
+    parser.add_argument('--requests', type=int, default=1000, help='每种配置的请求数')
+    parser.add_argument('--output', help='结果JSON路径（默认 benchmarks/results/user_cache_<时间>.json）')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='observatory_user_cache_')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(work_dir, "bench.db")}'
+    os.environ['DATA_STORAGE_PATH'] = os.path.join(work_dir, 'data')
+
+    from flask_login import login_required
+    from app import create_app
+    from models import db, User
+    from metrics import registry
+    from user_cache import user_cache
+
+    app = create_app('testing')
+
+    @app.route('/bench/ping')
+    @login_required
+    def bench_ping():
+        return 'ok'
+
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench')
+        user.password = 'bench-password'
+        db.session.add(user)
+        db.session.commit()
+
+    results = {}
+    for label, ttl in (('without_cache', 0), ('with_cache', 300)):
+        registry.reset()
+        user_cache.configure(app.config['USER_CACHE_SIZE'], ttl)
+        results[label] = run_load(app, args.requests)
+        results[label]['cache_hits'] = registry.get('user_cache_hits_total')
+        results[label]['cache_misses'] = registry.get('user_cache_misses_total')
+        print(f'{label:<16} 每请求SQL {results[label]["queries_per_request"]:.2f}，'
+              f'耗时中位数 {results[label]["latency_median_ms"]:.2f} ms，p95 {results[label]["latency_p95_ms"]:.2f} ms，'
+              f'命中 {results[label]["cache_hits"]} / 未命中 {results[label]["cache_misses"]}')
+
+    output = {'meta': {'timestamp': datetime.now().isoformat(), 'requests': args.requests}, 'results': results}
+    output_path = args.output or os.path.join(BENCH_DIR, 'results', f'user_cache_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+    print(f'结果已保存: {output_path}')
+
+if __name__ == '__main__':
+    main()
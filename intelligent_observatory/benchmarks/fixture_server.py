@@ -0,0 +1,73 @@
+# 本地样本HTTP服务器：为爬虫基准测试提供固定的网页和API响应
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class FixtureServer:
+    """在后台线程运行的本地HTTP服务器
+
+    routes 为 {路径: (content_type, bytes)}，未登记的路径返回404。
+    """
+
+    def __init__(self, routes, host='127.0.0.1', port=0):
+        self.routes = routes
+        handler = self._make_handler()
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _make_handler(self):
+        routes = self.routes
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self):
+                path = self.path.split('?', 1)[0]
+                if path not in routes:
+                    self.send_error(404)
+                    return
+                content_type, body = routes[path]
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._respond()
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                self.rfile.read(length)
+                self._respond()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def json_route(payload):
+    """JSON响应"""
+    return ('application/json', json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+
+def html_route(html):
+    """HTML响应"""
+    return ('text/html; charset=utf-8', html.encode('utf-8'))
@@ -0,0 +1,196 @@
+# 基准测试：在SQLite和本地样本HTTP服务器上测量爬取、入库、分析和仪表盘查询的耗时
+#
+# 用法（在 intelligent_observatory 目录下）：
+#   python benchmarks/run_benchmarks.py --rows 100000
+#   python benchmarks/run_benchmarks.py --rows 10000000 --db /tmp/bench.db --reuse
+#   python benchmarks/run_benchmarks.py --compare benchmarks/results/baseline.json
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+import subprocess
+import tempfile
+import warnings
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, PROJECT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+ANALYSIS_TYPES = ['basic_stats', 'text_analysis', 'sentiment_analysis', 'machine_learning', 'correlation']
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='智能瞭望系统基准测试')
+    parser.add_argument('--rows', type=int, default=10000, help='合成爬取数据行数（1万~1000万）')
+    parser.add_argument('--sources', type=int, default=30, help='合成数据源数量')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--repeat', type=int, default=5, help='每项重复次数')
+    parser.add_argument('--crawl-items', type=int, default=1000, help='网页/API/文件样本条数')
+    parser.add_argument('--analysis-rows', type=int, default=20000, help='分析基准使用的采样行数')
+    parser.add_argument('--db', help='SQLite数据库文件（默认使用临时文件）')
+    parser.add_argument('--reuse', action='store_true', help='数据库已存在时复用，不重新生成数据')
+    parser.add_argument('--only', help='只运行名称包含该字符串的基准项')
+    parser.add_argument('--output', help='结果JSON路径（默认 benchmarks/results/<时间>.json）')
+    parser.add_argument('--compare', help='与之前的结果JSON对比')
+    return parser.parse_args()
+
+def measure(func, repeat):
+    """重复执行并返回每次耗时和最后一次返回值"""
+    times = []
+    value = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        times.append(time.perf_counter() - start)
+    return times, value
+
+def summarize(times, items):
+    """汇总耗时统计"""
+    median = statistics.median(times)
+    return {
+        'repeat': len(times),
+        'min': min(times),
+        'median': median,
+        'mean': statistics.mean(times),
+        'max': max(times),
+        'items': items,
+        'items_per_second': items / median if items and median > 0 else None
+    }
+
+def git_revision():
+    """当前git提交"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_path):
+    """打印与基线结果的中位数对比"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+
+    print(f'\n与基线对比: {baseline_path}')
+    print(f'{"基准项":<32}{"基线(ms)":>12}{"本次(ms)":>12}{"变化":>10}')
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]['median'] * 1000
+        new = result['median'] * 1000
+        change = (new - old) / old * 100 if old else 0
+        print(f'{name:<32}{old:>12.2f}{new:>12.2f}{change:>+9.1f}%')
+
+def main():
+    args = parse_args()
+    warnings.filterwarnings('ignore')
+    work_dir = tempfile.mkdtemp(prefix='observatory_bench_')
+    db_path = os.path.abspath(args.db or os.path.join(work_dir, 'bench.db'))
+    reuse = args.reuse and os.path.exists(db_path)
+
+    # 必须在导入config之前设置
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['DATA_STORAGE_PATH'] = os.path.join(work_dir, 'data')
+
+    from app import create_app
+    from models import db, DataSource, CrawledData
+    from queries import AnalysisQuery
+    from crawler import crawl_web, crawl_api, crawl_file, save_crawled_data
+    from analyses import records_to_dataframe
+    from analysis_registry import load_analysis
+    from dashboard import get_dashboard_context, get_stats_context
+    from fixture_server import FixtureServer, html_route, json_route
+    import synthetic
+
+    app = create_app('testing')
+    results = {}
+
+    def run(name, func, items=None):
+        if args.only and args.only not in name:
+            return
+        times, value = measure(func, args.repeat)
+        count = items if items is not None else (len(value) if hasattr(value, '__len__') else None)
+        results[name] = summarize(times, count)
+        print(f'{name:<32}{results[name]["median"] * 1000:>10.2f} ms')
+
+    with app.app_context():
+        # 生成数据
+        if not reuse:
+            db.create_all()
+            start = time.perf_counter()
+            sources = synthetic.generate_sources(db, DataSource, args.sources, args.seed)
+            synthetic.generate_crawled_data(db, CrawledData, sources, args.rows, args.seed)
+            print(f'生成 {args.rows} 行数据用时 {time.perf_counter() - start:.1f}s')
+        source = DataSource.query.first()
+
+        # 爬取
+        routes = {
+            '/page': html_route(synthetic.generate_html(args.crawl_items, args.seed)),
+            '/api': json_route(synthetic.generate_api_payload(args.crawl_items, args.seed))
+        }
+        csv_path, json_path = synthetic.write_fixture_files(os.path.join(work_dir, 'files'), args.crawl_items, args.seed)
+
+        with FixtureServer(routes) as server:
+            web_source = DataSource(id=0, name='bench-web', type='web', url=server.base_url + '/page')
+            api_source = DataSource(id=0, name='bench-api', type='api', url=server.base_url + '/api')
+            web_config = {'selector': '.article', 'title_selector': 'h2', 'content_selector': '.content'}
+            api_config = {'items_key': 'data.items', 'title_path': 'title', 'content_path': 'description'}
+            run('crawl_web', lambda: crawl_web(web_source, web_config))
+            run('crawl_api', lambda: crawl_api(api_source, api_config))
+
+        file_source = DataSource(id=0, name='bench-file', type='file', url=csv_path)
+        run('crawl_file_csv', lambda: crawl_file(file_source, {'file_path': csv_path, 'file_type': 'csv',
+                                                               'title_column': 'title', 'content_column': 'content'}))
+        run('crawl_file_json', lambda: crawl_file(file_source, {'file_path': json_path, 'file_type': 'json',
+                                                                'title_path': 'title', 'content_path': 'content'}))
+
+        # 入库
+        crawl_results = synthetic.generate_results(args.crawl_items, args.seed)
+        run('save_crawled_data', lambda: save_crawled_data(source, crawl_results), args.crawl_items)
+
+        # 分析
+        query = AnalysisQuery(sample_size=args.analysis_rows, seed=args.seed)
+        run('analysis_load', lambda: records_to_dataframe(query.all()))
+        df = records_to_dataframe(query.all())
+        for analysis_type in ANALYSIS_TYPES:
+            func = load_analysis(analysis_type)
+            run(f'analysis_{analysis_type}', lambda: func(df.copy(), {}), len(df))
+
+        # 仪表盘与范围查询
+        run('dashboard_index', get_dashboard_context, 1)
+        run('dashboard_stats', get_stats_context, 1)
+        source_ids = [s.id for s in DataSource.query.limit(3).all()]
+        run('query_recent_7_days', lambda: AnalysisQuery.from_params({'days': 7}, source_ids).compile().count(), 1)
+
+        total_rows = CrawledData.query.count()
+
+    output = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'rows': total_rows,
+            'sources': args.sources,
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'crawl_items': args.crawl_items,
+            'analysis_rows': args.analysis_rows
+        },
+        'results': results
+    }
+
+    output_path = args.output or os.path.join(BENCH_DIR, 'results', f'{datetime.now().strftime("%Y%m%d_%H%M%S")}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+    print(f'\n结果已保存: {output_path}')
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+# 合成数据生成器：按指定规模生成 DataSource / CrawledData 以及爬虫用的网页、API、文件样本
+import os
+import csv
+import json
+import random
+from datetime import datetime, timedelta
+
+# 中英文混合词库
+CHINESE_WORDS = ['数据', '分析', '系统', '平台', '智能', '网络', '信息', '技术', '发展', '市场',
+                 '用户', '服务', '产品', '研究', '政策', '经济', '农业', '科学', '教育', '管理']
+ENGLISH_WORDS = ['data', 'analysis', 'system', 'platform', 'network', 'model', 'market', 'user',
+                 'service', 'product', 'research', 'policy', 'report', 'science', 'update', 'release']
+SENTIMENT_WORDS = ['好', '优秀', '成功', '满意', '坏', '差', '失败', 'good', 'great', 'bad', 'poor', 'terrible']
+
+SOURCE_TYPES = ['web', 'api', 'file']
+
+def random_text(rng, min_words, max_words):
+    """生成一段中英文混合文本"""
+    words = []
+    for _ in range(rng.randint(min_words, max_words)):
+        r = rng.random()
+        if r < 0.5:
+            words.append(rng.choice(CHINESE_WORDS))
+        elif r < 0.95:
+            words.append(rng.choice(ENGLISH_WORDS))
+        else:
+            words.append(rng.choice(SENTIMENT_WORDS))
+    return ' '.join(words)
+
+def random_metadata(rng, source_type, crawled_at):
+    """生成与爬虫输出格式一致的元数据"""
+    metadata = {'source_type': source_type, 'crawled_at': crawled_at.isoformat()}
+    if source_type == 'web':
+        metadata['selector'] = '.article'
+    elif source_type == 'api':
+        metadata['method'] = rng.choice(['GET', 'POST'])
+        metadata['response_status'] = rng.choice([200, 200, 200, 201, 404, 500])
+    else:
+        metadata['file_type'] = rng.choice(['csv', 'json'])
+        metadata['file_path'] = f'/data/files/{rng.randint(1, 50)}.{metadata["file_type"]}'
+    return metadata
+
+def generate_sources(db, DataSource, n_sources, seed=0):
+    """生成数据源，返回 [(id, type), ...]"""
+    rng = random.Random(seed)
+    sources = []
+    for i in range(n_sources):
+        source_type = SOURCE_TYPES[i % len(SOURCE_TYPES)]
+        source = DataSource(
+            name=f'合成数据源 {i + 1} {rng.choice(ENGLISH_WORDS)}',
+            type=source_type,
+            url=f'http://example.com/{source_type}/{i + 1}',
+            config='{}'
+        )
+        db.session.add(source)
+        sources.append(source)
+    db.session.commit()
+    return [(source.id, source.type) for source in sources]
+
+def generate_crawled_data(db, CrawledData, sources, n_rows, seed=0, days=365, batch_size=10000):
+    """批量生成爬取数据（Core批量插入，绕过ORM以支持千万级规模）
+
+    批量插入不会触发模型事件，提升字段和 content_length 在这里直接计算。
+    """
+    rng = random.Random(seed)
+    table = CrawledData.__table__
+    end = datetime.utcnow()
+    inserted = 0
+
+    while inserted < n_rows:
+        rows = []
+        for _ in range(min(batch_size, n_rows - inserted)):
+            source_id, source_type = rng.choice(sources)
+            crawled_at = end - timedelta(seconds=rng.randint(0, days * 86400))
+            content = random_text(rng, 20, 300)
+            metadata = random_metadata(rng, source_type, crawled_at)
+            rows.append({
+                'source_id': source_id,
+                'title': random_text(rng, 2, 8)[:200],
+                'content': content,
+                'url': f'http://example.com/item/{inserted + len(rows)}',
+                'metadata': metadata,
+                'crawled_at': crawled_at,
+                'content_length': len(content),
+                'meta_source_type': source_type,
+                'meta_file_path': metadata.get('file_path'),
+                'meta_file_type': metadata.get('file_type')
+            })
+        db.session.execute(table.insert(), rows)
+        db.session.commit()
+        inserted += len(rows)
+
+    return inserted
+
+def generate_results(n_items, seed=0):
+    """生成 save_crawled_data 使用的爬取结果列表"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    return [{
+        'title': random_text(rng, 2, 8)[:200],
+        'content': random_text(rng, 20, 300),
+        'url': 'http://example.com/item',
+        'metadata': random_metadata(rng, 'api', now)
+    } for _ in range(n_items)]
+
+def generate_html(n_items, seed=0):
+    """生成包含 n_items 篇文章的网页"""
+    rng = random.Random(seed)
+    articles = []
+    for i in range(n_items):
+        articles.append(
+            f'<div class="article"><h2>{random_text(rng, 2, 8)}</h2>'
+            f'<p class="content">{random_text(rng, 20, 120)}</p></div>'
+        )
+    return f'<html><head><meta charset="utf-8"><title>bench</title></head><body>{"".join(articles)}</body></html>'
+
+def generate_api_payload(n_items, seed=0):
+    """生成API返回数据"""
+    rng = random.Random(seed)
+    items = [{'title': random_text(rng, 2, 8), 'description': random_text(rng, 20, 120), 'id': i}
+             for i in range(n_items)]
+    return {'data': {'items': items}}
+
+def write_fixture_files(directory, n_items, seed=0):
+    """生成CSV和JSON样本文件，返回 (csv_path, json_path)"""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    rows = [{'title': random_text(rng, 2, 8), 'content': random_text(rng, 20, 120)} for _ in range(n_items)]
+
+    csv_path = os.path.join(directory, 'items.csv')
+    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['title', 'content'])
+        writer.writeheader()
+        writer.writerows(rows)
+
+    json_path = os.path.join(directory, 'items.json')
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump({'items': rows}, f, ensure_ascii=False)
+
+    return csv_path, json_path
@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+registry.describe('chart_requests_total', 'counter', '图表请求数（按缓存命中情况）')
+registry.describe('chart_render_duration_seconds', 'histogram', '图表渲染耗时')
+registry.describe('chart_render_failures_total', 'counter', '图表渲染失败次数')
+
+# 支持的输出格式
+CHART_FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+# 图表参数默认值和取值范围
+CHART_PARAM_DEFAULTS = {'width': 8.0, 'height': 5.0, 'dpi': 100, 'top_n': 20}
+CHART_PARAM_LIMITS = {'width': (2.0, 20.0), 'height': (2.0, 20.0), 'dpi': (50, 300), 'top_n': (2, 100)}
+
+# 中文字体候选（按顺序回退）
+CHART_FONTS = ['SimHei', 'Microsoft YaHei', 'Noto Sans CJK SC', 'WenQuanYi Micro Hei', 'DejaVu Sans']
+
+def chart_params(args):
+    """从请求参数中取出图表参数，缺省或超出范围的值按默认值/边界处理"""
+    params = {}
+    for key, default in CHART_PARAM_DEFAULTS.items():
+        low, high = CHART_PARAM_LIMITS[key]
+        try:
+            value = type(default)(args.get(key, default))
+        except (TypeError, ValueError):
+            value = default
+        params[key] = min(max(value, low), high)
+    return params
+
+def chart_path(storage_path, result_id, params, fmt):
+    """图表缓存文件路径：<storage>/charts/<结果id>/<参数摘要>.<格式>"""
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(os.path.abspath(storage_path), 'charts', str(result_id), f'{digest}.{fmt}')
+
+def remove_charts(storage_path, result_id):
+    """删除分析结果的全部缓存图表"""
+    shutil.rmtree(os.path.join(os.path.abspath(storage_path), 'charts', str(result_id)), ignore_errors=True)
+
+_matplotlib_ready = False
+
+def _setup_matplotlib():
+    """第一次渲染时才导入matplotlib，并固定使用Agg后端"""
+    global _matplotlib_ready
+    if _matplotlib_ready:
+        return
+    import matplotlib
+    matplotlib.use('Agg')
+    matplotlib.rcParams['font.sans-serif'] = CHART_FONTS
+    matplotlib.rcParams['axes.unicode_minus'] = False
+    _matplotlib_ready = True
+
+def _sort_labels(labels):
+    """情感得分等数字标签按数值排序"""
+    try:
+        return sorted(labels, key=float)
+    except ValueError:
+        return sorted(labels)
+
+def render_basic_stats(fig, content, params):
+    """基础统计：各列缺失值数量"""
+    null_values = content.get('null_values', {})
+    ax = fig.add_subplot()
+    columns = list(null_values)
+    ax.bar(columns, [null_values[c] for c in columns], color='#4c72b0')
+    ax.set_title(f'缺失值（共 {content.get("total_records", 0)} 条记录）')
+    ax.set_ylabel('缺失数量')
+    ax.tick_params(axis='x', rotation=45)
+
+def render_text_analysis(fig, content, params):
+    """文本分析：高频词"""
+    words = list(content.get('most_common_words', {}).items())[:params['top_n']]
+    ax = fig.add_subplot()
+    ax.barh([w for w, _ in reversed(words)], [c for _, c in reversed(words)], color='#55a868')
+    ax.set_title('高频词')
+    ax.set_xlabel('出现次数')
+
+def render_sentiment_analysis(fig, content, params):
+    """情感分析：标题和内容的情感得分分布"""
+    distribution = content.get('sentiment_distribution', {})
+    for i, (key, title) in enumerate([('title_sentiment', '标题情感'), ('content_sentiment', '内容情感')]):
+        counts = distribution.get(key, {})
+        labels = _sort_labels(counts)
+        ax = fig.add_subplot(1, 2, i + 1)
+        ax.bar(labels, [counts[label] for label in labels], color='#c44e52')
+        ax.set_title(title)
+        ax.set_xlabel('情感得分')
+
+def render_machine_learning(fig, content, params):
+    """机器学习：混淆矩阵热力图"""
+    import seaborn as sns
+    matrix = content.get('confusion_matrix', [])
+    ax = fig.add_subplot()
+    sns.heatmap(matrix, annot=len(matrix) <= 20, fmt='d', cmap='Blues', cbar=False, ax=ax)
+    ax.set_title('混淆矩阵')
+    ax.set_xlabel('预测')
+    ax.set_ylabel('实际')
+
+def render_correlation(fig, content, params):
+    """相关性分析：相关系数热力图，特征过多时只保留强相关特征对涉及的前 top_n 个特征"""
+    import seaborn as sns
+    matrix = content.get('correlation_matrix', {})
+    columns = content.get('numeric_columns') or list(matrix)
+    if len(columns) > params['top_n']:
+        selected = []
+        for pair in content.get('top_pairs', []):
+            for column in (pair['feature_a'], pair['feature_b']):
+                if column not in selected:
+                    selected.append(column)
+        columns = (selected + [c for c in columns if c not in selected])[:params['top_n']]
+
+    data = [[matrix[col].get(row) for col in columns] for row in columns]
+    data = [[float('nan') if v is None else v for v in row] for row in data]
+    ax = fig.add_subplot()
+    sns.heatmap(data, xticklabels=columns, yticklabels=columns, vmin=-1, vmax=1, center=0,
+                cmap='RdBu_r', annot=len(columns) <= 12, fmt='.2f', ax=ax)
+    ax.set_title(f'相关系数（{content.get("method", "pearson")}）')
+
+# 分析类型 -> 图表渲染函数
+CHART_RENDERERS = {
+    'basic_stats': render_basic_stats,
+    'text_analysis': render_text_analysis,
+    'sentiment_analysis': render_sentiment_analysis,
+    'machine_learning': render_machine_learning,
+    'correlation': render_correlation
+}
+
+def has_chart(analysis_type):
+    """该分析类型是否支持生成图表"""
+    return analysis_type in CHART_RENDERERS
+
+def render_chart(analysis_type, content, params, fmt, path):
+    """渲染图表并原子地写入缓存文件"""
+    _setup_matplotlib()
+    from matplotlib.figure import Figure
+
+    if isinstance(content, str):
+        content = json.loads(content)
+    if 'error' in content:
+        raise ValueError(content['error'])
+
+    # 使用面向对象接口，不经过pyplot的全局状态
+    fig = Figure(figsize=(params['width'], params['height']), dpi=params['dpi'])
+    CHART_RENDERERS[analysis_type](fig, content, params)
+    fig.tight_layout()
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{threading.get_ident()}.tmp'
+    fig.savefig(tmp_path, format=fmt)
+    os.replace(tmp_path, path)
+
+class ChartWorker:
+    """后台图表渲染线程池，同一图表只排队一次，失败信息保留到下一次请求"""
+
+    def __init__(self, max_workers=1):
+        self.max_workers = max_workers
+        self._executor = None
+        self._pending = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    def configure(self, max_workers):
+        """调整线程数（在第一次提交任务前生效）"""
+        with self._lock:
+            self.max_workers = max_workers
+
+    def submit(self, analysis_type, content, params, fmt, path):
+        """提交渲染任务，已在排队的图表不会重复提交"""
+        with self._lock:
+            if path in self._pending:
+                return self._pending[path]
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='chart')
+            future = self._executor.submit(self._render, analysis_type, content, params, fmt, path)
+            self._pending[path] = future
+            return future
+
+    def _render(self, analysis_type, content, params, fmt, path):
+        start = time.perf_counter()
+        try:
+            render_chart(analysis_type, content, params, fmt, path)
+            registry.observe('chart_render_duration_seconds', time.perf_counter() - start,
+                             analysis=analysis_type, format=fmt)
+        except Exception as e:
+            logger.exception('图表渲染失败: %s', path)
+            registry.inc('chart_render_failures_total', analysis=analysis_type)
+            with self._lock:
+                self._errors[path] = str(e)
+        finally:
+            with self._lock:
+                self._pending.pop(path, None)
+
+    def pop_error(self, path):
+        """取出并清除渲染失败信息，下一次请求会重新渲染"""
+        with self._lock:
+            return self._errors.pop(path, None)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+# 全局图表渲染线程池
+chart_worker = ChartWorker()
+
+def request_chart(storage_path, result, params, fmt):
+    """返回 (状态, 值)：('ready', 文件路径) / ('pending', None) / ('failed', 错误信息)
+
+    缓存文件存在时直接返回，否则提交后台渲染，调用方不会等待绘图完成。
+    """
+    path = chart_path(storage_path, result.id, params, fmt)
+    if os.path.exists(path):
+        registry.inc('chart_requests_total', cache='hit')
+        return 'ready', path
+
+    error = chart_worker.pop_error(path)
+    if error is not None:
+        return 'failed', error
+
+    registry.inc('chart_requests_total', cache='miss')
+    chart_worker.submit(result.type, result.content, params, fmt, path)
+    return 'pending', None
@@ -1,12 +1,20 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context
 from flask_login import login_required
-import requests
 from bs4 import BeautifulSoup
 import json
 import csv
+import io
 import os
 from datetime import datetime
-from models import db, DataSource, CrawledData
+from models import db, DataSource, CrawledData, Task
+from queries import AnalysisQuery, apply_metadata_filters, parse_filter_value
+from db_routing import read_query
+from metrics import registry, timer, timed
+from rate_limit import host_limiters, rate_limit_settings
+from replay import fixtures
+from resilience import CrawlError, RetryPolicy, call_with_retry, check_response, circuit_breakers, crawl_error
+from streaming import (HTML_CONTENT_TYPES, JSON_CONTENT_TYPES, SelectorStream, check_content_type, iter_limited,
+                       iter_text, read_limited, supports_streaming)
 from config import Config
 
 # 创建爬虫蓝图
@@ -19,7 +27,8 @@ def index():
     try:
         # 获取所有数据源
         data_sources = DataSource.query.all()
-        return render_template('crawler/index.html', data_sources=data_sources)
+        return render_template('crawler/index.html', data_sources=data_sources, host_stats=host_limiters.stats(),
+                               breaker_stats=circuit_breakers.stats())
     except Exception as e:
         flash(f'获取数据源失败: {str(e)}', 'danger')
         return render_template('crawler/index.html')
@@ -92,6 +101,8 @@ def edit_source(source_id):
                 return redirect(url_for('crawler.edit_source', source_id=source_id))
             
             db.session.commit()
+            # 限速配置或URL可能已修改，下次请求时按新配置重新登记
+            host_limiters.forget_source(source.id)
             flash('数据源更新成功', 'success')
             return redirect(url_for('crawler.index'))
             
@@ -112,6 +123,7 @@ def delete_source(source_id):
         source = DataSource.query.get_or_404(source_id)
         db.session.delete(source)
         db.session.commit()
+        host_limiters.forget_source(source_id)
         flash('数据源删除成功', 'success')
     except Exception as e:
         db.session.rollback()
@@ -125,21 +137,23 @@ def crawl(source_id):
     """爬取指定数据源"""
     try:
         source = DataSource.query.get_or_404(source_id)
-        config = json.loads(source.config)
         
-        # 根据数据源类型调用不同的爬取方法
-        if source.type == 'web':
-            results = crawl_web(source, config)
-        elif source.type == 'api':
-            results = crawl_api(source, config)
-        elif source.type == 'file':
-            results = crawl_file(source, config)
-        else:
+        if source.type not in CRAWLERS:
             flash(f'不支持的数据源类型: {source.type}', 'danger')
             return redirect(url_for('crawler.index'))
         
+        try:
+            results = crawl_source(source)
+        except CrawlError as e:
+            if not e.partial_results:
+                raise
+            # 爬取中途失败时保留已获取的数据
+            store_results(source, e.partial_results)
+            flash(f'爬取中断（{str(e)}），已保存 {len(e.partial_results)} 条数据', 'warning')
+            return redirect(url_for('crawler.view_data', source_id=source_id))
+        
         # 保存爬取结果
-        save_crawled_data(source, results)
+        store_results(source, results)
         
         flash(f'爬取完成，共获取 {len(results)} 条数据', 'success')
         return redirect(url_for('crawler.view_data', source_id=source_id))
@@ -148,58 +162,132 @@ def crawl(source_id):
         flash(f'爬取失败: {str(e)}', 'danger')
         return redirect(url_for('crawler.index'))
 
+@crawler_bp.route('/host_stats')
+@login_required
+def host_stats():
+    """各主机的限流状态和实际请求速率"""
+    return jsonify(host_limiters.stats())
+
 @crawler_bp.route('/view_data/<int:source_id>')
 @login_required
 def view_data(source_id):
     """查看爬取的数据"""
     try:
         source = DataSource.query.get_or_404(source_id)
-        crawled_data = CrawledData.query.filter_by(source_id=source_id)\
-                                        .order_by(CrawledData.crawled_at.desc())\
-                                        .all()
         
-        return render_template('crawler/view_data.html', source=source, crawled_data=crawled_data)
+        # 元数据过滤条件，例如 ?meta.file_type=csv&meta.response_status__gte=400
+        metadata_filters = request_metadata_filters()
+        
+        query = read_query(CrawledData).filter_by(source_id=source_id)
+        query = apply_metadata_filters(query, metadata_filters)
+        crawled_data = query.order_by(CrawledData.crawled_at.desc()).all()
+        
+        return render_template('crawler/view_data.html', source=source, crawled_data=crawled_data,
+                               crawled_data_count=len(crawled_data), metadata_filters=metadata_filters)
         
     except Exception as e:
         flash(f'获取爬取数据失败: {str(e)}', 'danger')
         return redirect(url_for('crawler.index'))
 
+def request_metadata_filters():
+    """从查询参数中取出元数据过滤条件（meta. 前缀）"""
+    return {key[5:]: parse_filter_value(value) for key, value in request.args.items() if key.startswith('meta.')}
+
+EXPORT_FIELDS = ['id', 'title', 'content', 'url', 'crawled_at', 'metadata']
+
+@crawler_bp.route('/export/<int:source_id>')
+@login_required
+def export_data(source_id):
+    """导出爬取的数据为CSV（支持与查看页面相同的元数据过滤），从只读副本分批读取"""
+    source = DataSource.query.get_or_404(source_id)
+    query = AnalysisQuery(source_ids=[source_id], metadata_filters=request_metadata_filters())
+    
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_FIELDS)
+        for batch in query.iter_batches():
+            for item in batch:
+                writer.writerow([item.id, item.title, item.content, item.url,
+                                 item.crawled_at.isoformat() if item.crawled_at else '',
+                                 json.dumps(item.metadata_dict, ensure_ascii=False)])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    
+    response = Response(stream_with_context(generate()), mimetype='text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename=source-{source.id}.csv'
+    return response
+
 # 爬取方法实现
+def web_item(source, config, element, index):
+    """把匹配选择器的元素转换为一条爬取结果"""
+    title_element = element.select_one(config.get('title_selector', 'h1,h2,h3'))
+    content_element = element.select_one(config.get('content_selector', '*'))
+    return {
+        'title': title_element.text.strip() if title_element else f'标题 {index+1}',
+        'content': content_element.text.strip() if content_element else element.text.strip(),
+        'url': source.url,
+        'metadata': {
+            'source_type': 'web',
+            'selector': config.get('selector'),
+            'crawled_at': datetime.utcnow().isoformat()
+        }
+    }
+
+def download_limits(config):
+    """响应体字节上限和读取块大小：数据源配置中的 max_bytes 优先"""
+    return int(config.get('max_bytes') or Config.CRAWL_MAX_BYTES), Config.CRAWL_CHUNK_SIZE
+
+@timed('crawl_duration_seconds', source_type='web')
 def crawl_web(source, config):
-    """爬取网页数据"""
+    """爬取网页数据
+
+    响应体按块下载、解压和解码，边接收边解析，选择器匹配的元素在结束标签处即转换为结果，
+    下载超过 max_bytes 时停止并保留已提取的数据。选择器不支持流式解析（~、:nth-child、:has 等）
+    或数据源配置 "streaming": false 时，改为读取完整网页（同样受字节上限约束）后再用BeautifulSoup解析。
+    """
     results = []
+    selector = config.get('selector', 'body')
+    max_bytes, chunk_size = download_limits(config)
+    response = None
     
     try:
-        # 发送请求
-        response = requests.get(source.url, timeout=Config.API_TIMEOUT)
-        response.raise_for_status()
+        # 发送请求（只读取响应头）
+        with timer('crawl_stage_duration_seconds', source_type='web', stage='fetch'):
+            response = fetch(source, config, stream=True)
+            check_content_type(response, config.get('allowed_content_types') or HTML_CONTENT_TYPES)
         
-        # 解析HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # 根据配置提取数据
-        elements = soup.select(config.get('selector', 'body'))
-        
-        for i, element in enumerate(elements):
-            title = element.select_one(config.get('title_selector', 'h1,h2,h3')).text.strip() if element.select_one(config.get('title_selector', 'h1,h2,h3')) else f'标题 {i+1}'
-            content = element.select_one(config.get('content_selector', '*')).text.strip() if element.select_one(config.get('content_selector', '*')) else element.text.strip()
+        with timer('crawl_stage_duration_seconds', source_type='web', stage='parse'):
+            text = iter_text(response, iter_limited(response, max_bytes, chunk_size))
             
-            results.append({
-                'title': title,
-                'content': content,
-                'url': source.url,
-                'metadata': {
-                    'source_type': 'web',
-                    'selector': config.get('selector'),
-                    'crawled_at': datetime.utcnow().isoformat()
-                }
-            })
+            if config.get('streaming', True) and supports_streaming(selector):
+                # 嵌套的匹配元素先于外层元素结束，按文档顺序号排序
+                matched = []
+                parser = SelectorStream(selector, lambda element, sequence: matched.append(
+                    (sequence, web_item(source, config, element, sequence))))
+                try:
+                    for chunk in text:
+                        parser.feed(chunk)
+                    parser.finish()
+                finally:
+                    matched.sort(key=lambda pair: pair[0])
+                    results[:] = [item for _, item in matched]
+            else:
+                soup = BeautifulSoup(''.join(text), 'html.parser')
+                for i, element in enumerate(soup.select(selector)):
+                    results.append(web_item(source, config, element, i))
             
     except Exception as e:
-        raise Exception(f'网页爬取失败: {str(e)}')
+        raise crawl_error('网页爬取失败', e, results) from e
+    finally:
+        if response is not None:
+            response.close()
     
     return results
 
+@timed('crawl_duration_seconds', source_type='api')
 def crawl_api(source, config):
     """爬取API数据"""
     results = []
@@ -211,45 +299,50 @@ def crawl_api(source, config):
         params = config.get('params', {})
         data = config.get('data', {})
         
-        # 发送请求
-        if method.upper() == 'POST':
-            response = requests.post(source.url, headers=headers, params=params, json=data, timeout=Config.API_TIMEOUT)
-        else:
-            response = requests.get(source.url, headers=headers, params=params, timeout=Config.API_TIMEOUT)
-        
-        response.raise_for_status()
-        api_data = response.json()
-        
-        # 提取数据
-        items = api_data
-        if 'items_key' in config:
-            # 根据配置的键路径提取数据
-            for key in config['items_key'].split('.'):
-                items = items[key]
+        # 发送请求（响应体受字节上限约束）
+        max_bytes, chunk_size = download_limits(config)
+        with timer('crawl_stage_duration_seconds', source_type='api', stage='fetch'):
+            if method.upper() == 'POST':
+                response = fetch(source, config, 'POST', headers=headers, params=params, json=data, stream=True)
+            else:
+                response = fetch(source, config, 'GET', headers=headers, params=params, stream=True)
+            
+            with response:
+                check_content_type(response, config.get('allowed_content_types') or JSON_CONTENT_TYPES)
+                api_data = json.loads(read_limited(response, max_bytes, chunk_size))
         
-        # 处理数据项
-        for item in items:
-            # 根据配置提取标题和内容
-            title = extract_from_dict(item, config.get('title_path', ''))
-            content = extract_from_dict(item, config.get('content_path', ''))
+        with timer('crawl_stage_duration_seconds', source_type='api', stage='parse'):
+            # 提取数据
+            items = api_data
+            if 'items_key' in config:
+                # 根据配置的键路径提取数据
+                for key in config['items_key'].split('.'):
+                    items = items[key]
             
-            results.append({
-                'title': title or '未命名',
-                'content': content or str(item),
-                'url': source.url,
-                'metadata': {
-                    'source_type': 'api',
-                    'method': method,
-                    'response_status': response.status_code,
-                    'crawled_at': datetime.utcnow().isoformat()
-                }
-            })
+            # 处理数据项
+            for item in items:
+                # 根据配置提取标题和内容
+                title = extract_from_dict(item, config.get('title_path', ''))
+                content = extract_from_dict(item, config.get('content_path', ''))
+                
+                results.append({
+                    'title': title or '未命名',
+                    'content': content or str(item),
+                    'url': source.url,
+                    'metadata': {
+                        'source_type': 'api',
+                        'method': method,
+                        'response_status': response.status_code,
+                        'crawled_at': datetime.utcnow().isoformat()
+                    }
+                })
             
     except Exception as e:
-        raise Exception(f'API爬取失败: {str(e)}')
+        raise crawl_error('API爬取失败', e, results) from e
     
     return results
 
+@timed('crawl_duration_seconds', source_type='file')
 def crawl_file(source, config):
     """爬取文件数据"""
     results = []
@@ -306,10 +399,103 @@ def crawl_file(source, config):
             raise Exception(f'不支持的文件类型: {file_type}')
             
     except Exception as e:
-        raise Exception(f'文件爬取失败: {str(e)}')
+        raise crawl_error('文件爬取失败', e, results) from e
     
     return results
 
+# 数据源类型 -> 爬取方法
+CRAWLERS = {
+    'web': crawl_web,
+    'api': crawl_api,
+    'file': crawl_file
+}
+
+def retry_policy(config):
+    """重试策略：数据源配置中的 retry 覆盖全局默认值
+
+    数据源配置示例：{"retry": {"attempts": 5, "base_delay": 1, "max_delay": 60}}
+    """
+    settings = {
+        'attempts': Config.CRAWL_RETRY_ATTEMPTS,
+        'base_delay': Config.CRAWL_BACKOFF_BASE,
+        'max_delay': Config.CRAWL_BACKOFF_MAX
+    }
+    settings.update({key: value for key, value in (config.get('retry') or {}).items() if key in settings})
+    return RetryPolicy(**settings)
+
+def fetch(source, config, method='GET', **kwargs):
+    """发送HTTP请求：按主机限流、可重试错误指数退避重试、数据源熔断
+
+    限流按数据源URL的主机进行，回放模式下请求发往回放服务器时限流行为与在线时相同。
+    """
+    def attempt():
+        with host_limiters.request(source.url, rate_limit_settings(config), Config.CRAWL_LIMIT_WAIT,
+                                   source=source.id) as slot:
+            response = fixtures.send(source, method, timeout=(Config.CRAWL_CONNECT_TIMEOUT, Config.API_TIMEOUT),
+                                     **kwargs)
+            slot.record(response)
+        check_response(response)
+        return response
+    
+    return call_with_retry(attempt, retry_policy(config), circuit_breakers.get(source.id), source.type)
+
+def crawl_source(source):
+    """根据数据源类型调用对应的爬取方法，返回爬取结果"""
+    crawl_func = CRAWLERS.get(source.type)
+    if crawl_func is None:
+        raise Exception(f'不支持的数据源类型: {source.type}')
+    return crawl_func(source, json.loads(source.config) if source.config else {})
+
+def store_results(source, results):
+    """保存爬取结果并记录指标"""
+    with timer('crawl_stage_duration_seconds', source_type=source.type, stage='insert'):
+        save_crawled_data(source, results)
+    registry.inc('crawl_items_total', len(results), source_type=source.type)
+
+def crawl_all_sources():
+    """依次爬取全部数据源（定时任务使用），每个数据源记录一条Task
+
+    熔断中的数据源直接跳过，不占用爬取时间；中途失败时保存已获取的部分数据。
+    返回 [(数据源id, 状态, 保存条数), ...]
+    """
+    summary = []
+    for source in DataSource.query.order_by(DataSource.id).all():
+        task = Task(name=f'爬取 {source.name}', type='crawl', status='running',
+                    config=json.dumps({'source_id': source.id}))
+        db.session.add(task)
+        db.session.commit()
+        
+        saved = 0
+        error = None
+        breaker = circuit_breakers.get(source.id)
+        if breaker.is_open():
+            status = 'skipped'
+            error = f'数据源已熔断，{breaker.retry_in():.1f} 秒后重试'
+        else:
+            try:
+                results = crawl_source(source)
+                store_results(source, results)
+                saved = len(results)
+                status = 'completed'
+            except CrawlError as e:
+                error = str(e)
+                if e.partial_results:
+                    store_results(source, e.partial_results)
+                    saved = len(e.partial_results)
+                    status = 'partial'
+                else:
+                    status = 'failed'
+            except Exception as e:
+                error = str(e)
+                status = 'failed'
+        
+        task.status = status
+        task.result = json.dumps({'saved': saved, 'error': error}, ensure_ascii=False)
+        db.session.commit()
+        summary.append((source.id, status, saved))
+    
+    return summary
+
 def save_crawled_data(source, results):
     """保存爬取的数据到数据库"""
     try:
@@ -319,7 +505,7 @@ def save_crawled_data(source, results):
                 title=result['title'],
                 content=result['content'],
                 url=result['url'],
-                metadata=json.dumps(result['metadata'])
+                meta_data=result['metadata']
             )
             db.session.add(crawled_data)
         
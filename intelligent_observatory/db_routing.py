@@ -0,0 +1,60 @@
+from flask import current_app, g
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from models import db
+
+# 只有队列连接池接受这些参数：SQLAlchemy 2.x 中文件型SQLite同样使用 QueuePool，
+# 内存SQLite使用 SingletonThreadPool / StaticPool，传入这些参数会在创建引擎时报错
+QUEUE_POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout')
+
+def is_memory_sqlite(url):
+    """是否为内存SQLite（sqlite://、:memory: 或 mode=memory 的URI文件名）"""
+    if not url.drivername.startswith('sqlite'):
+        return False
+    return url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'
+
+def engine_options(uri, settings):
+    """根据数据库类型生成引擎参数"""
+    options = dict(settings)
+    if is_memory_sqlite(make_url(uri)):
+        for key in QUEUE_POOL_OPTIONS:
+            options.pop(key, None)
+    return options
+
+def configure_engines(app):
+    """按进程角色设置连接池，并注册只读副本引擎（需在 db.init_app 之前调用）"""
+    role = app.config.get('PROCESS_ROLE', 'web')
+    settings = app.config['DB_POOL_SETTINGS'].get(role, {})
+
+    options = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], settings)
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    replica_uri = app.config.get('SQLALCHEMY_REPLICA_URI')
+    if replica_uri:
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds['replica'] = dict(engine_options(replica_uri, settings), url=replica_uri)
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+    @app.teardown_appcontext
+    def close_read_session(exception=None):
+        session = g.pop('read_session', None)
+        if session is not None:
+            session.close()
+
+def read_session():
+    """只读会话：配置了副本时连接副本库，否则使用主库会话
+
+    副本可能有复制延迟，刚写入的数据请用 db.session 读取。
+    """
+    if not current_app.config.get('SQLALCHEMY_REPLICA_URI'):
+        return db.session
+
+    session = g.get('read_session')
+    if session is None:
+        session = g.read_session = Session(bind=db.engines['replica'])
+    return session
+
+def read_query(*entities):
+    """在只读会话上构造查询"""
+    return read_session().query(*entities)
@@ -0,0 +1,287 @@
+import re
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+# 默认情感词表（情感分析与特征提取共用）
+POSITIVE_WORDS = ['好', '优秀', '成功', '满意', '喜欢', 'good', 'great', 'success', 'excellent']
+NEGATIVE_WORDS = ['坏', '差', '失败', '不满意', '讨厌', 'bad', 'poor', 'failure', 'terrible']
+
+# 特征组
+FEATURE_GROUPS = ('text', 'sentiment', 'time', 'metadata')
+
+# 中文字符
+CJK_PATTERN = r'[\u4e00-\u9fff]'
+
+# 元数据中可识别为时间的字符串（ISO格式）
+ISO_DATETIME_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}')
+
+def score_sentiment(text, positive_words, negative_words):
+    """计算文本情感得分（正面词数 - 负面词数）"""
+    if not text:
+        return 0
+
+    text_lower = text.lower()
+    positive_score = sum(1 for word in positive_words if word in text_lower)
+    negative_score = sum(1 for word in negative_words if word in text_lower)
+
+    return positive_score - negative_score
+
+def flatten_metadata(metadata, prefix='meta'):
+    """将嵌套的元数据字典展开为 {'meta.a.b': value} 形式"""
+    flat = {}
+    if not isinstance(metadata, dict):
+        return flat
+
+    for key, value in metadata.items():
+        name = f'{prefix}.{key}'
+        if isinstance(value, dict):
+            flat.update(flatten_metadata(value, name))
+        else:
+            flat[name] = value
+
+    return flat
+
+def _metadata_value_to_number(value):
+    """把单个元数据值转换为数值，无法转换时返回 None"""
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        if ISO_DATETIME_PATTERN.match(value):
+            try:
+                return datetime.fromisoformat(value).timestamp() / 86400.0
+            except ValueError:
+                return None
+    return None
+
+def _metadata_features(df, params, columns):
+    """元数据特征：数值/布尔/时间字段直接转换，低基数字符串字段做独热编码"""
+    max_categories = int(params.get('max_categories', 10))
+    flat = pd.DataFrame([flatten_metadata(m) for m in df['metadata']], index=df.index)
+    features = {}
+
+    for column in flat.columns:
+        values = flat[column]
+        numbers = values.map(_metadata_value_to_number)
+        present = values.notna()
+
+        # 所有非空值都可转为数值
+        if present.any() and numbers[present].notna().all():
+            features[column] = numbers.astype('float64')
+            continue
+
+        # 字符串类别字段
+        categories = values[present].astype(str).unique()
+        if len(categories) <= max_categories or columns is not None:
+            for category in categories:
+                features[f'{column}={category}'] = (values.astype(str) == category).astype('float64').where(present)
+
+    return features
+
+def extract_features(df, params, columns=None):
+    """特征提取：把元数据字段、文本长度、情感得分和时间特征转换为数值矩阵
+
+    返回 (matrix, feature_names)，matrix 为 float64 二维数组，每行一条记录、每列一个特征，
+    缺失值为 NaN。传入 columns 时按给定特征名对齐输出（用于分块计算时保持各块列一致）。
+    """
+    groups = params.get('features', FEATURE_GROUPS)
+    features = {}
+
+    # 文本长度特征
+    if 'text' in groups:
+        title = df['title'].fillna('')
+        content = df['content'].fillna('')
+        features['title_length'] = title.str.len()
+        features['content_length'] = content.str.len()
+        features['word_count'] = content.str.split().str.len()
+        features['cjk_char_count'] = content.str.count(CJK_PATTERN)
+
+    # 情感得分特征
+    if 'sentiment' in groups:
+        positive_words = params.get('positive_words', POSITIVE_WORDS)
+        negative_words = params.get('negative_words', NEGATIVE_WORDS)
+        features['title_sentiment'] = df['title'].apply(score_sentiment, args=(positive_words, negative_words))
+        features['content_sentiment'] = df['content'].apply(score_sentiment, args=(positive_words, negative_words))
+
+    # 时间特征
+    if 'time' in groups and 'crawled_at' in df:
+        crawled_at = pd.to_datetime(df['crawled_at'])
+        features['crawled_hour'] = crawled_at.dt.hour
+        features['crawled_weekday'] = crawled_at.dt.weekday
+        # 按时间差计算天数：NaT 得到 NaN（转为 int64 会变成最小整数），且与时间精度（ns/us）无关
+        features['crawled_days'] = (crawled_at - pd.Timestamp(0)) / pd.Timedelta(days=1)
+
+    # 元数据特征
+    if 'metadata' in groups and 'metadata' in df:
+        features.update(_metadata_features(df, params, columns))
+
+    if columns is None:
+        columns = list(features.keys())
+
+    matrix = np.full((len(df), len(columns)), np.nan, dtype='float64')
+    for i, name in enumerate(columns):
+        if name in features:
+            matrix[:, i] = np.asarray(features[name], dtype='float64')
+
+    return matrix, columns
+
+def rank_columns(matrix):
+    """按列计算秩（并列取平均秩），NaN 保持为 NaN"""
+    ranked = pd.DataFrame(matrix).rank(method='average')
+    return ranked.to_numpy(dtype='float64')
+
+class CorrelationAccumulator:
+    """分块累积 Pearson 相关系数所需的统计量（成对完整：每对特征只使用两者都不缺失的行）
+
+    每次 update 传入一块行数据，只保留每对特征的行数、和、平方和与叉积，内存占用只与特征数有关。
+    每列以第一次出现时那一块的均值作为平移量以减小数值误差（平移不改变相关系数）。
+    后续块出现新特征时用 extend 增加列，新列只统计它出现之后的行。
+    """
+
+    def __init__(self, n_features):
+        self.n_features = 0
+        self.n_samples = 0
+        self.shift = np.zeros(0, dtype='float64')
+        self._shift_set = np.zeros(0, dtype=bool)
+        # counts[i, j]：特征 i、j 都不缺失的行数；sums[i, j]、squares[i, j]：这些行中特征 i 的和与平方和
+        self.counts = np.zeros((0, 0), dtype='float64')
+        self.sums = np.zeros((0, 0), dtype='float64')
+        self.squares = np.zeros((0, 0), dtype='float64')
+        self.cross = np.zeros((0, 0), dtype='float64')
+        self.extend(n_features)
+
+    def extend(self, n_new):
+        """增加 n_new 个特征列（之前的行视为缺失）"""
+        if n_new <= 0:
+            return
+        old = self.n_features
+        self.n_features = size = old + n_new
+        self.shift = np.concatenate([self.shift, np.zeros(n_new)])
+        self._shift_set = np.concatenate([self._shift_set, np.zeros(n_new, dtype=bool)])
+        for name in ('counts', 'sums', 'squares', 'cross'):
+            grown = np.zeros((size, size), dtype='float64')
+            grown[:old, :old] = getattr(self, name)
+            setattr(self, name, grown)
+
+    def update(self, block):
+        """累积一块数据（二维数组，行为样本，列数与当前特征数一致）"""
+        block = np.asarray(block, dtype='float64')
+        if block.size == 0:
+            return
+
+        present = ~np.isnan(block)
+        new_columns = ~self._shift_set & present.any(axis=0)
+        if new_columns.any():
+            with np.errstate(all='ignore'):
+                self.shift[new_columns] = np.nanmean(block[:, new_columns], axis=0)
+            self._shift_set |= new_columns
+
+        centered = np.where(present, block - self.shift, 0.0)
+        mask = present.astype('float64')
+
+        self.counts += mask.T @ mask
+        self.sums += centered.T @ mask
+        self.squares += (centered * centered).T @ mask
+        self.cross += centered.T @ centered
+        self.n_samples += block.shape[0]
+
+    def result(self):
+        """返回相关系数矩阵，共同行数少于2或方差为零的特征对应位置为 NaN"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            n = self.counts
+            mean_a = self.sums / n
+            mean_b = mean_a.T
+            cov = self.cross / n - mean_a * mean_b
+            var_a = np.clip(self.squares / n - mean_a ** 2, 0.0, None)
+            var_b = var_a.T
+            corr = cov / np.sqrt(var_a * var_b)
+
+        invalid = (n < 2) | (var_a <= 0) | (var_b <= 0)
+        corr[invalid] = np.nan
+        np.clip(corr, -1.0, 1.0, out=corr)
+        diagonal = np.diagonal(invalid).copy()
+        np.fill_diagonal(corr, np.where(diagonal, np.nan, 1.0))
+
+        return corr
+
+def blocked_correlation(matrix, method='pearson', block_size=10000):
+    """对内存中的特征矩阵按行分块计算相关系数（pearson / spearman）"""
+    if method == 'spearman':
+        matrix = rank_columns(matrix)
+    elif method != 'pearson':
+        raise ValueError(f'不支持的相关系数方法: {method}')
+
+    accumulator = CorrelationAccumulator(matrix.shape[1])
+    for start in range(0, matrix.shape[0], block_size):
+        accumulator.update(matrix[start:start + block_size])
+
+    return accumulator.result(), accumulator.n_samples
+
+def chunked_correlation(frames, params):
+    """核外计算：逐块读取 DataFrame 并累积 Pearson 统计量，内存占用与总行数无关
+
+    每块单独提取特征，后续块中新出现的元数据字段或类别追加为新列。
+    Spearman 需要全局秩，不支持核外计算。
+    """
+    method = params.get('method', 'pearson')
+    if method != 'pearson':
+        return {'error': '分块（核外）相关性分析仅支持 pearson 方法'}
+
+    columns = []
+    positions = {}
+    accumulator = CorrelationAccumulator(0)
+
+    for df in frames:
+        if len(df) == 0:
+            continue
+        matrix, names = extract_features(df, params)
+        new_names = [name for name in names if name not in positions]
+        for name in new_names:
+            positions[name] = len(columns)
+            columns.append(name)
+        accumulator.extend(len(new_names))
+
+        aligned = np.full((matrix.shape[0], len(columns)), np.nan, dtype='float64')
+        aligned[:, [positions[name] for name in names]] = matrix
+        accumulator.update(aligned)
+
+    if len(columns) < 2:
+        return {'error': '需要至少两列数值数据来进行相关性分析'}
+
+    return correlation_result(accumulator.result(), columns, accumulator.n_samples, method, params)
+
+def correlation_result(corr, columns, n_samples, method, params):
+    """把相关系数矩阵整理为可 JSON 序列化的结果"""
+    def to_value(x):
+        return None if np.isnan(x) else round(float(x), 6)
+
+    correlation_matrix = {
+        col: {row: to_value(corr[i, j]) for i, row in enumerate(columns)}
+        for j, col in enumerate(columns)
+    }
+
+    # 绝对值最大的特征对
+    top_n = int(params.get('top_pairs', 20))
+    rows, cols = np.triu_indices(len(columns), k=1)
+    values = corr[rows, cols]
+    valid = ~np.isnan(values)
+    rows, cols, values = rows[valid], cols[valid], values[valid]
+    order = np.argsort(-np.abs(values))[:top_n]
+    top_pairs = [
+        {'feature_a': columns[rows[k]], 'feature_b': columns[cols[k]], 'correlation': to_value(values[k])}
+        for k in order
+    ]
+
+    return {
+        'method': method,
+        'correlation_matrix': correlation_matrix,
+        'numeric_columns': columns,
+        'n_samples': n_samples,
+        'top_pairs': top_pairs
+    }
@@ -0,0 +1,243 @@
+import os
+import re
+import time
+import cProfile
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from datetime import datetime
+from flask import g, request, Response, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# 耗时直方图默认分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# 每请求SQL数量分桶
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+class MetricsRegistry:
+    """进程内指标注册表，输出Prometheus文本格式"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = {}
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def describe(self, name, type, help, buckets=None):
+        """声明指标类型和说明（counter / gauge / histogram）"""
+        self._meta[name] = (type, help, buckets or DEFAULT_BUCKETS)
+
+    def inc(self, name, value=1, **labels):
+        """计数器累加"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """设置仪表值"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        """直方图记录一个观测值"""
+        buckets = self._meta.get(name, (None, None, DEFAULT_BUCKETS))[2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    hist['buckets'][i] += 1
+            hist['sum'] += value
+            hist['count'] += 1
+
+    def get(self, name, **labels):
+        """读取计数器或仪表的当前值"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            return self._counters.get(key, self._gauges.get(key, 0))
+
+    def reset(self):
+        """清空所有指标值（保留声明）"""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """生成Prometheus文本格式"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {k: {'buckets': list(v['buckets']), 'sum': v['sum'], 'count': v['count']}
+                          for k, v in self._histograms.items()}
+
+        lines = []
+        seen = set()
+
+        def header(name, default_type):
+            if name in seen:
+                return
+            seen.add(name)
+            type, help, _ = self._meta.get(name, (default_type, name, None))
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {type}')
+
+        for (name, labels), value in sorted(counters.items()):
+            header(name, 'counter')
+            lines.append(f'{name}{_format_labels(labels)} {value}')
+
+        for (name, labels), value in sorted(gauges.items()):
+            header(name, 'gauge')
+            lines.append(f'{name}{_format_labels(labels)} {value}')
+
+        for (name, labels), hist in sorted(histograms.items()):
+            header(name, 'histogram')
+            buckets = self._meta.get(name, (None, None, DEFAULT_BUCKETS))[2]
+            for bound, count in zip(buckets, hist['buckets']):
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", bound),))} {count}')
+            lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {hist["count"]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {hist["sum"]:.6f}')
+            lines.append(f'{name}_count{_format_labels(labels)} {hist["count"]}')
+
+        return '\n'.join(lines) + '\n'
+
+def _format_labels(labels):
+    """格式化标签 {a="1",b="2"}"""
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+# 全局指标注册表
+registry = MetricsRegistry()
+
+registry.describe('http_requests_total', 'counter', 'HTTP请求数')
+registry.describe('http_request_duration_seconds', 'histogram', 'HTTP请求耗时')
+registry.describe('db_queries_total', 'counter', 'SQL执行次数')
+registry.describe('db_query_duration_seconds', 'histogram', 'SQL执行耗时')
+registry.describe('db_queries_per_request', 'histogram', '每个请求执行的SQL数量', QUERY_COUNT_BUCKETS)
+registry.describe('db_n_plus_one_suspected_total', 'counter', '疑似N+1查询（同一请求内重复执行相同SELECT）')
+registry.describe('crawl_duration_seconds', 'histogram', '爬取耗时')
+registry.describe('crawl_stage_duration_seconds', 'histogram', '爬取各阶段耗时（fetch/parse/insert）')
+registry.describe('crawl_items_total', 'counter', '爬取数据条数')
+registry.describe('analysis_duration_seconds', 'histogram', '分析方法耗时')
+registry.describe('analysis_stage_duration_seconds', 'histogram', '分析各阶段耗时（load/dataframe/save）')
+
+@contextmanager
+def timer(name, **labels):
+    """计时上下文，结束时把耗时记录到直方图"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(name, time.perf_counter() - start, **labels)
+
+def timed(name, **labels):
+    """计时装饰器"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(name, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# SQL语句归一化：去掉字面量和多余空白，便于识别重复查询
+_LITERAL_PATTERN = re.compile(r"'[^']*'|\b\d+\b")
+_SPACE_PATTERN = re.compile(r'\s+')
+
+def _normalize_statement(statement):
+    """归一化SQL语句"""
+    return _SPACE_PATTERN.sub(' ', _LITERAL_PATTERN.sub('?', statement)).strip()
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """记录SQL开始时间"""
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """统计SQL数量和耗时，并检测同一请求内的重复查询"""
+    elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+    registry.inc('db_queries_total')
+    registry.observe('db_query_duration_seconds', elapsed)
+
+    if not has_request_context() or 'sql_statements' not in g:
+        return
+
+    g.sql_count += 1
+    g.sql_time += elapsed
+    if statement.lstrip()[:6].upper() != 'SELECT':
+        return
+
+    normalized = _normalize_statement(statement)
+    g.sql_statements[normalized] += 1
+    if g.sql_statements[normalized] == g.n_plus_one_threshold:
+        endpoint = request.endpoint or 'unknown'
+        registry.inc('db_n_plus_one_suspected_total', endpoint=endpoint)
+        logger.warning('疑似N+1查询: %s 在 %s 中重复执行 %d 次', normalized[:200], endpoint, g.n_plus_one_threshold)
+
+def init_metrics(app):
+    """注册请求计时、SQL统计、/metrics 端点和按需性能剖析"""
+
+    @app.before_request
+    def start_request_metrics():
+        g.request_start_time = time.perf_counter()
+        g.sql_count = 0
+        g.sql_time = 0.0
+        g.sql_statements = Counter()
+        g.n_plus_one_threshold = app.config.get('N_PLUS_ONE_THRESHOLD', 5)
+
+        # 按需剖析：开启 PROFILE_ENABLED 后请求带 ?profile=1 时生效
+        if app.config.get('PROFILE_ENABLED') and request.args.get('profile') == '1':
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def record_request_metrics(response):
+        if 'request_start_time' not in g:
+            return response
+
+        elapsed = time.perf_counter() - g.request_start_time
+        endpoint = request.endpoint or 'unknown'
+        registry.inc('http_requests_total', endpoint=endpoint, method=request.method, status=response.status_code)
+        registry.observe('http_request_duration_seconds', elapsed, endpoint=endpoint, method=request.method)
+        registry.observe('db_queries_per_request', g.sql_count, endpoint=endpoint)
+
+        response.headers['X-Response-Time'] = f'{elapsed * 1000:.1f}ms'
+        response.headers['X-Query-Count'] = str(g.sql_count)
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            response.headers['X-Profile-File'] = _dump_profile(app, profiler, endpoint)
+
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus指标"""
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+def _dump_profile(app, profiler, endpoint):
+    """保存剖析结果到 DATA_STORAGE_PATH/profiles/，返回文件名"""
+    profile_dir = os.path.join(app.config['DATA_STORAGE_PATH'], 'profiles')
+    os.makedirs(profile_dir, exist_ok=True)
+
+    filename = f'{endpoint.replace(".", "_")}_{datetime.now().strftime("%Y%m%d_%H%M%S_%f")}.prof'
+    profiler.dump_stats(os.path.join(profile_dir, filename))
+
+    return filename
@@ -1,11 +1,15 @@
 from flask_sqlalchemy import SQLAlchemy
+from flask_login import UserMixin
+from sqlalchemy import event, inspect, text
+from sqlalchemy.dialects.postgresql import JSONB
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+import json
 
 # 初始化数据库
- db = SQLAlchemy()
+db = SQLAlchemy()
 
-class User(db.Model):
+class User(UserMixin, db.Model):
     """用户模型"""
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(50), unique=True, nullable=False)
@@ -37,6 +41,26 @@ class DataSource(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+# 元数据列类型：SQLite/MySQL使用原生JSON，PostgreSQL使用JSONB
+MetadataJSON = db.JSON().with_variant(JSONB(), 'postgresql')
+
+def _parse_datetime(value):
+    """解析ISO格式时间字符串"""
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+# 元数据热点字段提升：元数据键 -> (模型属性, 转换函数)
+# 提升后的字段写入时同步到独立的索引列（meta_ 开头，不覆盖记录本身的列），查询时直接走索引而不解析JSON
+PROMOTED_METADATA_FIELDS = {
+    'source_type': ('meta_source_type', str),
+    'file_path': ('meta_file_path', str),
+    'file_type': ('meta_file_type', str),
+}
+
 class CrawledData(db.Model):
     """爬取数据模型"""
     id = db.Column(db.Integer, primary_key=True)
@@ -44,11 +68,47 @@ class CrawledData(db.Model):
     title = db.Column(db.String(200), nullable=False)
     content = db.Column(db.Text, nullable=False)
     url = db.Column(db.String(500), nullable=True)
-    metadata = db.Column(db.Text, nullable=True)  # JSON元数据
-    crawled_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # 'metadata' 是Declarative保留属性名，数据库列名保持为metadata
+    meta_data = db.Column('metadata', MetadataJSON, nullable=True)  # JSON元数据
+    crawled_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    content_length = db.Column(db.Integer, nullable=True, index=True)  # 内容长度，便于按长度范围过滤
+    
+    # 提升的元数据字段
+    meta_source_type = db.Column(db.String(50), nullable=True, index=True)
+    meta_file_path = db.Column(db.String(500), nullable=True, index=True)
+    meta_file_type = db.Column(db.String(20), nullable=True, index=True)
     
     # 关系
     source = db.relationship('DataSource', backref=db.backref('crawled_data', lazy=True))
+    
+    # 组合索引：按数据源和时间范围查询
+    __table_args__ = (
+        db.Index('ix_crawled_data_source_crawled_at', 'source_id', 'crawled_at'),
+    )
+    
+    @property
+    def metadata_dict(self):
+        """元数据字典（兼容以JSON字符串保存的旧数据）"""
+        if isinstance(self.meta_data, str):
+            return json.loads(self.meta_data)
+        return self.meta_data or {}
+    
+    def sync_promoted_metadata(self):
+        """把元数据中的提升字段同步到对应的索引列"""
+        metadata = self.metadata_dict
+        for key, (attr, convert) in PROMOTED_METADATA_FIELDS.items():
+            value = metadata.get(key)
+            if value is not None:
+                value = convert(value)
+                if value is not None:
+                    setattr(self, attr, value)
+
+@event.listens_for(CrawledData, 'before_insert')
+@event.listens_for(CrawledData, 'before_update')
+def _sync_crawled_data_metadata(mapper, connection, target):
+    """写入前同步提升字段和内容长度"""
+    target.sync_promoted_metadata()
+    target.content_length = len(target.content) if target.content else 0
 
 class AnalysisResult(db.Model):
     """分析结果模型"""
@@ -64,14 +124,59 @@ class Task(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     type = db.Column(db.String(50), nullable=False)  # crawl, analyze
-    status = db.Column(db.String(50), nullable=False)  # pending, running, completed, failed
+    status = db.Column(db.String(50), nullable=False)  # pending, running, completed, partial, failed, skipped
     config = db.Column(db.Text, nullable=True)  # JSON配置
     result = db.Column(db.Text, nullable=True)  # JSON结果
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 # 初始化数据库
- def init_db(app):
-    """初始化数据库"""
+def init_db(app):
+    """初始化数据库（新建缺少的表，并为已有的表补齐新增的列和索引）"""
     with app.app_context():
-        db.create_all()
\ No newline at end of file
+        db.create_all()
+        upgrade_schema()
+
+def upgrade_schema():
+    """为已有数据库补齐模型中新增的列和索引，返回新增的列名
+
+    db.create_all() 只创建不存在的表，不会修改已有的表。新增的列都允许为空，
+    补齐后执行 backfill_promoted_metadata() 为已有数据填充。
+    """
+    inspector = inspect(db.engine)
+    added = []
+    with db.engine.begin() as connection:
+        preparer = connection.dialect.identifier_preparer
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=connection.dialect)
+                connection.execute(text(f'ALTER TABLE {preparer.format_table(table)} '
+                                        f'ADD COLUMN {preparer.format_column(column)} {column_type}'))
+                added.append(f'{table.name}.{column.name}')
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+    return added
+
+def backfill_promoted_metadata(batch_size=1000):
+    """为已有数据回填提升字段和内容长度（新增提升字段后执行一次）"""
+    updated = 0
+    last_id = 0
+    while True:
+        items = CrawledData.query.filter(CrawledData.id > last_id)\
+                                 .order_by(CrawledData.id)\
+                                 .limit(batch_size)\
+                                 .all()
+        if not items:
+            break
+        for item in items:
+            item.sync_promoted_metadata()
+            item.content_length = len(item.content) if item.content else 0
+        last_id = items[-1].id
+        updated += len(items)
+        db.session.commit()
+    return updated
\ No newline at end of file
@@ -0,0 +1,301 @@
+import json
+import random
+import itertools
+from datetime import datetime, timedelta
+from models import CrawledData, PROMOTED_METADATA_FIELDS
+from db_routing import read_query
+from config import Config
+
+# 按id哈希做伯努利采样的精度
+SAMPLE_SCALE = 1000000
+
+# 支持的比较操作，写法为 键__操作，例如 {'response_status__gte': 400}
+FILTER_OPERATORS = ('eq', 'ne', 'in', 'gt', 'gte', 'lt', 'lte', 'contains', 'exists')
+
+def metadata_column(key, sample=None):
+    """返回元数据键对应的SQL表达式
+
+    提升字段直接使用索引列；其它键使用JSON路径表达式（嵌套键用点号分隔），
+    并根据比较值的类型转换为字符串/整数/浮点数/布尔值。
+    """
+    if key in PROMOTED_METADATA_FIELDS:
+        return getattr(CrawledData, PROMOTED_METADATA_FIELDS[key][0])
+
+    path = tuple(key.split('.'))
+    element = CrawledData.meta_data[path if len(path) > 1 else path[0]]
+
+    if isinstance(sample, bool):
+        return element.as_boolean()
+    if isinstance(sample, int):
+        return element.as_integer()
+    if isinstance(sample, float):
+        return element.as_float()
+    return element.as_string()
+
+def parse_filter_value(value):
+    """解析URL参数中的过滤值（数字、布尔、列表按JSON解析，其余视为字符串）"""
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return value
+
+def build_metadata_condition(expression, value):
+    """把单个过滤条件（'键__操作': 值）编译为SQL条件"""
+    key, _, op = expression.partition('__')
+    op = op or 'eq'
+    if op not in FILTER_OPERATORS:
+        raise ValueError(f'不支持的过滤操作: {op}')
+
+    if key in PROMOTED_METADATA_FIELDS and value is not None and op != 'exists':
+        convert = PROMOTED_METADATA_FIELDS[key][1]
+        value = [convert(v) for v in value] if op == 'in' else convert(value)
+
+    sample = value[0] if op == 'in' and value else value
+    column = metadata_column(key, None if op in ('contains', 'exists') else sample)
+
+    if op == 'eq':
+        return column.is_(None) if value is None else column == value
+    if op == 'ne':
+        return column.isnot(None) if value is None else column != value
+    if op == 'in':
+        return column.in_(value)
+    if op == 'gt':
+        return column > value
+    if op == 'gte':
+        return column >= value
+    if op == 'lt':
+        return column < value
+    if op == 'lte':
+        return column <= value
+    if op == 'contains':
+        return column.contains(str(value))
+    return column.isnot(None) if value else column.is_(None)
+
+def apply_metadata_filters(query, filters):
+    """把元数据过滤条件下推到SQL
+
+    filters 示例：{'source_type': 'web', 'file_type__in': ['csv', 'json'], 'response_status__gte': 400}
+    """
+    for expression, value in (filters or {}).items():
+        query = query.filter(build_metadata_condition(expression, value))
+    return query
+
+def match_metadata_condition(metadata, expression, value):
+    """在Python中判断元数据是否满足单个过滤条件（用于归档数据，语义与SQL条件一致）"""
+    key, _, op = expression.partition('__')
+    op = op or 'eq'
+    if op not in FILTER_OPERATORS:
+        raise ValueError(f'不支持的过滤操作: {op}')
+
+    actual = metadata
+    for part in key.split('.'):
+        actual = actual.get(part) if isinstance(actual, dict) else None
+
+    if key in PROMOTED_METADATA_FIELDS:
+        convert = PROMOTED_METADATA_FIELDS[key][1]
+        actual = convert(actual) if actual is not None else None
+        if value is not None and op != 'exists':
+            value = [convert(v) for v in value] if op == 'in' else convert(value)
+
+    if op == 'exists':
+        return (actual is not None) == bool(value)
+    if op == 'eq' and value is None:
+        return actual is None
+    if op == 'ne' and value is None:
+        return actual is not None
+    # 与SQL一致：字段不存在时除 exists / 与None比较外的条件都不成立
+    if actual is None:
+        return False
+    if op == 'contains':
+        return str(value) in str(actual)
+
+    try:
+        if op == 'eq':
+            return actual == value
+        if op == 'ne':
+            return actual != value
+        if op == 'in':
+            return actual in value
+        if op == 'gt':
+            return actual > value
+        if op == 'gte':
+            return actual >= value
+        if op == 'lt':
+            return actual < value
+        return actual <= value
+    except TypeError:
+        return False
+
+def _parse_time(value):
+    """解析时间参数（datetime 或 ISO 字符串）"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+class AnalysisQuery:
+    """分析查询描述：多数据源、爬取时间范围、内容长度范围、元数据过滤和采样
+
+    compile() 生成的SQL只使用索引列（source_id + crawled_at 组合索引、content_length、
+    提升的元数据字段）。sample_rate 按id哈希在SQL中做伯努利采样；sample_size 在过滤后的
+    id流上做蓄水池采样，只读取id，选中后再批量加载完整记录。
+    include_archive 为真时，按归档清单裁剪出相关的冷数据分区，过滤后接在热表数据之后。
+    """
+
+    def __init__(self, source_ids=None, start=None, end=None, min_length=None, max_length=None,
+                 metadata_filters=None, sample_rate=None, sample_size=None, seed=0, include_archive=False):
+        self.source_ids = [int(i) for i in source_ids] if source_ids else []
+        self.start = _parse_time(start)
+        self.end = _parse_time(end)
+        self.min_length = min_length
+        self.max_length = max_length
+        self.metadata_filters = metadata_filters or {}
+        self.sample_rate = sample_rate
+        self.sample_size = int(sample_size) if sample_size else None
+        self.seed = seed
+        self.include_archive = bool(include_archive)
+
+    @classmethod
+    def from_params(cls, params, source_ids=None):
+        """从分析参数中取出查询相关的键构造查询（会从params中移除这些键）
+
+        支持的键：source_ids、days（最近N天）、start、end、min_length、max_length、
+        metadata_filters、sample_rate（0~1）、sample_size、seed、include_archive
+        """
+        source_ids = list(source_ids or []) + list(params.pop('source_ids', []))
+        start = params.pop('start', None)
+        end = params.pop('end', None)
+        days = params.pop('days', None)
+        if days is not None and start is None:
+            start = datetime.utcnow() - timedelta(days=float(days))
+
+        return cls(
+            source_ids=source_ids,
+            start=start,
+            end=end,
+            min_length=params.pop('min_length', None),
+            max_length=params.pop('max_length', None),
+            metadata_filters=params.pop('metadata_filters', None),
+            sample_rate=params.pop('sample_rate', None),
+            sample_size=params.pop('sample_size', None),
+            seed=int(params.pop('seed', 0)),
+            include_archive=params.pop('include_archive', False)
+        )
+
+    def compile(self, query=None):
+        """编译为SQLAlchemy查询（不含蓄水池采样），默认使用只读会话"""
+        if query is None:
+            query = read_query(CrawledData)
+
+        if len(self.source_ids) == 1:
+            query = query.filter(CrawledData.source_id == self.source_ids[0])
+        elif self.source_ids:
+            query = query.filter(CrawledData.source_id.in_(self.source_ids))
+
+        if self.start is not None:
+            query = query.filter(CrawledData.crawled_at >= self.start)
+        if self.end is not None:
+            query = query.filter(CrawledData.crawled_at < self.end)
+
+        if self.min_length is not None:
+            query = query.filter(CrawledData.content_length >= int(self.min_length))
+        if self.max_length is not None:
+            query = query.filter(CrawledData.content_length <= int(self.max_length))
+
+        query = apply_metadata_filters(query, self.metadata_filters)
+
+        if self.sample_rate is not None and float(self.sample_rate) < 1:
+            threshold = int(float(self.sample_rate) * SAMPLE_SCALE)
+            bucket = (CrawledData.id * 2654435761 + self.seed) % SAMPLE_SCALE
+            query = query.filter(bucket < threshold)
+
+        return query
+
+    def _in_sample(self, item_id):
+        """id哈希伯努利采样（与SQL中的条件相同）"""
+        threshold = int(float(self.sample_rate) * SAMPLE_SCALE)
+        return (item_id * 2654435761 + self.seed) % SAMPLE_SCALE < threshold
+
+    def matches(self, item):
+        """在Python中判断记录是否满足查询条件（用于归档数据）"""
+        if self.source_ids and item.source_id not in self.source_ids:
+            return False
+        if self.start is not None and item.crawled_at < self.start:
+            return False
+        if self.end is not None and item.crawled_at >= self.end:
+            return False
+        if self.min_length is not None and item.content_length < int(self.min_length):
+            return False
+        if self.max_length is not None and item.content_length > int(self.max_length):
+            return False
+        metadata = item.metadata_dict
+        for expression, value in self.metadata_filters.items():
+            if not match_metadata_condition(metadata, expression, value):
+                return False
+        if self.sample_rate is not None and float(self.sample_rate) < 1 and not self._in_sample(item.id):
+            return False
+        return True
+
+    def iter_archived(self):
+        """符合条件的归档记录（未开启 include_archive 时为空）"""
+        if not self.include_archive:
+            return
+        from archive import iter_archived_records
+        for item in iter_archived_records(Config.DATA_STORAGE_PATH, self.source_ids, self.start, self.end):
+            if self.matches(item):
+                yield item
+
+    def sample_ids(self):
+        """蓄水池采样（Algorithm R），只扫描id列；包含归档时在热表和归档的合并id流上采样"""
+        rng = random.Random(self.seed)
+        reservoir = []
+        id_query = self.compile(read_query(CrawledData.id))
+        ids = (item_id for (item_id,) in id_query.yield_per(10000))
+        if self.include_archive:
+            ids = itertools.chain(ids, (item.id for item in self.iter_archived()))
+
+        for i, item_id in enumerate(ids):
+            if i < self.sample_size:
+                reservoir.append(item_id)
+            else:
+                j = rng.randint(0, i)
+                if j < self.sample_size:
+                    reservoir[j] = item_id
+
+        return sorted(reservoir)
+
+    def iter_batches(self, batch_size=1000):
+        """按批产出符合条件的记录列表（先热表，再归档）"""
+        if self.sample_size:
+            ids = self.sample_ids()
+            for start in range(0, len(ids), batch_size):
+                items = read_query(CrawledData).filter(CrawledData.id.in_(ids[start:start + batch_size]))\
+                                               .order_by(CrawledData.id)\
+                                               .all()
+                if items:
+                    yield items
+            # 热表中不存在的id来自归档
+            if self.include_archive:
+                selected = set(ids)
+                archived = [item for item in self.iter_archived() if item.id in selected]
+                for start in range(0, len(archived), batch_size):
+                    yield archived[start:start + batch_size]
+            return
+
+        batch = []
+        items = self.compile().order_by(CrawledData.id).yield_per(batch_size)
+        for item in itertools.chain(items, self.iter_archived()):
+            batch.append(item)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def all(self):
+        """返回全部符合条件的记录"""
+        if not self.sample_size and not self.include_archive:
+            return self.compile().all()
+        items = []
+        for batch in self.iter_batches():
+            items.extend(batch)
+        return items
@@ -0,0 +1,313 @@
+import time
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+from metrics import registry
+from config import Config
+
+registry.describe('crawler_host_requests_total', 'counter', '按主机统计的爬虫请求数')
+registry.describe('crawler_host_throttled_total', 'counter', '主机返回429/503的次数')
+registry.describe('crawler_host_wait_seconds', 'histogram', '等待主机限流的时间')
+registry.describe('crawler_host_concurrency', 'gauge', '主机当前并发窗口')
+registry.describe('crawler_host_rate', 'gauge', '主机当前令牌桶速率（请求/秒）')
+
+# 表示被限流的状态码
+THROTTLE_STATUS = (429, 503)
+
+# 乘性减小系数
+DECREASE_FACTOR = 0.5
+
+# 两次乘性减小之间的最短间隔（秒）
+DECREASE_INTERVAL = 1.0
+
+# 统计实际请求速率的时间窗口（秒）
+RATE_WINDOW = 60
+
+class RateLimitTimeout(Exception):
+    """在限定时间内没有等到主机的限流名额"""
+
+    def __init__(self, host, timeout):
+        super().__init__(f'等待主机 {host} 限流超时（{timeout:g} 秒）')
+        self.host = host
+        self.timeout = timeout
+
+def parse_retry_after(value):
+    """解析 Retry-After 响应头（秒数或HTTP日期），返回需要等待的秒数"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+def host_of(url):
+    """URL中的主机名（含端口）"""
+    return urlsplit(url).netloc.lower()
+
+class HostLimiter:
+    """单个主机的令牌桶限速和AIMD自适应并发
+
+    - 令牌桶限制请求速率，rate 为上限，burst 为桶容量
+    - 请求成功且延迟低于 latency_target 时并发窗口和速率加性增加，速率最多恢复到上限
+    - 返回429/503时并发窗口和速率乘性减半，并在 Retry-After 指定的时间内暂停该主机
+    - 延迟超过 latency_target 或连接失败时只减小并发窗口
+    同一拥塞期内（一个平均延迟内，至少 DECREASE_INTERVAL 秒）只减小一次，避免并发中的多个响应重复减半。
+    """
+
+    def __init__(self, host, rate=5.0, burst=5, max_concurrency=4, latency_target=2.0):
+        self.host = host
+        self._cond = threading.Condition()
+        self.configure(rate, burst, max_concurrency, latency_target)
+        self.current_rate = self.rate
+        self.concurrency = 1.0
+        self.tokens = float(self.burst)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.avg_latency = None
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self._updated = time.monotonic()
+        self._completed = deque()
+
+    def configure(self, rate, burst, max_concurrency, latency_target):
+        """更新限速参数（数据源配置修改后生效）"""
+        with self._cond:
+            self.rate = float(rate)
+            self.burst = max(int(burst), 1)
+            self.max_concurrency = max(int(max_concurrency), 1)
+            self.latency_target = float(latency_target)
+            if hasattr(self, 'current_rate'):
+                self.current_rate = min(self.current_rate, self.rate)
+                self.concurrency = min(self.concurrency, self.max_concurrency)
+            self._cond.notify_all()
+
+    def _refill(self, now):
+        if now > self._updated:
+            self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.current_rate)
+            self._updated = now
+
+    def acquire(self, timeout=60):
+        """等待令牌和并发名额，返回等待的秒数；超时抛出 RateLimitTimeout"""
+        start = time.monotonic()
+        deadline = start + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.paused_until and self.in_flight < int(self.concurrency) and self.tokens >= 1:
+                    self.tokens -= 1
+                    self.in_flight += 1
+                    self.requests += 1
+                    return now - start
+
+                if now >= deadline:
+                    raise RateLimitTimeout(self.host, timeout)
+
+                # 计算下一次可能满足条件的时间
+                wait = deadline - now
+                if now < self.paused_until:
+                    wait = min(wait, self.paused_until - now)
+                elif self.tokens < 1:
+                    wait = min(wait, (1 - self.tokens) / self.current_rate)
+                self._cond.wait(wait)
+
+    def _decrease(self, now, rate_too):
+        """乘性减小（同一拥塞期内只执行一次）"""
+        if now - self.last_decrease < max(self.avg_latency or 0, DECREASE_INTERVAL):
+            return
+        self.last_decrease = now
+        self.concurrency = max(1.0, self.concurrency * DECREASE_FACTOR)
+        if rate_too:
+            self.current_rate = max(self.rate * 0.05, self.current_rate * DECREASE_FACTOR)
+
+    def release(self, status=None, latency=None, retry_after=None):
+        """请求结束：status 为None表示连接失败或超时"""
+        with self._cond:
+            now = time.monotonic()
+            self.in_flight -= 1
+            self._completed.append(now)
+            while self._completed and self._completed[0] < now - RATE_WINDOW:
+                self._completed.popleft()
+
+            if latency is not None:
+                self.avg_latency = latency if self.avg_latency is None else 0.8 * self.avg_latency + 0.2 * latency
+
+            if status in THROTTLE_STATUS:
+                self.throttled += 1
+                self._decrease(now, rate_too=True)
+                if retry_after:
+                    self.paused_until = max(self.paused_until, now + retry_after)
+                # 清空令牌桶且暂停期间不积累令牌，恢复后不会立即突发
+                self.tokens = 0.0
+                self._updated = max(now, self.paused_until)
+            elif status is None or status >= 500 or (latency is not None and latency > self.latency_target):
+                if status is None or status >= 500:
+                    self.errors += 1
+                self._decrease(now, rate_too=False)
+            else:
+                # 加性增加：每完成一个窗口的成功请求并发窗口+1，每秒的成功请求速率+上限的5%
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / self.concurrency)
+                self._refill(now)
+                self.current_rate = min(self.rate, self.current_rate + self.rate / 20 / max(self.current_rate, 1.0))
+
+            self._cond.notify_all()
+
+    def achieved_rate(self):
+        """最近 RATE_WINDOW 秒内实际完成的请求速率"""
+        with self._cond:
+            now = time.monotonic()
+            while self._completed and self._completed[0] < now - RATE_WINDOW:
+                self._completed.popleft()
+            if not self._completed:
+                return 0.0
+            span = max(now - self._completed[0], 1.0)
+            return len(self._completed) / span
+
+    def stats(self):
+        """主机状态快照（用于爬虫页面展示）"""
+        achieved = self.achieved_rate()
+        with self._cond:
+            return {
+                'host': self.host,
+                'rate_limit': self.rate,
+                'current_rate': round(self.current_rate, 3),
+                'achieved_rate': round(achieved, 3),
+                'concurrency': round(self.concurrency, 2),
+                'max_concurrency': self.max_concurrency,
+                'in_flight': self.in_flight,
+                'requests': self.requests,
+                'throttled': self.throttled,
+                'errors': self.errors,
+                'avg_latency': round(self.avg_latency, 3) if self.avg_latency is not None else None,
+                'paused_for': round(max(self.paused_until - time.monotonic(), 0.0), 1)
+            }
+
+class _RequestSlot:
+    """一次受限请求，调用 record(response) 记录结果，未记录时按连接失败处理"""
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.recorded = False
+        self.start = None
+
+    def record(self, response):
+        latency = time.monotonic() - self.start
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        self.limiter.release(response.status_code, latency, retry_after)
+        self.recorded = True
+        registry.inc('crawler_host_requests_total', host=self.limiter.host, status=response.status_code)
+        if response.status_code in THROTTLE_STATUS:
+            registry.inc('crawler_host_throttled_total', host=self.limiter.host)
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.recorded:
+            self.limiter.release(None, time.monotonic() - self.start)
+            registry.inc('crawler_host_requests_total', host=self.limiter.host, status='error')
+        registry.set('crawler_host_concurrency', self.limiter.concurrency, host=self.limiter.host)
+        registry.set('crawler_host_rate', self.limiter.current_rate, host=self.limiter.host)
+        return False
+
+def strictest_settings(settings_list):
+    """同一主机上多个数据源的限速配置逐项取最严格的值"""
+    return {key: min(settings[key] for settings in settings_list) for key in settings_list[0]}
+
+class HostLimiterRegistry:
+    """进程内按主机共享的限流器
+
+    同一主机上的多个数据源可能配置不同的限速参数，按数据源分别记录，限流器使用逐项最严格的组合；
+    合并结果不变时不会重新配置限流器。数据源删除或改用其它主机后，它的配置不再参与合并。
+    """
+
+    def __init__(self):
+        self._limiters = {}
+        self._settings = {}  # 主机 -> {数据源: 限速配置}
+        self._source_hosts = {}  # 数据源 -> 主机
+        self._lock = threading.Lock()
+
+    def get(self, host, settings, source=None):
+        """返回主机的限流器；source 的配置有变化时按合并后的参数更新"""
+        if source is not None and self._source_hosts.get(source, host) != host:
+            # 数据源的URL换了主机，原主机上的配置不再生效
+            self.forget_source(source)
+        with self._lock:
+            if source is not None:
+                self._source_hosts[source] = host
+            by_source = self._settings.setdefault(host, {})
+            changed = by_source.get(source) != settings
+            by_source[source] = dict(settings)
+            merged = strictest_settings(list(by_source.values()))
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                limiter = self._limiters[host] = HostLimiter(host, **merged)
+                return limiter
+        if changed:
+            limiter.configure(**merged)
+        return limiter
+
+    def forget_source(self, source):
+        """删除数据源的限速配置（数据源删除或修改后调用），其它数据源的配置重新合并"""
+        with self._lock:
+            host = self._source_hosts.pop(source, None)
+            by_source = self._settings.get(host)
+            if by_source is None or source not in by_source:
+                return
+            del by_source[source]
+            if not by_source:
+                # 没有数据源再使用该主机，丢弃其限流器（进行中的请求仍持有原对象，可以正常结束）
+                del self._settings[host]
+                self._limiters.pop(host, None)
+                return
+            merged = strictest_settings(list(by_source.values()))
+            limiter = self._limiters.get(host)
+        if limiter is not None:
+            limiter.configure(**merged)
+
+    def request(self, url, settings, timeout=60, source=None):
+        """获取请求名额，返回需要在 with 中使用的请求槽"""
+        limiter = self.get(host_of(url), settings, source)
+        waited = limiter.acquire(timeout)
+        registry.observe('crawler_host_wait_seconds', waited, host=limiter.host)
+        return _RequestSlot(limiter)
+
+    def stats(self):
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return sorted((limiter.stats() for limiter in limiters), key=lambda s: s['host'])
+
+    def clear(self):
+        with self._lock:
+            self._limiters.clear()
+            self._settings.clear()
+            self._source_hosts.clear()
+
+# 全局主机限流器
+host_limiters = HostLimiterRegistry()
+
+def rate_limit_settings(config):
+    """合并数据源配置中的 rate_limit 与全局默认值
+
+    数据源配置示例：{"rate_limit": {"rate": 2, "burst": 4, "max_concurrency": 2, "latency_target": 1.5}}
+    """
+    settings = {
+        'rate': Config.CRAWL_RATE_LIMIT,
+        'burst': Config.CRAWL_BURST,
+        'max_concurrency': Config.CRAWL_MAX_CONCURRENCY,
+        'latency_target': Config.CRAWL_LATENCY_TARGET
+    }
+    settings.update({key: value for key, value in (config.get('rate_limit') or {}).items() if key in settings})
+    return settings
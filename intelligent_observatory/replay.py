@@ -0,0 +1,267 @@
+import os
+import json
+import gzip
+import time
+import base64
+import hashlib
+import threading
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import requests
+from streaming import read_limited
+
+# 爬虫请求录制与回放：离线基准测试和回归测试时不访问真实网站
+#
+# 录制模式下 fetch 发出的每个请求及其响应按数据源追加到
+#   <DATA_STORAGE_PATH>/fixtures/source=<id>.jsonl.gz
+# 回放模式下请求改发到本地回放服务器（flask replay-server），由它按录制内容响应。
+
+FIXTURE_MODES = ('off', 'record', 'replay')
+
+# 不保存的响应头：响应体以解压后的形式保存，长度和传输方式由回放服务器重新生成
+_SKIPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'keep-alive',
+                    'set-cookie'}
+
+# 回放服务器按带宽限速时每次写入的字节数
+_WRITE_CHUNK = 16384
+
+def request_key(method, url, kwargs):
+    """请求的录制键：方法、带查询参数的URL和请求体的摘要（不含请求头，令牌变化不影响回放）"""
+    prepared = requests.Request(method.upper(), url, params=kwargs.get('params'), data=kwargs.get('data'),
+                                json=kwargs.get('json')).prepare()
+    body = prepared.body or b''
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    digest = hashlib.sha1(f'{prepared.method} {prepared.url}\n'.encode('utf-8'))
+    digest.update(body)
+    return digest.hexdigest()
+
+def _source_snapshot(source):
+    """数据源快照，请求头的值被隐去"""
+    try:
+        config = json.loads(source.config) if source.config else {}
+    except ValueError:
+        config = {}
+    if isinstance(config.get('headers'), dict):
+        config['headers'] = {name: '***' for name in config['headers']}
+    return {'type': 'source', 'id': source.id, 'name': source.name, 'source_type': source.type,
+            'url': source.url, 'config': config}
+
+class FixtureStore:
+    """按数据源保存的录制文件（gzip压缩的JSON Lines，追加写入）
+
+    同一请求多次录制时以最后一次为准；读取结果按文件修改时间缓存。
+    """
+
+    def __init__(self, storage_path):
+        self.root = os.path.join(os.path.abspath(storage_path), 'fixtures')
+        self._lock = threading.Lock()
+        self._snapshots = set()
+        self._cache = {}
+
+    def path(self, source_id):
+        return os.path.join(self.root, f'source={source_id}.jsonl.gz')
+
+    def _append(self, source_id, entries):
+        os.makedirs(self.root, exist_ok=True)
+        with self._lock:
+            # 每次追加一个独立的gzip成员，读取时自动拼接
+            with gzip.open(self.path(source_id), 'at', encoding='utf-8') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False))
+                    f.write('\n')
+
+    def record(self, source, key, method, response, max_bytes):
+        """读取响应体并录制，返回可以继续正常使用的响应"""
+        body = read_limited(response, max_bytes)
+        # 让后续的 iter_content/text/json 读取已缓存的响应体
+        response._content = body
+        response._content_consumed = True
+
+        entries = []
+        if source.id not in self._snapshots:
+            self._snapshots.add(source.id)
+            entries.append(_source_snapshot(source))
+        entries.append({
+            'type': 'response',
+            'key': key,
+            'method': method.upper(),
+            'url': response.url,
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': {name: value for name, value in response.headers.items()
+                        if name.lower() not in _SKIPPED_HEADERS},
+            'encoding': response.headers.get('Content-Encoding'),
+            'elapsed': response.elapsed.total_seconds(),
+            'body': base64.b64encode(body).decode('ascii'),
+            'recorded_at': datetime.utcnow().isoformat()
+        })
+        self._append(source.id, entries)
+        return response
+
+    def load(self, source_id):
+        """读取数据源的录制内容，返回 (数据源快照, {录制键: 响应})"""
+        path = self.path(source_id)
+        if not os.path.exists(path):
+            return None, {}
+        mtime = os.path.getmtime(path)
+        cached = self._cache.get(source_id)
+        if cached and cached[0] == mtime:
+            return cached[1], cached[2]
+
+        snapshot, responses = None, {}
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry['type'] == 'source':
+                    snapshot = entry
+                else:
+                    entry['body'] = base64.b64decode(entry['body'])
+                    responses[entry['key']] = entry
+        self._cache[source_id] = (mtime, snapshot, responses)
+        return snapshot, responses
+
+    def source_ids(self):
+        """有录制内容的数据源id"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(int(name[len('source='):-len('.jsonl.gz')]) for name in os.listdir(self.root)
+                      if name.startswith('source=') and name.endswith('.jsonl.gz'))
+
+class ReplayServer:
+    """本地回放服务器：GET/POST /<数据源id>/<录制键> 返回录制的响应
+
+    latency 为每个响应的首字节延迟（秒），recorded_latency 为真时改用录制时的响应耗时；
+    bandwidth 为每个连接的下行带宽（字节/秒），None表示不限速。
+    录制时为gzip的响应在客户端接受gzip时重新压缩后发送。
+    """
+
+    def __init__(self, store, host='127.0.0.1', port=0, latency=0.0, bandwidth=None, recorded_latency=False):
+        self.store = store
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.recorded_latency = recorded_latency
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+        self._gzip_cache = {}
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _gzipped(self, entry):
+        body = self._gzip_cache.get(entry['key'])
+        if body is None:
+            body = self._gzip_cache[entry['key']] = gzip.compress(entry['body'], compresslevel=6)
+        return body
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    self.rfile.read(length)
+
+                parts = self.path.split('?', 1)[0].strip('/').split('/')
+                entry = None
+                if len(parts) == 2 and parts[0].isdigit():
+                    entry = server.store.load(int(parts[0]))[1].get(parts[1])
+                if entry is None:
+                    self.send_error(404, 'Fixture Not Recorded', '没有录制该请求')
+                    return
+
+                body = entry['body']
+                gzipped = entry['encoding'] == 'gzip' and 'gzip' in self.headers.get('Accept-Encoding', '')
+                if gzipped:
+                    body = server._gzipped(entry)
+
+                delay = entry['elapsed'] if server.recorded_latency else server.latency
+                if delay:
+                    time.sleep(delay)
+
+                self.send_response(entry['status'], entry['reason'])
+                for name, value in entry['headers'].items():
+                    self.send_header(name, value)
+                if gzipped:
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                server._write(self.wfile, body)
+
+            do_GET = do_POST = do_PUT = do_DELETE = _respond
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def _write(self, wfile, body):
+        if not self.bandwidth:
+            wfile.write(body)
+            return
+        for start in range(0, len(body), _WRITE_CHUNK):
+            chunk = body[start:start + _WRITE_CHUNK]
+            wfile.write(chunk)
+            wfile.flush()
+            time.sleep(len(chunk) / self.bandwidth)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+class FixtureRecorder:
+    """按录制模式发送爬虫请求（进程内全局设置）
+
+    off：直接请求；record：直接请求并录制；replay：请求改发到回放服务器。
+    """
+
+    def __init__(self):
+        self.mode = 'off'
+        self.store = None
+        self.replay_url = None
+        self.max_bytes = None
+
+    def configure(self, mode, storage_path, replay_url=None, max_bytes=None):
+        if mode not in FIXTURE_MODES:
+            raise ValueError(f'不支持的录制模式: {mode}')
+        if mode == 'replay' and not replay_url:
+            raise ValueError('回放模式需要设置回放服务器地址')
+        self.mode = mode
+        self.store = FixtureStore(storage_path)
+        self.replay_url = replay_url.rstrip('/') if replay_url else None
+        self.max_bytes = max_bytes
+
+    def send(self, source, method, **kwargs):
+        """发送请求，参数与 requests.request 相同"""
+        if self.mode == 'replay':
+            key = request_key(method, source.url, kwargs)
+            return requests.request(method, f'{self.replay_url}/{source.id}/{key}', timeout=kwargs.get('timeout'),
+                                    stream=kwargs.get('stream', False))
+
+        response = requests.request(method, source.url, **kwargs)
+        if self.mode == 'record':
+            self.store.record(source, request_key(method, source.url, kwargs), method, response, self.max_bytes)
+        return response
+
+# 全局录制/回放设置
+fixtures = FixtureRecorder()
@@ -0,0 +1,247 @@
+import time
+import random
+import threading
+import requests
+from metrics import registry
+from rate_limit import RateLimitTimeout, parse_retry_after
+
+registry.describe('crawl_errors_total', 'counter', '爬取错误数（按错误类别）')
+registry.describe('crawl_retries_total', 'counter', '爬取重试次数')
+registry.describe('circuit_breaker_state', 'gauge', '数据源熔断器状态（0关闭/1半开/2打开）')
+registry.describe('circuit_breaker_rejections_total', 'counter', '熔断器打开时被直接拒绝的请求数')
+
+# 错误类别
+ERROR_TIMEOUT = 'timeout'        # 连接或读取超时
+ERROR_CONNECTION = 'connection'  # 连接失败、连接中断
+ERROR_THROTTLED = 'throttled'    # 429
+ERROR_SERVER = 'server'          # 5xx
+ERROR_CLIENT = 'client'          # 其它4xx
+ERROR_PARSE = 'parse'            # 响应格式错误、解析失败
+ERROR_CIRCUIT_OPEN = 'circuit_open'
+ERROR_LIMIT_WAIT = 'limit_wait'  # 本地按主机限流等待超时（请求未发出，不计入熔断）
+ERROR_UNKNOWN = 'unknown'
+
+# 可以重试的错误类别
+TRANSIENT_ERRORS = (ERROR_TIMEOUT, ERROR_CONNECTION, ERROR_THROTTLED, ERROR_SERVER)
+
+class CrawlError(Exception):
+    """分类后的爬取错误
+
+    kind 为错误类别，partial_results 保存中断前已经获取的数据，
+    retry_after 为服务器要求的等待秒数。
+    """
+
+    def __init__(self, message, kind=ERROR_UNKNOWN, partial_results=None, retry_after=None):
+        super().__init__(message)
+        self.kind = kind
+        self.partial_results = partial_results or []
+        self.retry_after = retry_after
+
+    @property
+    def transient(self):
+        return self.kind in TRANSIENT_ERRORS
+
+def classify_error(error):
+    """把异常归类为错误类别"""
+    if isinstance(error, CrawlError):
+        return error.kind
+    if isinstance(error, RateLimitTimeout):
+        return ERROR_LIMIT_WAIT
+    if isinstance(error, requests.Timeout):
+        return ERROR_TIMEOUT
+    if isinstance(error, requests.ConnectionError):
+        return ERROR_CONNECTION
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        if status == 429:
+            return ERROR_THROTTLED
+        if status >= 500:
+            return ERROR_SERVER
+        return ERROR_CLIENT
+    if isinstance(error, (ValueError, KeyError, IndexError, TypeError)):
+        return ERROR_PARSE
+    return ERROR_UNKNOWN
+
+def check_response(response):
+    """HTTP错误状态转换为分类错误"""
+    if response.status_code < 400:
+        return
+    error = requests.HTTPError(f'{response.status_code} {response.reason}', response=response)
+    raise CrawlError(str(error), classify_error(error),
+                     retry_after=parse_retry_after(response.headers.get('Retry-After')))
+
+class RetryPolicy:
+    """指数退避重试策略（full jitter）
+
+    第n次重试前等待 random(0, min(max_delay, base_delay * 2**n)) 秒，
+    服务器给出 Retry-After 时至少等待该时间。
+    """
+
+    def __init__(self, attempts=3, base_delay=0.5, max_delay=30.0):
+        self.attempts = max(int(attempts), 1)
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+
+    def delay(self, retry, retry_after=None):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+        if retry_after:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+# 熔断器状态
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+class CircuitBreaker:
+    """数据源熔断器
+
+    连续 failure_threshold 次可重试错误（超时、连接失败、5xx、429）后打开，打开期间直接拒绝请求；
+    reset_timeout 秒后进入半开状态，只放行一个探测请求：成功则关闭，失败则重新打开并把等待时间加倍
+    （不超过 max_reset_timeout）。
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=60.0, max_reset_timeout=3600.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state):
+        self.state = state
+        registry.set('circuit_breaker_state', _STATE_VALUES[state], source=self.name)
+
+    def allow(self):
+        """是否允许发出请求；半开状态下同时只允许一个探测请求"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def is_open(self):
+        """是否处于打开状态且尚未到探测时间（不占用探测名额）"""
+        return self.retry_in() > 0
+
+    def retry_in(self):
+        """距离下一次允许探测的秒数"""
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(self.reset_timeout - (time.monotonic() - self.opened_at), 0.0)
+
+    def record_success(self):
+        with self._lock:
+            self._probe_in_flight = False
+            self.failures = 0
+            self.reset_timeout = self.base_reset_timeout
+            if self.state != CLOSED:
+                self._set_state(CLOSED)
+
+    def record_failure(self, error):
+        """记录失败，只有可重试错误计入连续失败次数"""
+        with self._lock:
+            self.last_error = str(error)
+            probing = self._probe_in_flight
+            self._probe_in_flight = False
+            if not getattr(error, 'transient', False):
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or probing:
+                self.reset_timeout = min(self.reset_timeout * 2, self.max_reset_timeout)
+                self._open()
+            elif self.failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        self.opened_at = time.monotonic()
+        self._set_state(OPEN)
+
+    def stats(self):
+        retry_in = self.retry_in()
+        with self._lock:
+            return {
+                'state': self.state,
+                'failures': self.failures,
+                'retry_in': round(retry_in, 1),
+                'last_error': self.last_error
+            }
+
+class CircuitBreakerRegistry:
+    """按数据源id共享的熔断器（进程内）"""
+
+    def __init__(self):
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self.settings = {}
+
+    def configure(self, failure_threshold, reset_timeout, max_reset_timeout):
+        self.settings = {'failure_threshold': failure_threshold, 'reset_timeout': reset_timeout,
+                         'max_reset_timeout': max_reset_timeout}
+        with self._lock:
+            self._breakers.clear()
+
+    def get(self, source_id):
+        with self._lock:
+            breaker = self._breakers.get(source_id)
+            if breaker is None:
+                breaker = self._breakers[source_id] = CircuitBreaker(str(source_id), **self.settings)
+            return breaker
+
+    def stats(self):
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {source_id: breaker.stats() for source_id, breaker in breakers.items()}
+
+# 全局熔断器
+circuit_breakers = CircuitBreakerRegistry()
+
+def call_with_retry(func, policy, breaker=None, label='crawl'):
+    """按重试策略调用 func，失败时抛出 CrawlError
+
+    只重试可重试错误；熔断器打开时立即失败，不占用等待时间。
+    """
+    for attempt in range(policy.attempts):
+        if breaker is not None and not breaker.allow():
+            registry.inc('circuit_breaker_rejections_total', source=breaker.name)
+            registry.inc('crawl_errors_total', kind=ERROR_CIRCUIT_OPEN, source_type=label)
+            raise CrawlError(f'数据源已熔断，{breaker.retry_in():.1f} 秒后重试（最近错误: {breaker.last_error}）',
+                             ERROR_CIRCUIT_OPEN)
+        try:
+            result = func()
+        except Exception as e:
+            error = e if isinstance(e, CrawlError) else CrawlError(str(e), classify_error(e))
+            registry.inc('crawl_errors_total', kind=error.kind, source_type=label)
+            if breaker is not None:
+                breaker.record_failure(error)
+            if not error.transient or attempt + 1 >= policy.attempts:
+                if error is e:
+                    raise
+                raise error from e
+            registry.inc('crawl_retries_total', kind=error.kind, source_type=label)
+            time.sleep(policy.delay(attempt, error.retry_after))
+            continue
+
+        if breaker is not None:
+            breaker.record_success()
+        return result
+
+def crawl_error(prefix, error, partial_results):
+    """给错误加上前缀并附带已获取的部分结果，保留原错误类别"""
+    if isinstance(error, CrawlError):
+        return CrawlError(f'{prefix}: {error}', error.kind, partial_results, error.retry_after)
+    return CrawlError(f'{prefix}: {error}', classify_error(error), partial_results)
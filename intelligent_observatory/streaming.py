@@ -0,0 +1,174 @@
+import re
+import codecs
+from html.parser import HTMLParser
+import soupsieve
+from bs4 import BeautifulSoup, NavigableString
+from metrics import registry
+from resilience import CrawlError
+
+registry.describe('crawl_response_bytes', 'histogram', '爬取响应体大小（解压后字节数）',
+                  (1024, 10240, 102400, 1048576, 10485760, 104857600))
+
+ERROR_CONTENT_TYPE = 'content_type'
+ERROR_TOO_LARGE = 'too_large'
+
+# 默认允许的响应类型
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+JSON_CONTENT_TYPES = ('application/json', 'text/json', '+json', 'text/plain', 'text/javascript')
+
+# 没有结束标签的元素
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param',
+                 'source', 'track', 'wbr'}
+
+# 在网页开头查找 <meta charset> 声明
+_META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([a-zA-Z0-9_\-]+)', re.IGNORECASE)
+
+# 流式解析不支持的选择器：依赖已删除的更早兄弟（~、:nth-*、:first-of-type）、尚未解析的后续内容
+# （:last-*、:only-*、:has、:empty）或元素文本（:contains）
+_UNSTREAMABLE_PSEUDO = re.compile(r':(?:nth-|first-of-type|last-|only-|has\b|empty\b|(?:-soup-)?contains)', re.IGNORECASE)
+_SELECTOR_STRING = re.compile(r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'')
+_SELECTOR_ATTRIBUTE = re.compile(r'\[[^\]]*\]')
+
+def check_content_type(response, allowed):
+    """检查响应类型，不匹配时抛出不可重试的错误（在读取响应体之前调用）"""
+    content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+    if content_type and not any(content_type == t or (t.startswith('+') and content_type.endswith(t))
+                                for t in allowed):
+        raise CrawlError(f'不支持的响应类型: {content_type}', ERROR_CONTENT_TYPE)
+
+def iter_limited(response, max_bytes, chunk_size=65536):
+    """流式读取解压后的响应体，超过 max_bytes 时抛出错误
+
+    gzip/deflate 在读取过程中逐块解压，解压后的字节数同样受上限约束。
+    """
+    declared = response.headers.get('Content-Length')
+    if declared and declared.isdigit() and 'Content-Encoding' not in response.headers and int(declared) > max_bytes:
+        raise CrawlError(f'响应体过大: {declared} 字节，上限 {max_bytes} 字节', ERROR_TOO_LARGE)
+
+    total = 0
+    try:
+        for chunk in response.iter_content(chunk_size):
+            total += len(chunk)
+            if total > max_bytes:
+                raise CrawlError(f'响应体超过上限 {max_bytes} 字节，已停止下载', ERROR_TOO_LARGE)
+            yield chunk
+    finally:
+        registry.observe('crawl_response_bytes', total)
+
+def read_limited(response, max_bytes, chunk_size=65536):
+    """读取完整响应体（受字节上限约束）"""
+    return b''.join(iter_limited(response, max_bytes, chunk_size))
+
+def _valid_encoding(name):
+    try:
+        return codecs.lookup(name).name
+    except (LookupError, TypeError):
+        return None
+
+def iter_text(response, chunks):
+    """按块解码文本：优先使用响应头中的charset，其次网页开头的 <meta charset>，否则使用UTF-8"""
+    encoding = None
+    if 'charset=' in response.headers.get('Content-Type', '').lower():
+        encoding = _valid_encoding(response.encoding)
+
+    decoder = None
+    for chunk in chunks:
+        if decoder is None:
+            if encoding is None:
+                match = _META_CHARSET.search(chunk[:4096])
+                encoding = _valid_encoding(match.group(1).decode('ascii')) if match else None
+            decoder = codecs.getincrementaldecoder(encoding or 'utf-8')(errors='replace')
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    if decoder is not None:
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            yield tail
+
+def supports_streaming(selector):
+    """选择器能否用 SelectorStream 流式匹配（不能时需读取完整网页后用BeautifulSoup解析）"""
+    # 引号中的字符串和属性选择器（例如 [class~=a]）中的 ~ 和冒号不算
+    stripped = _SELECTOR_ATTRIBUTE.sub('', _SELECTOR_STRING.sub('', selector))
+    return '~' not in stripped and not _UNSTREAMABLE_PSEUDO.search(stripped)
+
+class SelectorStream(HTMLParser):
+    """增量HTML解析：边接收边找出匹配CSS选择器的元素
+
+    解析时维护一棵骨架树：打开的元素路径，加上每层最近一个已结束的兄弟元素，只有标签和属性。
+    在开始标签处用soupsieve判断元素是否匹配（可以使用标签、类、属性、后代/子代组合和 + 兄弟组合），
+    匹配元素内部的文本和子元素完整保留，元素结束时作为BeautifulSoup元素交给
+    on_element(element, 顺序号) 处理，随后删除。内存只与嵌套深度和单个匹配元素的大小有关。
+    嵌套的匹配元素先于外层元素交出，调用方按顺序号恢复文档顺序；element 只在回调期间有效。
+    依赖更早兄弟或后续内容的选择器（~、:nth-child、:last-child、:has、:empty 等）不支持，
+    先用 supports_streaming 判断，不支持时抛出 ValueError。
+    """
+
+    def __init__(self, selector, on_element):
+        super().__init__(convert_charrefs=True)
+        if not supports_streaming(selector):
+            raise ValueError(f'流式解析不支持该选择器: {selector}')
+        self.selector = soupsieve.compile(selector)
+        self.on_element = on_element
+        self._skeleton = BeautifulSoup('', 'html.parser')
+        # 打开的元素：(标签名, 节点, 匹配时的顺序号或None)
+        self._stack = []
+        # 打开的匹配元素数量，大于0时保留文本和子元素
+        self._recording = 0
+        self._sequence = 0
+
+    def handle_starttag(self, tag, attrs):
+        parent = self._stack[-1][1] if self._stack else self._skeleton
+        node = self._skeleton.new_tag(tag, attrs={k: v if v is not None else '' for k, v in attrs})
+        parent.append(node)
+
+        sequence = None
+        if soupsieve.match(self.selector, node):
+            sequence = self._sequence
+            self._sequence += 1
+            self._recording += 1
+
+        if tag in VOID_ELEMENTS:
+            self._close(node, sequence)
+        else:
+            self._stack.append((tag, node, sequence))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        # 没有对应开始标签的结束标签直接忽略；缺少结束标签的元素在此隐式关闭
+        if not any(name == tag for name, _, _ in self._stack):
+            return
+        while self._stack:
+            name, node, sequence = self._stack.pop()
+            self._close(node, sequence)
+            if name == tag:
+                break
+
+    def handle_data(self, data):
+        if self._recording and self._stack:
+            node = self._stack[-1][1]
+            # script/style 等元素使用对应的字符串类型，与BeautifulSoup解析结果一致
+            string_class = self._skeleton.builder.string_containers.get(node.name, NavigableString)
+            node.append(string_class(data))
+
+    def _close(self, node, sequence):
+        """元素结束：交出匹配的元素；不在匹配元素内部时删除子树和更早的兄弟元素"""
+        if sequence is not None:
+            self._recording -= 1
+            self.on_element(node, sequence)
+        if not self._recording:
+            node.clear(decompose=True)
+            previous = node.previous_sibling
+            if previous is not None:
+                previous.decompose()
+
+    def finish(self):
+        """输入结束：关闭所有未闭合的元素"""
+        self.close()
+        while self._stack:
+            _, node, sequence = self._stack.pop()
+            self._close(node, sequence)
@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# 项目模块以平铺方式导入（与 app.py 在项目目录下运行时一致）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 配置在导入时读取环境变量，测试使用临时目录中的SQLite
+_TMP = tempfile.mkdtemp(prefix='observatory-test-')
+os.environ.setdefault('DATABASE_URL', f'sqlite:///{os.path.join(_TMP, "test.db")}')
+os.environ.setdefault('DATA_STORAGE_PATH', os.path.join(_TMP, 'data'))
+
+@pytest.fixture
+def app():
+    from app import create_app
+    from models import db
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def user(app):
+    from models import db, User
+    user = User(username='tester', password='secret')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+@pytest.fixture
+def logged_in(client, user):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+    return client
@@ -0,0 +1,17 @@
+import pytest
+from analysis_registry import _registry, _resolve, load_analysis
+
+SPECS = sorted(_registry.values(), key=lambda spec: spec.name)
+
+@pytest.mark.parametrize('spec', SPECS, ids=[spec.name for spec in SPECS])
+def test_registered_paths_resolve(spec):
+    """每个内置分析类型的 target / chunked 路径都能导入为可调用对象"""
+    missing = spec.missing_dependencies()
+    if missing:
+        pytest.skip(f'缺少依赖: {", ".join(missing)}')
+    for target in (spec.target, spec.chunked):
+        if target is not None:
+            assert callable(_resolve(target)), target
+
+def test_chunked_correlation_loads():
+    assert callable(load_analysis('correlation', chunked=True))
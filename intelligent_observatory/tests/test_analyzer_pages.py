@@ -0,0 +1,20 @@
+import json
+from models import db, AnalysisResult, DataSource
+
+def test_index_renders(logged_in):
+    db.session.add(DataSource(name='新闻', type='web', url='http://example.com', config='{}'))
+    db.session.add(AnalysisResult(name='相关性', type='correlation', content=json.dumps({'columns': []})))
+    db.session.add(AnalysisResult(name='插件', type='custom_plugin', content='{}'))
+    db.session.commit()
+
+    response = logged_in.get('/analyzer/')
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    assert '新闻' in page
+    # 只有支持图表的分析类型显示图表，图表脚本只输出一次
+    assert page.count('class="img-fluid analysis-chart"') == 1
+    assert page.count('function loadChart') == 1
+
+def test_index_requires_login(client):
+    response = client.get('/analyzer/')
+    assert response.status_code == 302
@@ -0,0 +1,88 @@
+import pytest
+
+from sqlalchemy.pool import QueuePool
+
+from db_routing import engine_options
+
+SETTINGS = {'pool_size': 3, 'max_overflow': 1, 'pool_timeout': 5, 'pool_recycle': 60, 'pool_pre_ping': True}
+
+def test_engine_options_keep_queue_pool_for_sqlite_file():
+    assert engine_options('sqlite:////tmp/observatory.db', SETTINGS) == SETTINGS
+    for uri in ('sqlite://', 'sqlite:///:memory:', 'sqlite:///file:x?mode=memory&uri=true'):
+        options = engine_options(uri, SETTINGS)
+        assert 'pool_size' not in options and options['pool_recycle'] == 60
+
+@pytest.fixture
+def replica_app(tmp_path, monkeypatch):
+    """主库和副本分别是两个SQLite文件，副本中的数据与主库不同，便于判断查询走了哪个库"""
+    from config import TestingConfig
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_REPLICA_URI', f'sqlite:///{tmp_path / "replica.db"}')
+    from app import create_app
+    from models import db, DataSource, CrawledData
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.metadata.create_all(db.engines['replica'])
+
+        source = DataSource(name='主库数据源', type='api', url='http://example.com')
+        db.session.add(source)
+        db.session.commit()
+        db.session.add(CrawledData(source_id=source.id, title='primary', content='primary row'))
+        db.session.commit()
+
+        with db.engines['replica'].begin() as connection:
+            connection.execute(DataSource.__table__.insert(),
+                               {'id': source.id, 'name': '副本数据源', 'type': 'api', 'url': 'http://example.com'})
+            connection.execute(CrawledData.__table__.insert(),
+                               [{'source_id': source.id, 'title': f'replica {i}', 'content': 'replica row',
+                                 'metadata': {'file_type': 'csv' if i % 2 else 'json'},
+                                 'meta_file_type': 'csv' if i % 2 else 'json'}
+                                for i in range(4)])
+        yield app, source.id
+        db.session.remove()
+        db.metadata.drop_all(db.engines['replica'])
+        db.drop_all()
+    # init_app 为每个绑定登记了元数据，其它测试的应用没有该绑定
+    db.metadatas.pop('replica', None)
+
+@pytest.fixture
+def replica_client(replica_app):
+    from models import db, User
+    app, source_id = replica_app
+    user = User(username='tester', password='secret')
+    db.session.add(user)
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+    return client, source_id
+
+def test_primary_file_engine_uses_queue_pool(replica_app):
+    from models import db
+    assert isinstance(db.engine.pool, QueuePool)
+    assert db.engine.pool.size() == 10
+    assert isinstance(db.engines['replica'].pool, QueuePool)
+
+def test_read_paths_use_replica(replica_app):
+    from db_routing import read_query
+    from models import db, CrawledData
+    from queries import AnalysisQuery
+    _, source_id = replica_app
+    assert db.session.query(CrawledData).count() == 1
+    assert read_query(CrawledData).count() == 4
+    assert len(AnalysisQuery(source_ids=[source_id]).all()) == 4
+
+def test_view_data_and_export_read_replica(replica_client):
+    client, source_id = replica_client
+    page = client.get(f'/crawler/view_data/{source_id}')
+    assert page.status_code == 200
+    html = page.get_data(as_text=True)
+    assert 'replica 0' in html and 'primary row' not in html
+
+    response = client.get(f'/crawler/export/{source_id}?meta.file_type=csv')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0].startswith('id,title,content')
+    assert [line.split(',')[1] for line in lines[1:]] == ['replica 1', 'replica 3']
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+from features import blocked_correlation, chunked_correlation, extract_features
+
+def _frame(rows, with_b):
+    return pd.DataFrame([{
+        'id': i, 'title': 't', 'content': 'x', 'url': '',
+        'metadata': {'a': float(i), 'b': 2.0 * i + i % 3} if with_b else {'a': float(i)},
+        'crawled_at': pd.NaT if i % 5 == 0 else pd.Timestamp('2026-01-01') + pd.Timedelta(hours=i),
+    } for i in rows])
+
+def test_blocked_correlation_is_pairwise_complete():
+    rng = np.random.default_rng(0)
+    matrix = rng.normal(size=(500, 3))
+    matrix[:, 1] += matrix[:, 0]
+    matrix[:, 2] += 1e6
+    matrix[rng.random(matrix.shape) < 0.2] = np.nan
+    corr, n_samples = blocked_correlation(matrix, block_size=37)
+    expected = pd.DataFrame(matrix).corr().to_numpy()
+    assert n_samples == 500
+    np.testing.assert_allclose(corr, expected, atol=1e-9)
+
+def test_chunked_correlation_adds_later_columns():
+    frames = [_frame(range(0, 40), False), _frame(range(40, 80), True)]
+    result = chunked_correlation(frames, {'features': ['metadata']})
+    assert result['numeric_columns'] == ['meta.a', 'meta.b']
+    assert result['correlation_matrix']['meta.a']['meta.b'] > 0.99
+    assert result['n_samples'] == 80
+
+def test_missing_crawled_at_is_nan():
+    matrix, names = extract_features(_frame(range(3), False), {'features': ['time']})
+    assert np.isnan(matrix[0, names.index('crawled_days')])
+    assert matrix[1, names.index('crawled_days')] > 20000
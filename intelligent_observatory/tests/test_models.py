@@ -0,0 +1,53 @@
+from datetime import datetime
+from sqlalchemy import inspect, text
+from models import db, CrawledData, DataSource, upgrade_schema
+
+def _source():
+    source = DataSource(name='接口', type='api', url='http://example.com/api', config='{}')
+    db.session.add(source)
+    db.session.commit()
+    return source
+
+def test_upgrade_schema_adds_missing_columns(app):
+    # 模拟提升字段之前的旧表
+    CrawledData.__table__.drop(db.engine)
+    with db.engine.begin() as connection:
+        connection.execute(text('CREATE TABLE crawled_data (id INTEGER PRIMARY KEY, source_id INTEGER NOT NULL, '
+                                'title VARCHAR(200) NOT NULL, content TEXT NOT NULL, url VARCHAR(500), '
+                                'metadata TEXT, crawled_at DATETIME)'))
+    added = upgrade_schema()
+    assert 'crawled_data.meta_source_type' in added
+    assert 'crawled_data.content_length' in added
+    columns = {column['name'] for column in inspect(db.engine).get_columns('crawled_data')}
+    assert {'meta_source_type', 'meta_file_path', 'meta_file_type', 'content_length'} <= columns
+    assert upgrade_schema() == []
+
+    source = _source()
+    db.session.add(CrawledData(source_id=source.id, title='t', content='abc', meta_data={'source_type': 'api'}))
+    db.session.commit()
+    item = CrawledData.query.one()
+    assert item.meta_source_type == 'api'
+    assert item.content_length == 3
+
+def test_metadata_crawled_at_does_not_overwrite_column(app):
+    source = _source()
+    crawled_at = datetime(2026, 3, 1, 12, 0)
+    item = CrawledData(source_id=source.id, title='t', content='c', crawled_at=crawled_at,
+                       meta_data={'crawled_at': '2020-01-01T00:00:00'})
+    db.session.add(item)
+    db.session.commit()
+    item.title = 'changed'
+    db.session.commit()
+    assert db.session.get(CrawledData, item.id).crawled_at == crawled_at
+
+def test_view_data_shows_metadata_filters(logged_in):
+    source = _source()
+    db.session.add_all([
+        CrawledData(source_id=source.id, title='csv文件', content='c', meta_data={'file_type': 'csv'}),
+        CrawledData(source_id=source.id, title='json文件', content='c', meta_data={'file_type': 'json'}),
+    ])
+    db.session.commit()
+    page = logged_in.get(f'/crawler/view_data/{source.id}?meta.file_type=csv').get_data(as_text=True)
+    assert 'csv文件' in page and 'json文件' not in page
+    assert 'file_type = csv' in page
+    assert '清除过滤' in page
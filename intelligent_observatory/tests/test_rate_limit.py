@@ -0,0 +1,51 @@
+import pytest
+
+from rate_limit import HostLimiter, HostLimiterRegistry, RateLimitTimeout
+from resilience import ERROR_LIMIT_WAIT, CrawlError, RetryPolicy, call_with_retry, CircuitBreaker
+
+SLOW = {'rate': 1.0, 'burst': 1, 'max_concurrency': 1, 'latency_target': 2.0}
+FAST = {'rate': 10.0, 'burst': 5, 'max_concurrency': 4, 'latency_target': 2.0}
+
+def test_forget_source_restores_remaining_settings():
+    limiters = HostLimiterRegistry()
+    limiter = limiters.get('api.example.com', FAST, source=1)
+    limiters.get('api.example.com', SLOW, source=2)
+    assert limiter.rate == 1.0
+
+    limiters.forget_source(2)
+    assert limiter.rate == 10.0
+    assert limiter.max_concurrency == 4
+
+    # 最后一个数据源删除后不再保留该主机的限流器
+    limiters.forget_source(1)
+    assert limiters.stats() == []
+
+def test_source_moved_to_other_host():
+    limiters = HostLimiterRegistry()
+    old = limiters.get('old.example.com', FAST, source=1)
+    limiters.get('old.example.com', SLOW, source=2)
+    limiters.get('new.example.com', SLOW, source=2)
+    assert old.rate == 10.0
+    assert [s['host'] for s in limiters.stats()] == ['new.example.com', 'old.example.com']
+
+def test_acquire_timeout_raises_dedicated_error():
+    limiter = HostLimiter('api.example.com', **SLOW)
+    limiter.acquire(timeout=1)
+    with pytest.raises(RateLimitTimeout) as info:
+        limiter.acquire(timeout=0.05)
+    assert info.value.host == 'api.example.com'
+
+def test_limit_wait_not_retried_and_not_counted_by_breaker():
+    breaker = CircuitBreaker('1', failure_threshold=1)
+    calls = []
+
+    def wait_for_slot():
+        calls.append(1)
+        raise RateLimitTimeout('api.example.com', 0.05)
+
+    with pytest.raises(CrawlError) as info:
+        call_with_retry(wait_for_slot, RetryPolicy(attempts=3, base_delay=0), breaker)
+    assert info.value.kind == ERROR_LIMIT_WAIT
+    assert isinstance(info.value.__cause__, RateLimitTimeout)
+    assert len(calls) == 1
+    assert breaker.allow()
@@ -0,0 +1,21 @@
+from models import db
+from user_cache import user_cache, load_cached_user
+
+def test_invalidated_after_commit(app, user):
+    assert load_cached_user(user.id) is not None
+    assert user_cache.get(user.id) is not None
+
+    user.is_active = False
+    db.session.flush()
+    # 提交前其它请求仍可能看到旧数据，缓存保留
+    assert user_cache.get(user.id) is not None
+    db.session.commit()
+    assert user_cache.get(user.id) is None
+    assert load_cached_user(user.id) is None
+
+def test_rollback_keeps_cache(app, user):
+    assert load_cached_user(user.id) is not None
+    user.password = 'changed'
+    db.session.flush()
+    db.session.rollback()
+    assert user_cache.get(user.id) is not None
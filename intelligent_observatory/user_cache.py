@@ -0,0 +1,127 @@
+import time
+import threading
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+from models import db, User
+from metrics import registry
+
+registry.describe('user_cache_hits_total', 'counter', '用户缓存命中次数')
+registry.describe('user_cache_misses_total', 'counter', '用户缓存未命中次数')
+registry.describe('user_cache_invalidations_total', 'counter', '用户缓存失效次数')
+
+class UserCache:
+    """进程内用户缓存（TTL + LRU），按用户id保存与会话分离的用户快照
+
+    失效只发生在执行修改的进程中：多进程部署时，其它进程缓存的用户（例如已停用或已改密码）
+    最多在 ttl 秒内仍然有效，所以默认 ttl 较短。
+    """
+
+    def __init__(self, maxsize=1024, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, maxsize, ttl):
+        """调整容量和过期时间，并清空缓存"""
+        with self._lock:
+            self.maxsize = maxsize
+            self.ttl = ttl
+            self._data.clear()
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.maxsize > 0
+
+    def get(self, user_id):
+        """返回未过期的用户快照，不存在时返回None"""
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is None:
+                return None
+            snapshot, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[user_id]
+                return None
+            self._data.move_to_end(user_id)
+            return snapshot
+
+    def put(self, user_id, snapshot):
+        """写入快照，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self._data[user_id] = (snapshot, time.monotonic() + self.ttl)
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, user_id):
+        """删除指定用户的缓存"""
+        with self._lock:
+            removed = self._data.pop(user_id, None) is not None
+        if removed:
+            registry.inc('user_cache_invalidations_total')
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+# 全局用户缓存
+user_cache = UserCache()
+
+def snapshot_user(user):
+    """复制用户的列属性，生成与会话无关的分离态对象"""
+    snapshot = User(
+        id=user.id,
+        username=user.username,
+        password_hash=user.password_hash,
+        created_at=user.created_at,
+        is_active=user.is_active
+    )
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+def load_cached_user(user_id):
+    """加载用户（login_manager.user_loader 使用）
+
+    命中缓存时把快照合并到当前会话而不查询数据库；已停用的用户视为未登录。
+    """
+    if not user_cache.enabled:
+        user = db.session.get(User, user_id)
+        return user if user is not None and user.is_active else None
+
+    snapshot = user_cache.get(user_id)
+    if snapshot is not None:
+        registry.inc('user_cache_hits_total')
+        return db.session.merge(snapshot, load=False)
+
+    registry.inc('user_cache_misses_total')
+    user = db.session.get(User, user_id)
+    if user is None or not user.is_active:
+        return None
+
+    user_cache.put(user_id, snapshot_user(user))
+    return user
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _mark_user_changed(mapper, connection, target):
+    """用户修改密码、停用或删除时记下用户id，事务提交后再清除缓存"""
+    session = object_session(target)
+    if session is None:
+        user_cache.invalidate(target.id)
+        return
+    session.info.setdefault('changed_user_ids', set()).add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_users(session):
+    for user_id in session.info.pop('changed_user_ids', ()):
+        user_cache.invalidate(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changed_users(session):
+    """回滚的修改没有生效，缓存保持不变"""
+    session.info.pop('changed_user_ids', None)
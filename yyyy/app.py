@@ -1,121 +1,160 @@
-import json
 import os
+
+# 多进程部署时（由 cluster.py 启动）先给标准库打补丁，消息代理的监听循环和SQLite锁才不会阻塞事件循环
+if os.environ.get('CHAT_MESSAGE_QUEUE'):
+    import eventlet
+    eventlet.monkey_patch()
+
+import json
 import re
+import atexit
 import asyncio
-import math
 from datetime import datetime
 from flask import Flask, render_template, request, jsonify
-from flask_socketio import SocketIO, emit, join_room, leave_room
+from flask_socketio import SocketIO, emit, join_room, leave_room, disconnect
+from presence import Presence
+from rooms import DEFAULT_ROOM, RoomError, RoomRegistry
+from shared_state import LOBBY, StateDB, SharedPresence, SharedRoomRegistry
+from typing_status import TypingAggregator
+from wire import WireFormats, FIELD_NAMES, encode as wire_encode
+from flood import FloodControl, OutboundLimitManager, DISCONNECT
+from archive import Archive, SearchError
+from assistant import build_assistant, AssistantPool, REJECT_USER_LIMIT
+
+app = Flask(__name__)
+app.config['SECRET_KEY'] = 'your-secret-key'
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 多进程部署：CHAT_MESSAGE_QUEUE 为消息队列地址（tcp:// 使用 cluster.py 中的本地代理，
+# redis:// 等地址交给 Flask-SocketIO 自带的适配器），CHAT_STATE_DB 为共享状态的SQLite文件
+MESSAGE_QUEUE = os.environ.get('CHAT_MESSAGE_QUEUE')
+STATE_DB = os.environ.get('CHAT_STATE_DB')
+# 单进程模式的聊天记录目录（压测等场景可以指定临时目录）
+HISTORY_DIR = os.environ.get('CHAT_HISTORY_DIR', os.path.join(BASE_DIR, 'history'))
+# 搜索用的聊天记录归档（多进程部署时与共享状态放在同一目录，各进程写同一个文件）
+ARCHIVE_DB = os.environ.get('CHAT_ARCHIVE_DB') or os.path.join(
+    os.path.dirname(os.path.abspath(STATE_DB)) if STATE_DB else HISTORY_DIR, 'archive.db')
+# 多进程共用一个端口时连接会被分到不同进程，轮询传输的后续请求可能落到别的进程，只能使用websocket；
+# 部署在支持会话保持的反向代理后面时可以设置 CHAT_TRANSPORTS=polling,websocket
+SOCKET_TRANSPORTS = os.environ.get('CHAT_TRANSPORTS', 'websocket' if MESSAGE_QUEUE else 'polling,websocket').split(',')
+# 客户端发来的单个数据包上限（字节），超过时服务端直接断开，不解析
+MAX_PACKET_SIZE = 64 * 1024
+
+if MESSAGE_QUEUE and MESSAGE_QUEUE.startswith('tcp://'):
+    from cluster import BrokerManager
+    socketio = SocketIO(app, cors_allowed_origins="*", client_manager=BrokerManager(MESSAGE_QUEUE),
+                        transports=SOCKET_TRANSPORTS, max_http_buffer_size=MAX_PACKET_SIZE)
+elif MESSAGE_QUEUE:
+    socketio = SocketIO(app, cors_allowed_origins="*", message_queue=MESSAGE_QUEUE, transports=SOCKET_TRANSPORTS,
+                        max_http_buffer_size=MAX_PACKET_SIZE)
+else:
+    socketio = SocketIO(app, cors_allowed_origins="*", client_manager=OutboundLimitManager(),
+                        max_http_buffer_size=MAX_PACKET_SIZE)
+
+# 客户端发送速率（每秒事件数和允许的突发数）：聊天消息单独限制，其它事件（输入状态、切换房间等）共用一个限制
+MESSAGE_RATE, MESSAGE_BURST = 2, 10
+EVENT_RATE, EVENT_BURST = 10, 30
+message_limit = FloodControl(MESSAGE_RATE, MESSAGE_BURST)
+event_limit = FloodControl(EVENT_RATE, EVENT_BURST)
+# 每个连接最多积压的待发送数据包，超过时按 CHAT_SLOW_CLIENTS（disconnect 或 drop）处理；
+# redis:// 等消息队列由 Flask-SocketIO 创建适配器，不做这项限制
+MAX_OUTBOUND_QUEUE = 500
+outbound = socketio.server.manager
+if isinstance(outbound, OutboundLimitManager):
+    outbound.limit_outbound(MAX_OUTBOUND_QUEUE, os.environ.get('CHAT_SLOW_CLIENTS', DISCONNECT))
+
+# 存储聊天记录（每个房间内存中保留最近 MAX_HISTORY 条，全部消息写入 history/ 目录下的分段日志）
+MAX_HISTORY = 1000
+MAX_ROOMS = 100
+# 加入聊天室和每次加载更多时发送的消息条数
+HISTORY_PAGE_SIZE = 20
+# 输入状态广播间隔和过期时间（秒）
+TYPING_TICK = 0.5
+TYPING_TTL = 3.0
+typing_status = TypingAggregator(TYPING_TTL)
+# 工作进程心跳间隔和超时（秒），超时进程留下的在线用户由其它进程清理
+HEARTBEAT_INTERVAL = 10
+HEARTBEAT_TIMEOUT = 30
+
+# 搜索结果每页条数
+SEARCH_PAGE_SIZE = 20
+archive = Archive(ARCHIVE_DB)
+atexit.register(archive.close)
+
+# 传输格式：客户端 join 时可以请求紧凑的二进制格式（见 wire.py），CHAT_COMPACT_WIRE=0 关闭
+wire_formats = WireFormats(os.environ.get('CHAT_COMPACT_WIRE', '1') != '0')
+
+def broadcast(event, payload, room, skip_sid=None):
+    """向房间广播：JSON 客户端和紧凑格式客户端分别在两个 Socket.IO 房间中，每种格式只编码一次"""
+    socketio.emit(event, payload, room=room, skip_sid=skip_sid)
+    if wire_formats.enabled:
+        socketio.emit(event, wire_encode(payload), room=wire_formats.compact_room(room), skip_sid=skip_sid)
+
+def send_to(sid, event, payload):
+    """按该连接协商的格式单独发送"""
+    socketio.emit(event, wire_formats.payload_for(sid, payload), to=sid)
+
+# presence 为已登录的用户（保证用户名唯一），每个房间另有自己的成员索引和聊天记录
+if STATE_DB:
+    state_db = StateDB(STATE_DB)
+    presence = SharedPresence(state_db)
+    rooms = SharedRoomRegistry(state_db, max_rooms=MAX_ROOMS)
+else:
+    presence = Presence()
+    rooms = RoomRegistry(HISTORY_DIR, MAX_HISTORY, MAX_ROOMS)
+
+# 川小农AI助手（意图在 assistant.py 中注册）
+assistant = build_assistant(lambda: len(presence))
 
 # 智能对话回复生成函数
 def generate_ai_response(user_query):
-    # 转换为小写以便匹配
-    query = user_query.lower()
-    
-    # 1. 问候语
-    greetings = ['你好', 'hi', 'hello', '早上好', '下午好', '晚上好', '晚安', '早', '嗨']
-    for greeting in greetings:
-        if greeting in query:
-            return f"{greeting}！我是川小农AI助手，有什么可以帮助你的吗？"
-    
-    # 2. 询问名字
-    if '叫什么' in query or '名字' in query or '是谁' in query:
-        return "我是川小农AI助手，很高兴为你服务！"
-    
-    # 3. 时间查询
-    if '时间' in query or '几点' in query:
-        now = datetime.now()
-        return f"当前时间是：{now.strftime('%Y-%m-%d %H:%M:%S')}"
-    
-    # 4. 日期查询
-    if '日期' in query or '今天' in query and ('几号' in query or '日期' in query):
-        now = datetime.now()
-        return f"今天是：{now.strftime('%Y年%m月%d日')}"
-    
-    # 5. 数学计算
-    math_patterns = [
-        (r'(\d+)\s*\+\s*(\d+)', lambda x, y: int(x) + int(y)),
-        (r'(\d+)\s*-\s*(\d+)', lambda x, y: int(x) - int(y)),
-        (r'(\d+)\s*\*\s*(\d+)', lambda x, y: int(x) * int(y)),
-        (r'(\d+)\s*/\s*(\d+)', lambda x, y: int(x) / int(y) if int(y) != 0 else "除数不能为零！"),
-        (r'(\d+)的平方', lambda x: int(x) ** 2),
-        (r'(\d+)的平方根', lambda x: math.sqrt(int(x)) if int(x) >= 0 else "负数没有实数平方根！")
-    ]
-    
-    for pattern, func in math_patterns:
-        match = re.search(pattern, query)
-        if match:
-            if len(match.groups()) == 2:
-                result = func(match.group(1), match.group(2))
-            else:
-                result = func(match.group(1))
-            return f"计算结果：{result}"
-    
-    # 6. 电影功能帮助
-    if '电影' in query and ('怎么' in query or '如何' in query or '使用' in query):
-        return "使用@电影命令可以播放视频，格式：@电影 视频URL。支持YouTube、Vimeo和直接视频文件。"
-    
-    # 7. 帮助信息
-    if '帮助' in query or '功能' in query or '怎么用' in query:
-        return "我可以帮助你：\n1. 聊天对话\n2. 查询时间日期\n3. 简单数学计算\n4. 播放电影（@电影 URL）\n5. 查看在线用户"
-    
-    # 8. 在线用户查询
-    if '在线' in query and ('人' in query or '用户' in query):
-        user_count = len(online_users)
-        if user_count == 0:
-            return "当前没有其他在线用户。"
-        elif user_count == 1:
-            return "当前有1位在线用户。"
-        else:
-            return f"当前有{user_count}位在线用户。"
-    
-    # 9. 退出相关
-    if '退出' in query or '离开' in query:
-        return "点击右上角的退出按钮可以离开聊天室。"
-    
-    # 10. 感谢类
-    if '谢谢' in query or '感谢' in query or 'thank' in query:
-        return "不客气，很高兴能帮到你！"
-    
-    # 11. 闲聊回复
-    casual_responses = [
-        "这个问题很有意思！",
-        "让我想想...",
-        "你能告诉我更多吗？",
-        "我理解你的意思。",
-        "这是个好问题！",
-        "我也觉得是这样。",
-        "很有见解！"
-    ]
-    
-    # 12. 默认回复
-    default_responses = [
-        "抱歉，我不太理解你的意思。",
-        "能换个方式问吗？",
-        "我正在学习中，还不太明白这个问题。",
-        "你可以试试问我其他问题。"
-    ]
-    
-    # 简单的随机回复选择（伪随机，根据查询长度选择）
-    if len(query) < 5:
-        return casual_responses[len(query) % len(casual_responses)]
-    else:
-        return default_responses[len(query) % len(default_responses)]
+    _, response = assistant.respond(user_query)
+    return response
 
+# 助手回复工作池：最多 ASSISTANT_WORKERS 个回复同时计算，排队和执行中的请求总数和每个用户的数量有上限
+ASSISTANT_WORKERS = 4
+ASSISTANT_MAX_PENDING = 64
+ASSISTANT_PER_USER = 2
+ASSISTANT_TIMEOUT = 5.0
+assistant_pool = AssistantPool(socketio, generate_ai_response, ASSISTANT_WORKERS, ASSISTANT_MAX_PENDING,
+                               ASSISTANT_PER_USER, ASSISTANT_TIMEOUT)
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your-secret-key'
-socketio = SocketIO(app, cors_allowed_origins="*")
+def request_assistant(room, query_message, sid):
+    """把 @川小农 提问交给工作池，回复通过 reply_to 对应到提问消息的id"""
+    def assistant_message(content):
+        return {
+            'room': room.name,
+            'type': 'ai_response',
+            'username': '川小农',
+            'content': content,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'reply_to': query_message['id'],
+            'reply_user': query_message['username']
+        }
+
+    def on_done(response, error):
+        if error is None:
+            ai_message = room.history.append(assistant_message(response))
+            archive.add(ai_message)
+            broadcast('new_message', ai_message, room.name)
+            return
+        # 超时或出错只告诉提问的用户，不写入聊天记录
+        if error != 'timeout':
+            print(f'助手回复出错: {error!r}')
+        send_to(sid, 'new_message', assistant_message('抱歉，我想得太久了，请稍后再问一次。'))
 
-# 存储在线用户信息
-online_users = {}
-# 存储聊天记录
-chat_history = []
-MAX_HISTORY = 100
+    rejected = assistant_pool.submit(query_message['username'], query_message['command_data']['query'], on_done)
+    if rejected == REJECT_USER_LIMIT:
+        send_to(sid, 'new_message', assistant_message('你的上一个问题我还在思考，请稍等。'))
+    elif rejected:
+        send_to(sid, 'new_message', assistant_message('现在提问的人太多了，请稍后再试。'))
 
 # 加载配置
 with open('config.json', 'r', encoding='utf-8') as f:
     config = json.load(f)
+MAX_MESSAGE_LENGTH = config.get('max_message_length', 500)
+MAX_USERNAME_LENGTH = config.get('max_username_length', 20)
 
 @app.route('/')
 def index():
@@ -123,16 +162,31 @@ def index():
 
 @app.route('/chat')
 def chat():
-    return render_template('chat.html')
+    return render_template('chat.html', socket_transports=SOCKET_TRANSPORTS, max_message_length=MAX_MESSAGE_LENGTH,
+                           compact_wire=wire_formats.enabled, wire_fields=FIELD_NAMES)
 
 @app.route('/config')
 def get_config():
     return jsonify(config)
 
+@app.route('/stats')
+def get_stats():
+    # 限流、慢客户端和助手工作池的计数
+    stats = {
+        'messages': message_limit.stats(),
+        'events': event_limit.stats(),
+        'assistant': assistant_pool.stats(),
+        'typing': typing_status.stats(),
+        'archive': archive.stats(),
+    }
+    if isinstance(outbound, OutboundLimitManager):
+        stats['outbound'] = outbound.stats()
+    return jsonify(stats)
+
 @app.route('/check_username', methods=['POST'])
 def check_username():
     username = request.json.get('username')
-    if username in online_users:
+    if username in presence:
         return jsonify({'exists': True})
     return jsonify({'exists': False})
 
@@ -142,37 +196,183 @@ def handle_connect():
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    sid = request.sid
-    for username, user_data in list(online_users.items()):
-        if user_data['sid'] == sid:
-            del online_users[username]
-            # 广播用户离开消息
-            socketio.emit('user_left', {'username': username, 'users': list(online_users.keys())})
-            leave_room('chatroom')
-            print(f'{username} disconnected')
-            break
+    for room, username, version in rooms.leave_all(request.sid):
+        typing_status.discard(room, username)
+        # 广播用户离开消息（增量）
+        broadcast('user_left', {'room': room, 'username': username, 'version': version}, room)
+    wire_formats.forget(request.sid)
+    message_limit.forget(request.sid)
+    event_limit.forget(request.sid)
+    left = presence.leave(request.sid)
+    if left is not None:
+        print(f'{left[0]} disconnected')
 
-@socketio.on('join')
-def handle_join(data):
-    username = data['username']
-    if username in online_users:
-        emit('join_error', {'message': '用户名已存在'})
+def enter_room(room, username):
+    """当前连接加入房间：发送成员快照和最近一页历史消息，向房间广播加入事件"""
+    version = rooms.join(room, username, request.sid)
+    if version is None:
+        emit('room_error', {'room': room.name, 'message': '你已经在这个房间中'})
         return
+    join_room(wire_formats.room_for(room.name, request.sid))
+    emit('room_joined', {'room': room.name})
     
-    online_users[username] = {'sid': request.sid, 'joined_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-    join_room('chatroom')
+    # 新成员收到完整的成员快照，其他成员只收到增量
+    send_to(request.sid, 'presence', dict(room.members.snapshot(), room=room.name))
     
-    # 发送历史消息给新用户
-    emit('history', {'messages': chat_history})
+    # 发送最近一页历史消息，更早的消息通过 load_more 获取
+    messages, has_more = room.history.page(limit=HISTORY_PAGE_SIZE)
+    send_to(request.sid, 'history', {'room': room.name, 'messages': messages, 'has_more': has_more})
     
-    # 广播新用户加入消息
-    socketio.emit('user_joined', {'username': username, 'users': list(online_users.keys())}, room='chatroom')
+    # 广播新成员加入消息（增量）
+    broadcast('user_joined', {'room': room.name, 'username': username, 'version': version},
+              room.name, skip_sid=request.sid)
+
+def current_room(data):
+    """事件数据中的房间（缺省为默认房间），当前连接不在该房间中时返回None"""
+    name = data.get('room', DEFAULT_ROOM) if isinstance(data, dict) else DEFAULT_ROOM
+    if name not in rooms.rooms_of(request.sid):
+        return None
+    return rooms.get(name)
+
+def throttled(limit):
+    """当前连接超过速率限制时返回True，持续刷屏的连接直接断开"""
+    allowed = limit.allow(request.sid)
+    if allowed is None:
+        print(f'{request.sid} 发送过快，已断开')
+        disconnect()
+    return not allowed
+
+@socketio.on('join')
+def handle_join(data):
+    # 登录（占用用户名）并进入指定房间，断线重连时客户端带上原来所在的房间
+    if throttled(event_limit):
+        return
+    username = data.get('username') if isinstance(data, dict) else None
+    if not isinstance(username, str) or not username.strip() or len(username) > MAX_USERNAME_LENGTH:
+        emit('join_error', {'message': f'用户名不能为空，最长{MAX_USERNAME_LENGTH}个字符'})
+        return
+    version = presence.join(username, request.sid)
+    if version is None:
+        emit('join_error', {'message': '用户名已存在'})
+        return
+    wire_formats.negotiate(request.sid, data.get('wire'))
+    emit('rooms', {'rooms': rooms.names()})
+    enter_room(rooms.get(data.get('room')) or rooms.get(DEFAULT_ROOM), username)
     print(f'{username} joined')
 
+@socketio.on('create_room')
+def handle_create_room(data):
+    if throttled(event_limit):
+        return
+    username = presence.username_of(request.sid)
+    if username is None:
+        return
+    name = data.get('room') if isinstance(data, dict) else None
+    try:
+        room = rooms.create(name)
+    except RoomError as e:
+        emit('room_error', {'room': name, 'message': str(e)})
+        return
+    # 房间列表变化不频繁，通知所有在线用户
+    socketio.emit('rooms', {'rooms': rooms.names()})
+    enter_room(room, username)
+
+@socketio.on('join_room')
+def handle_join_room(data):
+    if throttled(event_limit):
+        return
+    username = presence.username_of(request.sid)
+    if username is None:
+        return
+    room = rooms.get(data.get('room') if isinstance(data, dict) else None)
+    if room is None:
+        emit('room_error', {'room': data.get('room') if isinstance(data, dict) else None, 'message': '房间不存在'})
+        return
+    enter_room(room, username)
+
+@socketio.on('leave_room')
+def handle_leave_room(data):
+    if throttled(event_limit):
+        return
+    room = current_room(data)
+    if room is None:
+        return
+    left = rooms.leave(room, request.sid)
+    leave_room(wire_formats.room_for(room.name, request.sid))
+    emit('room_left', {'room': room.name})
+    if left is None:
+        return
+    username, version = left
+    typing_status.discard(room.name, username)
+    broadcast('user_left', {'room': room.name, 'username': username, 'version': version}, room.name)
+
+@socketio.on('sync_presence')
+def handle_sync_presence(data=None):
+    if throttled(event_limit):
+        return
+    # 客户端发现版本号不连续时请求完整快照
+    room = current_room(data)
+    if room is not None:
+        send_to(request.sid, 'presence', dict(room.members.snapshot(), room=room.name))
+
+@socketio.on('load_more')
+def handle_load_more(data):
+    if throttled(event_limit):
+        return
+    room = current_room(data)
+    try:
+        before = int(data['before'])
+    except (KeyError, TypeError, ValueError):
+        return
+    if room is None:
+        return
+    messages, has_more = room.history.page(before, HISTORY_PAGE_SIZE)
+    send_to(request.sid, 'more_history', {'room': room.name, 'messages': messages, 'has_more': has_more})
+
+@socketio.on('search_history')
+def handle_search_history(data):
+    # 在当前房间的归档中搜索，before 为上一页返回的 next 游标
+    if throttled(event_limit) or not isinstance(data, dict):
+        return
+    room = current_room(data)
+    if room is None:
+        return
+    query = data.get('query') or ''
+    user = data.get('user') or None
+    mention = data.get('mention') or None
+    if not all(isinstance(value, str) for value in (query, user or '', mention or '')):
+        return
+    try:
+        before = int(data['before']) if data.get('before') is not None else None
+    except (TypeError, ValueError):
+        return
+    try:
+        results, next_cursor = archive.search(room.name, query[:MAX_MESSAGE_LENGTH], user=user, mention=mention,
+                                              since=data.get('since') or None, until=data.get('until') or None,
+                                              before=before, limit=SEARCH_PAGE_SIZE)
+    except SearchError as e:
+        emit('search_error', {'room': room.name, 'message': str(e)})
+        return
+    send_to(request.sid, 'search_results', {'room': room.name, 'query': query, 'user': user, 'mention': mention,
+                                            'results': results, 'has_more': next_cursor is not None,
+                                            'next': next_cursor})
+
 @socketio.on('send_message')
 def handle_message(data):
-    username = data['username']
-    message = data['message']
+    room = current_room(data)
+    username = presence.username_of(request.sid)
+    if room is None or username is None:
+        return
+    # 先检查速率和长度，过长的内容不做后面的正则匹配
+    if throttled(message_limit):
+        emit('message_error', {'room': room.name, 'message': '发送太快了，请稍后再试'})
+        return
+    message = data.get('message')
+    if not isinstance(message, str) or not message.strip():
+        return
+    if len(message) > MAX_MESSAGE_LENGTH:
+        emit('message_error', {'room': room.name, 'message': f'消息不能超过{MAX_MESSAGE_LENGTH}个字符'})
+        return
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
     # 检查@命令
@@ -194,35 +394,22 @@ def handle_message(data):
             movie_url = 'https://' + movie_url
         command_data = {'url': movie_url}
     
-    # 检查@川小农命令
+    # 检查@川小农命令（回复在 assistant_pool 中计算，先广播用户的消息）
     elif message.startswith('@川小农'):
         message_type = 'ai_query'
         user_query = message[4:].strip()
         command_data = {'query': user_query}
-        
-        # 智能对话处理 - 根据用户输入提供不同回复
-        ai_response = generate_ai_response(user_query)
-        
-        ai_message = {
-            'type': 'ai_response',
-            'username': '川小农',
-            'content': ai_response,
-            'timestamp': timestamp
-        }
-        chat_history.append(ai_message)
-        if len(chat_history) > MAX_HISTORY:
-            chat_history.pop(0)
-        socketio.emit('new_message', ai_message, room='chatroom')
     
-    # 处理@用户名提醒
+    # 处理@用户名提醒（只提醒同一房间的成员）
     mentions = re.findall(r'@(\S+)', message)
     mentioned_users = []
     for mention in mentions:
-        if mention in online_users and mention != '电影' and mention != '川小农':
+        if mention in room.members and mention != '电影' and mention != '川小农':
             mentioned_users.append(mention)
     
     # 构造消息对象
     chat_message = {
+        'room': room.name,
         'type': message_type,
         'username': username,
         'content': processed_message,
@@ -231,33 +418,76 @@ def handle_message(data):
         'command_data': command_data
     }
     
-    # 保存到历史记录
-    chat_history.append(chat_message)
-    if len(chat_history) > MAX_HISTORY:
-        chat_history.pop(0)
+    # 保存到房间的历史记录
+    chat_message = room.history.append(chat_message)
+    archive.add(chat_message)
+    typing_status.discard(room.name, username)
+    
+    # 只广播给房间成员
+    broadcast('new_message', chat_message, room.name)
     
-    # 广播消息
-    socketio.emit('new_message', chat_message, room='chatroom')
+    if message_type == 'ai_query':
+        request_assistant(room, chat_message, request.sid)
     
     # 发送特殊提醒给被@的用户
     for mentioned_user in mentioned_users:
+        sid = room.members.sid_of(mentioned_user)
+        # 被@的用户可能已经离开，此时 to=None 会变成广播
+        if sid is None:
+            continue
         socketio.emit('mention_alert', {
+            'room': room.name,
             'from_user': username,
             'message': message
-        }, to=online_users[mentioned_user]['sid'])
+        }, to=sid)
 
 @socketio.on('typing')
 def handle_typing(data):
-    username = data['username']
-    socketio.emit('user_typing', {'username': username}, room='chatroom', skip_sid=request.sid)
+    if throttled(event_limit):
+        return
+    # 只更新输入状态，由 broadcast_typing 按固定间隔合并广播
+    room = current_room(data)
+    username = presence.username_of(request.sid)
+    if room is not None and username is not None:
+        typing_status.start(room.name, username)
 
 @socketio.on('stop_typing')
 def handle_stop_typing(data):
-    username = data['username']
-    socketio.emit('user_stopped_typing', {'username': username}, room='chatroom', skip_sid=request.sid)
+    if throttled(event_limit):
+        return
+    room = current_room(data)
+    username = presence.username_of(request.sid)
+    if room is not None and username is not None:
+        typing_status.stop(room.name, username)
+
+def broadcast_typing():
+    """每 TYPING_TICK 秒向输入状态有变化的房间广播一次完整的正在输入列表"""
+    while True:
+        socketio.sleep(TYPING_TICK)
+        for room, users in typing_status.collect():
+            broadcast('typing_update', {'room': room, 'users': users, 'source': typing_status.source}, room)
+
+def presence_heartbeat():
+    """定期写入本进程心跳，并清理已停止的工作进程留下的在线用户"""
+    while True:
+        socketio.sleep(HEARTBEAT_INTERVAL)
+        state_db.heartbeat()
+        for room, username, version in state_db.purge_stale(HEARTBEAT_TIMEOUT):
+            if room != LOBBY:
+                broadcast('user_left', {'room': room, 'username': username, 'version': version}, room)
 
 if __name__ == '__main__':
     # 确保templates目录存在
     if not os.path.exists('templates'):
         os.makedirs('templates')
-    socketio.run(app, host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    socketio.start_background_task(broadcast_typing)
+    if STATE_DB:
+        socketio.start_background_task(presence_heartbeat)
+    port = int(os.environ.get('CHAT_PORT', 5000))
+    if MESSAGE_QUEUE:
+        # 工作进程由 cluster.py 管理，不使用调试模式的自动重载
+        socketio.run(app, host=os.environ.get('CHAT_HOST', '0.0.0.0'), port=port, debug=False, use_reloader=False)
+    else:
+        # CHAT_DEBUG=0 关闭调试模式（调试模式的自动重载会另起一个子进程）
+        debug = os.environ.get('CHAT_DEBUG', '1') != '0'
+        socketio.run(app, host='0.0.0.0', port=port, debug=debug)
\ No newline at end of file
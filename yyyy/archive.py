@@ -0,0 +1,245 @@
+import os
+import re
+import json
+import sqlite3
+import threading
+from shared_state import run_blocking
+
+# 聊天记录归档与搜索：所有房间的消息写入一个SQLite文件，按关键词、发送者、被@的用户和时间范围搜索。
+#
+# 写入是异步批量的：add() 只把消息放进内存缓冲，后台线程每 flush_interval 秒（或攒够 batch_size 条）
+# 在一个事务中写入，广播路径上没有磁盘IO。刚发送的消息最多延迟 flush_interval 秒才能搜到。
+# eventlet 打过补丁时后台线程是协程，写入事务和搜索通过 run_blocking 放到系统线程中执行，不阻塞事件循环。
+#
+# 全文索引使用 FTS5。默认分词器把连续的汉字当成一个词，搜不到句子中间的词，所以写入前先自己分词：
+# 连续的中日韩文字切成单字和相邻两字（bigram），其它文字按单词切分并转为小写，用空格连接后写入索引。
+# 搜索时关键词按同样的方式切分，再用 LIKE 确认关键词在原文中是连续出现的。
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS archive (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    room TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    username TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    content TEXT NOT NULL,
+    data TEXT NOT NULL,
+    UNIQUE (room, id)
+);
+CREATE INDEX IF NOT EXISTS archive_user ON archive (room, username, seq);
+CREATE INDEX IF NOT EXISTS archive_time ON archive (room, timestamp);
+CREATE TABLE IF NOT EXISTS archive_mentions (
+    username TEXT NOT NULL,
+    room TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (username, room, seq)
+) WITHOUT ROWID;
+CREATE VIRTUAL TABLE IF NOT EXISTS archive_fts USING fts5 (tokens, content='');
+'''
+
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+_CJK_RUN = re.compile(f'[{_CJK}]+')
+_TOKEN = re.compile(f'[{_CJK}]+|[^\\W{_CJK}]+')
+
+# 时间范围参数：日期或日期加时间，与消息的 timestamp 格式（%Y-%m-%d %H:%M:%S）按字符串比较
+TIME_RANGE = re.compile(r'^\d{4}-\d{2}-\d{2}( \d{2}:\d{2}(:\d{2})?)?$')
+
+def _bigrams(run):
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+def index_tokens(text):
+    """写入全文索引的分词结果"""
+    tokens = []
+    for token in _TOKEN.findall(text):
+        if _CJK_RUN.fullmatch(token):
+            tokens.extend(token)
+            tokens.extend(_bigrams(token))
+        else:
+            tokens.append(token.lower())
+    return ' '.join(tokens)
+
+def _match_expression(term):
+    """一个关键词对应的 FTS5 查询；没有可索引的文字（只有标点等）时返回None"""
+    parts = []
+    for token in _TOKEN.findall(term):
+        if _CJK_RUN.fullmatch(token):
+            grams = _bigrams(token) or [token]
+            parts.extend(f'"{gram}"' for gram in grams)
+        else:
+            # 英文和数字按前缀匹配
+            parts.append(f'"{token.lower()}"*')
+    return ' AND '.join(parts) or None
+
+def _like_pattern(term):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+class SearchError(Exception):
+    pass
+
+class Archive:
+    """聊天记录归档
+
+    每条消息以 (房间, id) 去重，分页游标 seq 为归档中的写入顺序。
+    缓冲中的消息超过 max_pending 条（写入跟不上）时丢弃新消息并计数。
+    """
+
+    def __init__(self, path, batch_size=200, flush_interval=1.0, max_pending=10000):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        # 写入和搜索各用一个连接，WAL模式下搜索不会被写入阻塞
+        self._writer = self._connect()
+        self._writer.executescript(_SCHEMA)
+        self._reader = self._connect()
+        self._read_lock = threading.Lock()
+        # 统计
+        self.archived = 0
+        self.batches = 0
+        self.dropped = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name='archive-writer', daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def add(self, message):
+        """把消息放入写入缓冲，不等待写入"""
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending.append(message)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """立即写入缓冲中的消息"""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+        try:
+            with self._write_lock:
+                written = run_blocking(self._write, batch)
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f'写入聊天记录归档失败: {e}')
+            return
+        self.archived += written
+        self.batches += 1
+
+    def _write(self, batch):
+        """在一个事务中写入，返回实际写入的条数（重复的消息跳过）"""
+        conn = self._writer
+        written = 0
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for message in batch:
+                content = message.get('content') or ''
+                cursor = conn.execute(
+                    'INSERT OR IGNORE INTO archive (room, id, username, timestamp, content, data) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (message['room'], message['id'], message['username'], message['timestamp'], content,
+                     json.dumps(message, ensure_ascii=False)))
+                if not cursor.rowcount:
+                    continue
+                seq = cursor.lastrowid
+                written += 1
+                conn.execute('INSERT INTO archive_fts (rowid, tokens) VALUES (?, ?)', (seq, index_tokens(content)))
+                conn.executemany('INSERT OR IGNORE INTO archive_mentions (username, room, seq) VALUES (?, ?, ?)',
+                                 [(user, message['room'], seq) for user in message.get('mentions') or ()])
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return written
+
+    def search(self, room, query='', user=None, mention=None, since=None, until=None, before=None, limit=20):
+        """在房间中搜索，按时间从新到旧返回 (消息列表, 下一页的 before 游标或None)
+
+        query 按空白分成多个关键词，每个都要出现；user 为发送者，mention 为被@的用户；
+        since、until 为日期（until 只写日期时包含当天）；before 为上一页返回的游标。
+        """
+        conditions = ['a.room = ?']
+        params = [room]
+        expressions = []
+        for term in query.split():
+            expression = _match_expression(term)
+            if expression is not None:
+                expressions.append(expression)
+            conditions.append("a.content LIKE ? ESCAPE '\\'")
+            params.append(_like_pattern(term))
+        if expressions:
+            # 有关键词时从全文索引按 rowid 倒序取，凑够一页就停止，不需要先取出全部匹配的消息
+            source = 'archive_fts JOIN archive a ON a.seq = archive_fts.rowid'
+            conditions.insert(0, 'archive_fts MATCH ?')
+            params.insert(0, ' AND '.join(expressions))
+            order = 'archive_fts.rowid'
+            if mention:
+                conditions.append('a.seq IN (SELECT seq FROM archive_mentions WHERE username = ? AND room = ?)')
+                params.extend((mention, room))
+        elif mention:
+            # 同样从 @ 索引按 seq 倒序取
+            source = 'archive_mentions m JOIN archive a ON a.seq = m.seq'
+            conditions[:0] = ['m.username = ?', 'm.room = ?']
+            params[:0] = [mention, room]
+            order = 'm.seq'
+        else:
+            source = 'archive a'
+            order = 'a.seq'
+        if user:
+            conditions.append('a.username = ?')
+            params.append(user)
+        for value, op in ((since, '>='), (until, '<=')):
+            if value is None:
+                continue
+            if not isinstance(value, str) or not TIME_RANGE.match(value):
+                raise SearchError('时间格式应为 YYYY-MM-DD 或 YYYY-MM-DD HH:MM')
+            if op == '<=' and len(value) == 10:
+                value += ' 23:59:59'
+            elif op == '<=' and len(value) == 16:
+                value += ':59'
+            conditions.append(f'a.timestamp {op} ?')
+            params.append(value)
+        if before is not None:
+            conditions.append(f'{order} < ?')
+            params.append(before)
+        sql = f'SELECT a.seq, a.data FROM {source} WHERE {" AND ".join(conditions)} ORDER BY {order} DESC LIMIT ?'
+        params.append(limit + 1)
+        with self._read_lock:
+            rows = run_blocking(lambda: self._reader.execute(sql, params).fetchall())
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return [json.loads(data) for _, data in rows], (rows[-1][0] if has_more else None)
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {'pending': pending, 'archived': self.archived, 'batches': self.batches,
+                'dropped': self.dropped, 'errors': self.errors}
+
+    def close(self):
+        """停止后台写入并写入剩余的消息"""
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join(timeout=5)
+        self.flush()
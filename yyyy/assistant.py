@@ -0,0 +1,202 @@
+import math
+import time
+import zlib
+import threading
+from collections import defaultdict
+from datetime import datetime
+from intents import IntentEngine, Intent
+
+# 川小农AI助手：意图表和后台回复工作池
+#
+# 意图优先级数字越小越先匹配，与原来 if 判断链的顺序一致。
+# 回复在工作池中计算，不占用 socket 事件处理，处理较慢（例如以后接入模型）也不影响消息广播。
+
+GREETINGS = ['你好', 'hi', 'hello', '早上好', '下午好', '晚上好', '晚安', '早', '嗨']
+
+# 闲聊回复（较短的查询）
+CASUAL_RESPONSES = [
+    "这个问题很有意思！",
+    "让我想想...",
+    "你能告诉我更多吗？",
+    "我理解你的意思。",
+    "这是个好问题！",
+    "我也觉得是这样。",
+    "很有见解！"
+]
+
+# 默认回复
+DEFAULT_RESPONSES = [
+    "抱歉，我不太理解你的意思。",
+    "能换个方式问吗？",
+    "我正在学习中，还不太明白这个问题。",
+    "你可以试试问我其他问题。"
+]
+
+def fallback_response(query):
+    # 按查询内容的哈希选择，同一个问题总是得到同样的回复（可以缓存）
+    responses = CASUAL_RESPONSES if len(query) < 5 else DEFAULT_RESPONSES
+    return responses[zlib.crc32(query.encode('utf-8')) % len(responses)]
+
+def _reply(text):
+    return lambda query, found, match: text
+
+def _greeting(query, found, match):
+    # 多个问候语同时出现时按 GREETINGS 的顺序取第一个
+    greeting = next(g for g in GREETINGS if g in found)
+    return f"{greeting}！我是川小农AI助手，有什么可以帮助你的吗？"
+
+def _current_time(query, found, match):
+    return f"当前时间是：{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+
+def _current_date(query, found, match):
+    return f"今天是：{datetime.now().strftime('%Y年%m月%d日')}"
+
+def _divide(x, y):
+    return x / y if y != 0 else "除数不能为零！"
+
+def _calculate(func):
+    def handler(query, found, match):
+        return f"计算结果：{func(*(int(g) for g in match.groups()))}"
+    return handler
+
+MATH_PATTERNS = [
+    (r'(\d+)\s*\+\s*(\d+)', lambda x, y: x + y),
+    (r'(\d+)\s*-\s*(\d+)', lambda x, y: x - y),
+    (r'(\d+)\s*\*\s*(\d+)', lambda x, y: x * y),
+    (r'(\d+)\s*/\s*(\d+)', _divide),
+    (r'(\d+)的平方(?!根)', lambda x: x ** 2),
+    (r'(\d+)的平方根', math.sqrt),
+]
+
+def build_assistant(online_count, cache_size=1024):
+    """创建带默认意图的引擎，online_count() 返回当前在线人数"""
+    engine = IntentEngine(fallback_response, cache_size)
+    engine.register(Intent('greeting', _greeting, keywords=[GREETINGS], priority=10))
+    engine.register(Intent('name', _reply("我是川小农AI助手，很高兴为你服务！"),
+                           keywords=[['叫什么', '名字', '是谁']], priority=20))
+    engine.register(Intent('time', _current_time, keywords=[['时间', '几点']], priority=30, cacheable=False))
+    engine.register(Intent('date', _current_date, keywords=[['日期']], priority=40, cacheable=False))
+    engine.register(Intent('date', _current_date, keywords=[['今天'], ['几号']], priority=40, cacheable=False))
+    for pattern, func in MATH_PATTERNS:
+        engine.register(Intent('math', _calculate(func), pattern=pattern, priority=50))
+    engine.register(Intent('movie_help', _reply("使用@电影命令可以播放视频，格式：@电影 视频URL。支持YouTube、Vimeo和直接视频文件。"),
+                           keywords=[['电影'], ['怎么', '如何', '使用']], priority=60))
+    engine.register(Intent('help', _reply("我可以帮助你：\n1. 聊天对话\n2. 查询时间日期\n3. 简单数学计算\n4. 播放电影（@电影 URL）\n5. 查看在线用户"),
+                           keywords=[['帮助', '功能', '怎么用']], priority=70))
+
+    def online_users(query, found, match):
+        user_count = online_count()
+        if user_count == 0:
+            return "当前没有其他在线用户。"
+        elif user_count == 1:
+            return "当前有1位在线用户。"
+        return f"当前有{user_count}位在线用户。"
+    engine.register(Intent('online_users', online_users, keywords=[['在线'], ['人', '用户']], priority=80,
+                           cacheable=False))
+
+    engine.register(Intent('exit', _reply("点击右上角的退出按钮可以离开聊天室。"), keywords=[['退出', '离开']], priority=90))
+    engine.register(Intent('thanks', _reply("不客气，很高兴能帮到你！"), keywords=[['谢谢', '感谢', 'thank']], priority=100))
+    return engine
+
+# submit 的拒绝原因
+REJECT_BUSY = 'busy'
+REJECT_USER_LIMIT = 'user_limit'
+
+class AssistantPool:
+    """有界的助手回复工作池
+
+    最多 max_pending 个请求排队或执行中，每个用户最多 per_user 个；超出时 submit 返回拒绝原因。
+    workers 个后台任务依次取出请求，用 respond(query) 计算回复，超过 timeout 秒（含排队时间）视为超时。
+    完成后调用 on_done(回复文本或None, 错误或None)，错误为 'timeout' 或处理函数抛出的异常；
+    on_done 抛出的异常记录后计入 errors，工作任务继续运行。
+    """
+
+    def __init__(self, socketio, respond, workers=4, max_pending=64, per_user=2, timeout=5.0):
+        self.socketio = socketio
+        self.respond = respond
+        self.workers = workers
+        self.max_pending = max_pending
+        self.per_user = per_user
+        self.timeout = timeout
+        self._queue = None
+        self._pending = defaultdict(int)
+        self._total = 0
+        self._lock = threading.Lock()
+        # 统计
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def start(self):
+        """启动工作任务（第一次 submit 时自动调用）"""
+        self._queue = self.socketio.server.eio.create_queue()
+        for _ in range(self.workers):
+            self.socketio.start_background_task(self._worker)
+
+    def submit(self, username, query, on_done):
+        """提交请求，成功返回None，否则返回拒绝原因"""
+        if self._queue is None:
+            self.start()
+        with self._lock:
+            if self._total >= self.max_pending:
+                self.rejected += 1
+                return REJECT_BUSY
+            if self._pending[username] >= self.per_user:
+                self.rejected += 1
+                return REJECT_USER_LIMIT
+            self._pending[username] += 1
+            self._total += 1
+        self._queue.put((username, query, on_done, time.monotonic() + self.timeout))
+        return None
+
+    def _worker(self):
+        while True:
+            username, query, on_done, deadline = self._queue.get()
+            response, error = None, None
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError
+                response = self._call(query, remaining)
+                self.completed += 1
+            except TimeoutError:
+                error = 'timeout'
+                self.timeouts += 1
+            except Exception as e:
+                error = e
+                self.errors += 1
+            finally:
+                with self._lock:
+                    self._total -= 1
+                    self._pending[username] -= 1
+                    if not self._pending[username]:
+                        del self._pending[username]
+            # 回调出错（例如写入聊天记录失败）不能让工作任务退出，否则队列无人处理
+            try:
+                on_done(response, error)
+            except Exception as e:
+                self.errors += 1
+                print(f'助手回复回调出错: {e!r}')
+
+    def _call(self, query, timeout):
+        """执行 respond(query)，超时抛出 TimeoutError"""
+        if self.socketio.async_mode == 'eventlet':
+            import eventlet
+            from eventlet import tpool
+            # 无论是否打过补丁都放到系统线程中执行：计算量大或阻塞的处理函数不占用事件循环，
+            # 超时只中断等待的协程，系统线程中的调用完成后结果被丢弃
+            with eventlet.Timeout(timeout, TimeoutError):
+                return tpool.execute(self.respond, query)
+        # threading 模式下工作任务本身就是系统线程，无法中断，只能在完成后判断是否超时
+        start = time.monotonic()
+        response = self.respond(query)
+        if time.monotonic() - start > timeout:
+            raise TimeoutError
+        return response
+
+    def stats(self):
+        with self._lock:
+            pending = self._total
+        return {'pending': pending, 'completed': self.completed, 'rejected': self.rejected,
+                'timeouts': self.timeouts, 'errors': self.errors}
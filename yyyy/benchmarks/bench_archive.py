@@ -0,0 +1,116 @@
+# 聊天记录归档基准测试：比较逐条同步写入和异步批量写入（archive.Archive）在发送路径上的耗时，
+# 以及归档较大时的搜索耗时。
+#
+# 在临时目录中生成数据，不启动服务器。在 yyyy 目录下：
+#   python benchmarks/bench_archive.py
+#   python benchmarks/bench_archive.py --messages 200000 --searches 200
+import os
+import sys
+import time
+import random
+import tempfile
+import argparse
+import statistics
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, PROJECT_DIR)
+
+from archive import Archive
+
+WORDS = ['你好', '今天', '作业', '图书馆', '食堂', '实验', '明天', '考试', '一起', '去吗', 'ok', 'hello', '哈哈',
+         '老师', '课程', '周末', '电影', '打球', '复习', '报告', '红烧肉', '宿舍', '快递', 'python', 'flask']
+USERS = [f'user{n}' for n in range(50)]
+
+def make_messages(count, seed):
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1, 8, 0, 0)
+    for n in range(count):
+        mentions = [rng.choice(USERS)] if rng.random() < 0.1 else []
+        content = ''.join(rng.choice(WORDS) for _ in range(rng.randint(3, 15)))
+        if mentions:
+            content = f'@{mentions[0]} {content}'
+        yield {
+            'room': 'chatroom',
+            'type': 'text',
+            'username': rng.choice(USERS),
+            'content': content,
+            'timestamp': (start + timedelta(seconds=n * 7)).strftime('%Y-%m-%d %H:%M:%S'),
+            'mentions': mentions,
+            'command_data': None,
+            'id': n + 1,
+        }
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.mean(samples), samples[len(samples) * 99 // 100]
+
+def bench_writes(messages, directory):
+    """返回 [(方式, 平均耗时µs, p99耗时µs, 总耗时秒)]"""
+    rows = []
+    sync = Archive(os.path.join(directory, 'sync.db'), flush_interval=3600)
+    samples = []
+    start = time.perf_counter()
+    for message in messages:
+        t = time.perf_counter()
+        # 同步写入：每条消息一个事务
+        sync._write([message])
+        samples.append((time.perf_counter() - t) * 1e6)
+    rows.append(('逐条同步写入', *percentiles(samples), time.perf_counter() - start))
+    sync.close()
+
+    batched = Archive(os.path.join(directory, 'batched.db'))
+    samples = []
+    start = time.perf_counter()
+    for message in messages:
+        t = time.perf_counter()
+        batched.add(message)
+        samples.append((time.perf_counter() - t) * 1e6)
+    batched.close()
+    rows.append(('异步批量写入', *percentiles(samples), time.perf_counter() - start))
+    return rows
+
+def bench_search(archive, searches, seed):
+    rng = random.Random(seed)
+    cases = {
+        '关键词': lambda: {'query': rng.choice(WORDS)},
+        '两个关键词': lambda: {'query': f'{rng.choice(WORDS)} {rng.choice(WORDS)}'},
+        '发送者': lambda: {'user': rng.choice(USERS)},
+        '被@的用户': lambda: {'mention': rng.choice(USERS)},
+        '关键词+时间范围': lambda: {'query': rng.choice(WORDS), 'since': '2026-01-05', 'until': '2026-01-10'},
+    }
+    for name, make in cases.items():
+        samples = []
+        for _ in range(searches):
+            kwargs = make()
+            t = time.perf_counter()
+            archive.search('chatroom', **kwargs)
+            samples.append((time.perf_counter() - t) * 1e3)
+        mean, p99 = percentiles(samples)
+        print(f'{name:<12}{mean:>12.2f}{p99:>12.2f}')
+
+def main():
+    parser = argparse.ArgumentParser(description='聊天记录归档基准测试')
+    parser.add_argument('--writes', type=int, default=5000, help='测量写入耗时的消息条数')
+    parser.add_argument('--messages', type=int, default=100000, help='搜索测试的归档消息条数')
+    parser.add_argument('--searches', type=int, default=100, help='每种搜索的次数')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f'写入 {args.writes} 条消息（发送路径上每条消息的耗时）')
+        print(f'{"方式":<12}{"平均µs":>10}{"p99µs":>10}{"总耗时s":>10}')
+        for name, mean, p99, total in bench_writes(list(make_messages(args.writes, args.seed)), directory):
+            print(f'{name:<12}{mean:>12.1f}{p99:>12.1f}{total:>12.2f}')
+
+        archive = Archive(os.path.join(directory, 'search.db'), batch_size=5000)
+        for message in make_messages(args.messages, args.seed):
+            archive.add(message)
+        archive.close()
+        print(f'\n在 {args.messages} 条消息中搜索（每页20条，毫秒）')
+        print(f'{"条件":<12}{"平均ms":>10}{"p99ms":>10}')
+        bench_search(archive, args.searches, args.seed)
+
+if __name__ == '__main__':
+    main()
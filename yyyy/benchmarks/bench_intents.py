@@ -0,0 +1,108 @@
+# 意图匹配基准测试：在默认意图之外注册大量合成的关键词意图，测量每次查询的耗时
+#
+# 对比逐个意图做子串判断（原 if 判断链的做法）、Aho-Corasick 引擎（无缓存）和缓存命中三种情况。在 yyyy 目录下：
+#   python benchmarks/bench_intents.py --intents 10000 --queries 2000
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, PROJECT_DIR)
+
+from intents import Intent
+from assistant import build_assistant, fallback_response
+
+# 常用汉字范围内随机取字生成关键词和查询
+CHARS = [chr(c) for c in range(0x4e00, 0x4e00 + 3000)]
+
+SAMPLE_QUERIES = ['你好', '你叫什么名字', '现在几点了', '12*12', '9的平方根', '电影怎么用', '在线人数', '谢谢']
+
+def synthetic_intents(count, rng):
+    """生成 count 个意图，每个意图 1~3 个关键词，部分意图带第二组关键词"""
+    intents = []
+    for i in range(count):
+        keywords = [[''.join(rng.choices(CHARS, k=rng.randint(2, 4))) for _ in range(rng.randint(1, 3))]]
+        if rng.random() < 0.3:
+            keywords.append([''.join(rng.choices(CHARS, k=2))])
+        intents.append(Intent(f'synthetic-{i}', lambda query, found, match, i=i: f'意图 {i}',
+                              keywords=keywords, priority=200 + i))
+    return intents
+
+def synthetic_queries(count, intents, rng):
+    """随机文本，约一半包含某个合成意图的关键词"""
+    queries = []
+    for _ in range(count):
+        text = ''.join(rng.choices(CHARS, k=rng.randint(8, 30)))
+        if rng.random() < 0.5:
+            intent = rng.choice(intents)
+            keyword = ''.join(rng.choice(group) for group in intent.keywords)
+            position = rng.randint(0, len(text))
+            text = text[:position] + keyword + text[position:]
+        elif rng.random() < 0.2:
+            text = rng.choice(SAMPLE_QUERIES)
+        queries.append(text)
+    return queries
+
+def linear_respond(intents, query):
+    """基线：按优先级逐个意图做子串判断"""
+    query = query.lower()
+    for intent in intents:
+        if intent.keywords and not all(any(k in query for k in group) for group in intent.keywords):
+            continue
+        match = intent.pattern.search(query) if intent.pattern is not None else None
+        if intent.pattern is not None and match is None:
+            continue
+        found = {k for group in intent.keywords for k in group if k in query}
+        response = intent.handler(query, found, match)
+        if response is not None:
+            return intent.name, response
+    return None, fallback_response(query)
+
+def measure(func, queries):
+    """返回每次查询耗时（微秒）的列表"""
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        func(query)
+        timings.append((time.perf_counter() - start) * 1e6)
+    return timings
+
+def report(name, timings):
+    timings = sorted(timings)
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    print(f'{name:<20}{statistics.mean(timings):>10.1f}{statistics.median(timings):>10.1f}{p99:>10.1f}')
+
+def main():
+    parser = argparse.ArgumentParser(description='意图匹配基准测试')
+    parser.add_argument('--intents', type=int, default=10000, help='合成意图数量')
+    parser.add_argument('--queries', type=int, default=2000, help='查询数量')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    engine = build_assistant(lambda: 10, cache_size=args.queries)
+    intents = synthetic_intents(args.intents, rng)
+    start = time.perf_counter()
+    for intent in intents:
+        engine.register(intent)
+    engine.respond('')  # 触发自动机构建
+    print(f'注册 {len(engine)} 个意图并构建自动机: {time.perf_counter() - start:.2f} 秒')
+
+    queries = synthetic_queries(args.queries, intents, rng)
+    ordered = list(engine)
+    # 两种实现的结果应当一致
+    for query in queries[:200]:
+        assert linear_respond(ordered, query)[0] == engine.respond(query)[0], query
+
+    print(f'{"方式":<18}{"平均(µs)":>10}{"中位数":>10}{"p99":>10}')
+    report('逐个子串判断', measure(lambda q: linear_respond(ordered, q), queries))
+    engine.clear_cache()
+    report('自动机（无缓存）', measure(engine.respond, queries))
+    report('缓存命中', measure(engine.respond, queries))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+# 输入状态广播基准测试：模拟一个房间里的用户输入，比较逐条转发和合并广播的广播次数与送达次数
+#
+# 使用虚拟时钟按事件顺序模拟，不启动服务器。在 yyyy 目录下：
+#   python benchmarks/bench_typing.py --users 50 --duration 300
+#   python benchmarks/bench_typing.py --users 200 --tick 1.0
+import os
+import sys
+import heapq
+import random
+import argparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, PROJECT_DIR)
+
+from typing_status import TypingAggregator
+
+# 与 chat.html 一致：停止输入 500 毫秒后发送 stop_typing，持续输入时每秒续期一次
+STOP_DELAY = 0.5
+TYPING_REFRESH = 1.0
+
+def keystrokes(users, duration, seed):
+    """生成 [(时间, 用户, 本次输入是否以发送消息结束)]，每个用户交替输入和停顿"""
+    rng = random.Random(seed)
+    events = []
+    for user in range(users):
+        t = rng.uniform(0, 30)
+        while t < duration:
+            end = t + rng.uniform(2, 15)
+            while t < end:
+                events.append((t, user, False))
+                # 大部分按键间隔很短，偶尔停下来想一想
+                t += rng.uniform(0.1, 0.3) if rng.random() < 0.9 else rng.uniform(0.6, 2.0)
+            if rng.random() < 0.7:
+                events.append((t, user, True))
+            t += rng.uniform(5, 60)
+    events.sort()
+    return events
+
+def simulate(events, users, duration, aggregate, tick, ttl):
+    """返回 (客户端发送的输入事件数, 服务端广播次数, 送达客户端的事件数)"""
+    clock = [0.0]
+    aggregator = TypingAggregator(ttl, clock=lambda: clock[0])
+    typing = {}        # 用户 -> 上次发送 typing 的时间
+    stop_at = {}       # 用户 -> 计划发送 stop_typing 的时间
+    sent = broadcasts = deliveries = 0
+
+    # 事件队列：(时间, 顺序, 类型, 用户, 是否发送消息)
+    queue = [(t, i, 'key', user, send) for i, (t, user, send) in enumerate(events)]
+    if aggregate:
+        queue += [(k * tick, -k, 'tick', None, False) for k in range(1, int(duration / tick) + 1)]
+    heapq.heapify(queue)
+
+    def client_event(kind, user):
+        nonlocal sent, broadcasts, deliveries
+        sent += 1
+        if aggregate:
+            (aggregator.start if kind == 'typing' else aggregator.stop)('chatroom', user)
+        else:
+            # 原实现：每个事件立即转发给房间里的其他人
+            broadcasts += 1
+            deliveries += users - 1
+
+    while queue:
+        t, _, kind, user, send = heapq.heappop(queue)
+        if t > duration:
+            break
+        clock[0] = t
+        if kind == 'tick':
+            changed = aggregator.collect()
+            broadcasts += len(changed)
+            deliveries += len(changed) * users
+            continue
+        if kind == 'stop':
+            if stop_at.get(user) == t:
+                del stop_at[user], typing[user]
+                client_event('stop_typing', user)
+            continue
+        if send:
+            # 发送消息时客户端结束输入状态，服务端也随消息清除该用户的输入状态
+            if typing.pop(user, None) is not None:
+                stop_at.pop(user, None)
+                client_event('stop_typing', user)
+            continue
+        refresh = TYPING_REFRESH if aggregate else float('inf')
+        if user not in typing or t - typing[user] >= refresh:
+            typing[user] = t
+            client_event('typing', user)
+        stop_at[user] = t + STOP_DELAY
+        heapq.heappush(queue, (t + STOP_DELAY, 0, 'stop', user, False))
+    return sent, broadcasts, deliveries
+
+def main():
+    parser = argparse.ArgumentParser(description='输入状态广播基准测试')
+    parser.add_argument('--users', type=int, default=50, help='房间人数')
+    parser.add_argument('--duration', type=float, default=300, help='模拟时长（秒）')
+    parser.add_argument('--tick', type=float, default=0.5, help='合并广播间隔（秒）')
+    parser.add_argument('--ttl', type=float, default=3.0, help='输入状态过期时间（秒）')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    events = keystrokes(args.users, args.duration, args.seed)
+    print(f'{args.users} 人，{args.duration:.0f} 秒，按键 {sum(not send for _, _, send in events)} 次')
+    print(f'{"方式":<8}{"输入事件":>10}{"广播次数":>10}{"送达次数":>12}{"送达/秒":>10}')
+    for name, aggregate in (('逐条转发', False), ('合并广播', True)):
+        sent, broadcasts, deliveries = simulate(events, args.users, args.duration, aggregate, args.tick, args.ttl)
+        print(f'{name:<8}{sent:>12}{broadcasts:>12}{deliveries:>14}{deliveries / args.duration:>12.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# 传输格式基准测试：比较 JSON 和紧凑格式（wire.py）每条事件的字节数和编码耗时
+#
+# 字节数按 Socket.IO 数据包计算（JSON 为文本包，紧凑格式为二进制包：包头 + 二进制附件），
+# "JSON+gzip" 为轮询传输对较大响应启用压缩后的大小，供参考。不启动服务器。在 yyyy 目录下：
+#   python benchmarks/bench_wire.py
+#   python benchmarks/bench_wire.py --page 50 --large 500 --repeat 2000
+import os
+import sys
+import gzip
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, PROJECT_DIR)
+
+from socketio import packet
+import wire
+
+WORDS = ['你好', '今天', '作业', '图书馆', '食堂', '实验', '明天', '考试', '一起', '去吗', 'ok', 'hello', '哈哈',
+         '老师', '课程', '周末', '电影', '打球', '复习', '报告']
+
+def make_message(rng, message_id, when):
+    users = [f'user{n}' for n in range(50)]
+    username = rng.choice(users)
+    content = ''.join(rng.choice(WORDS) for _ in range(rng.randint(3, 20)))
+    mentions = []
+    if rng.random() < 0.1:
+        mentions = [rng.choice(users)]
+        content = f'@{mentions[0]} {content}'
+    return {
+        'room': 'chatroom',
+        'type': 'text',
+        'username': username,
+        'content': content,
+        'timestamp': when.strftime('%Y-%m-%d %H:%M:%S'),
+        'mentions': mentions,
+        'command_data': None,
+        'id': message_id,
+    }
+
+def make_history(rng, count):
+    start = datetime(2026, 1, 1, 8, 0, 0)
+    messages = [make_message(rng, n + 1, start + timedelta(seconds=n * 17)) for n in range(count)]
+    return {'room': 'chatroom', 'messages': messages, 'has_more': True}
+
+def json_packet(event, payload):
+    return packet.Packet(packet.EVENT, data=[event, payload]).encode().encode('utf-8')
+
+def compact_packet(event, payload):
+    encoded = packet.Packet(packet.EVENT, data=[event, wire.encode(payload)]).encode()
+    # 二进制包编码为 [包头, 附件...]
+    return [encoded[0].encode('utf-8')] + encoded[1:]
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description='传输格式基准测试')
+    parser.add_argument('--page', type=int, default=20, help='历史消息一页的条数')
+    parser.add_argument('--large', type=int, default=200, help='较大的历史消息条数')
+    parser.add_argument('--repeat', type=int, default=1000, help='测量编码耗时的重复次数')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cases = [
+        ('new_message', 'new_message', make_message(rng, 1234, datetime(2026, 1, 1, 12, 0, 0))),
+        ('user_joined', 'user_joined', {'room': 'chatroom', 'username': 'user7', 'version': 42}),
+        ('typing_update', 'typing_update', {'room': 'chatroom', 'users': ['user1', 'user2'], 'source': 'a' * 32}),
+        (f'history({args.page})', 'history', make_history(rng, args.page)),
+        (f'history({args.large})', 'history', make_history(rng, args.large)),
+    ]
+
+    print(f'{"事件":<16}{"JSON":>10}{"JSON+gzip":>12}{"紧凑":>10}{"节省":>8}{"JSON编码µs":>14}{"紧凑编码µs":>14}')
+    for name, event, payload in cases:
+        json_bytes = json_packet(event, payload)
+        gzip_size = len(gzip.compress(json_bytes))
+        compact_size = sum(len(part) for part in compact_packet(event, payload))
+        assert wire.decode(wire.encode(payload)) == payload
+        json_us = timed(lambda: json_packet(event, payload), args.repeat)
+        compact_us = timed(lambda: compact_packet(event, payload), args.repeat)
+        saved = 1 - compact_size / len(json_bytes)
+        print(f'{name:<16}{len(json_bytes):>10}{gzip_size:>12}{compact_size:>10}{saved:>8.0%}'
+              f'{json_us:>14.1f}{compact_us:>14.1f}')
+
+if __name__ == '__main__':
+    main()
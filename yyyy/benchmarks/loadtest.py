@@ -0,0 +1,463 @@
+# 聊天服务器压测：启动本地服务器（或连接已有服务器），模拟 N 个 Socket.IO 客户端加入、输入、发消息和 @川小农 提问，
+# 统计端到端送达延迟（p50/p95/p99）、每秒消息数、服务器CPU和内存，以及不同历史消息数量下的加入延迟。
+#
+# 在 yyyy 目录下：
+#   python benchmarks/loadtest.py --clients 50 --duration 30
+#   python benchmarks/loadtest.py --clients 100 --rate 0.5 --ai-ratio 0.1 --rooms 4
+#   python benchmarks/loadtest.py --clients 0 --history-sizes 0,10000,100000      # 只测加入延迟
+#   python benchmarks/loadtest.py --url http://127.0.0.1:5000 --server-pid 1234    # 压测已启动的服务器
+#   python benchmarks/loadtest.py --workers 1,2,4 --rooms 8 --history-sizes ''     # 比较不同工作进程数（cluster.py）
+#
+# 客户端使用 python-socketio；安装了 websocket-client 时可以用 --transport websocket。
+import os
+import re
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import defaultdict
+
+import socketio
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, PROJECT_DIR)
+
+from history import ChatHistory
+from rooms import DEFAULT_ROOM
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 消息末尾附带的压测标记：发送者编号、序号和发送时间
+MARK = re.compile(r'#lt (\d+):(\d+):([\d.]+)$')
+
+AI_QUERIES = ['你好', '现在几点', '12*34', '帮助', '在线人数', '谢谢']
+
+def percentile(values, p):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def latency_summary(values):
+    """毫秒为单位的 p50/p95/p99/最大值"""
+    ms = [v * 1000 for v in values]
+    return (f'p50 {percentile(ms, 50):.1f}ms  p95 {percentile(ms, 95):.1f}ms  '
+            f'p99 {percentile(ms, 99):.1f}ms  max {max(ms, default=float("nan")):.1f}ms  (n={len(ms)})')
+
+class ProcessSampler:
+    """每秒采样一次服务器进程的CPU占用和常驻内存（优先使用psutil，否则读取 /proc），多个进程时取合计"""
+
+    def __init__(self, pids, interval=1.0):
+        self.pids = pids
+        self.interval = interval
+        self.samples = []  # [(CPU百分比, RSS字节)]
+        self._stop = threading.Event()
+        self._ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+    def _cpu_seconds(self):
+        return sum(self._process_cpu(pid) for pid in self.pids)
+
+    def _rss(self):
+        return sum(self._process_rss(pid) for pid in self.pids)
+
+    def _process_cpu(self, pid):
+        if psutil is not None:
+            times = psutil.Process(pid).cpu_times()
+            return times.user + times.system
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self._ticks
+
+    @staticmethod
+    def _process_rss(pid):
+        if psutil is not None:
+            return psutil.Process(pid).memory_info().rss
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+        return 0
+
+    def _run(self):
+        last_cpu, last_time = self._cpu_seconds(), time.monotonic()
+        while not self._stop.wait(self.interval):
+            cpu, now = self._cpu_seconds(), time.monotonic()
+            self.samples.append(((cpu - last_cpu) / (now - last_time) * 100, self._rss()))
+            last_cpu, last_time = cpu, now
+
+    def start(self):
+        try:
+            self._cpu_seconds()
+        except (OSError, IndexError):
+            print(f'无法读取进程 {self.pids} 的CPU和内存（需要Linux的 /proc 或安装psutil），跳过采样')
+            return self
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def summary(self):
+        if not self.samples:
+            return 'CPU/RSS: 无数据'
+        cpu = [c for c, _ in self.samples]
+        rss = [r for _, r in self.samples]
+        return (f'CPU 平均 {sum(cpu) / len(cpu):.0f}%  峰值 {max(cpu):.0f}%   '
+                f'RSS 平均 {sum(rss) / len(rss) / 2**20:.1f}MB  峰值 {max(rss) / 2**20:.1f}MB')
+
+class LocalServer:
+    """在临时目录中启动 app.py（关闭调试模式），用于压测
+
+    workers 大于0时改用 cluster.py 启动多进程部署，每个工作进程监听单独的端口（urls），
+    压测客户端轮流连接各个端口。pids 为需要采样的进程（启动器中运行着消息代理，也计算在内）。
+    """
+
+    def __init__(self, history_dir, extra_env=None, workers=0):
+        self.history_dir = history_dir
+        ports = free_ports(max(workers, 1))
+        self.urls = [f'http://127.0.0.1:{port}' for port in ports]
+        self.url = self.urls[0]
+        env = dict(os.environ, CHAT_HISTORY_DIR=history_dir, CHAT_DEBUG='0', **(extra_env or {}))
+        if workers:
+            command = [sys.executable, 'cluster.py', '--workers', str(workers), '--port', str(ports[0]),
+                       '--port-per-worker', '--host', '127.0.0.1', '--broker-port', str(free_port()),
+                       '--state-db', os.path.join(history_dir, 'state.db')]
+        else:
+            command = [sys.executable, 'app.py']
+            env['CHAT_PORT'] = str(ports[0])
+        self.process = subprocess.Popen(command, cwd=PROJECT_DIR, env=env,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.pid = self.process.pid
+        for port in ports:
+            self._wait_ready(port)
+        self.pids = [self.pid] + (child_pids(self.pid) if workers else [])
+
+    def _wait_ready(self, port, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError('服务器启动失败')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError('等待服务器启动超时')
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def free_ports(count):
+    """count 个连续的空闲端口"""
+    while True:
+        base = free_port()
+        try:
+            for port in range(base, base + count):
+                with socket.socket() as s:
+                    s.bind(('127.0.0.1', port))
+            return list(range(base, base + count))
+        except OSError:
+            continue
+
+def child_pids(pid):
+    if psutil is not None:
+        return [child.pid for child in psutil.Process(pid).children()]
+    children = []
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as f:
+                if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                    children.append(int(name))
+        except (OSError, IndexError, ValueError):
+            continue
+    return children
+
+def prefill_history(history_dir, count):
+    """直接写入默认房间的分段日志，生成 count 条历史消息"""
+    history = ChatHistory(history_dir)
+    for i in range(count):
+        history.append({'room': DEFAULT_ROOM, 'type': 'text', 'username': f'history-{i % 50}',
+                        'content': f'历史消息 {i} ' + 'x' * 40, 'timestamp': '2024-01-01 00:00:00',
+                        'mentions': [], 'command_data': None})
+    history.close()
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.join_latency = []
+        self.delivery_latency = []
+        self.ai_latency = []
+        self.sent = 0
+        self.sent_by_room = defaultdict(int)
+        self.delivered = 0
+        self.ai_replies = 0
+        self.errors = defaultdict(int)
+
+class LoadClient:
+    """一个模拟用户：加入房间后按泊松过程发送消息，发送前先发几次 typing"""
+
+    def __init__(self, index, url, room, stats, transport, args):
+        self.index = index
+        self.url = url
+        self.room = room
+        self.stats = stats
+        self.transport = transport
+        self.args = args
+        self.username = f'lt-{index}-{random.randrange(10**6)}'
+        self.sio = socketio.Client(reconnection=False)
+        self.joined = threading.Event()
+        self.waiting_room = DEFAULT_ROOM
+        self.seq = 0
+        self.ai_pending = {}  # 提问消息id -> 发送时间
+        self.sio.on('history', self._on_history)
+        self.sio.on('new_message', self._on_message)
+        self.sio.on('join_error', lambda data: self._error('join_error'))
+        self.sio.on('room_error', lambda data: self._error('room_error'))
+
+    def _error(self, kind):
+        with self.stats.lock:
+            self.stats.errors[kind] += 1
+        self.joined.set()
+
+    def _on_history(self, data):
+        if data.get('room') == self.waiting_room:
+            self.joined.set()
+
+    def _on_message(self, data):
+        now = time.time()
+        if data.get('type') == 'ai_response':
+            sent = self.ai_pending.pop(data.get('reply_to'), None)
+            if sent is not None:
+                with self.stats.lock:
+                    self.stats.ai_replies += 1
+                    self.stats.ai_latency.append(now - sent)
+            return
+        match = MARK.search(data.get('content', ''))
+        if match is None:
+            return
+        sent = float(match.group(3))
+        if int(match.group(1)) == self.index and data.get('type') == 'ai_query':
+            self.ai_pending[data.get('id')] = sent
+        with self.stats.lock:
+            self.stats.delivered += 1
+            self.stats.delivery_latency.append(now - sent)
+
+    def connect(self):
+        self.sio.connect(self.url, transports=[self.transport])
+        start = time.perf_counter()
+        self.sio.emit('join', {'username': self.username, 'room': DEFAULT_ROOM})
+        if not self.joined.wait(30):
+            self._error('join_timeout')
+            return
+        if self.room != DEFAULT_ROOM:
+            self.joined.clear()
+            self.waiting_room = self.room
+            self.sio.emit('join_room', {'room': self.room})
+            self.joined.wait(30)
+            self.sio.emit('leave_room', {'room': DEFAULT_ROOM})
+        with self.stats.lock:
+            self.stats.join_latency.append(time.perf_counter() - start)
+
+    def run(self, stop):
+        rng = random.Random(self.index)
+        while not stop.wait(rng.expovariate(self.args.rate)):
+            for _ in range(rng.randint(1, 3)):
+                self.sio.emit('typing', {'room': self.room})
+            self.seq += 1
+            mark = f'#lt {self.index}:{self.seq}:{time.time():.6f}'
+            if rng.random() < self.args.ai_ratio:
+                message = f'@川小农 {rng.choice(AI_QUERIES)} {mark}'
+            else:
+                message = f'压测消息 {self.seq} {mark}'
+            self.sio.emit('send_message', {'room': self.room, 'message': message})
+            with self.stats.lock:
+                self.stats.sent += 1
+                self.stats.sent_by_room[self.room] += 1
+
+    def close(self):
+        try:
+            self.sio.disconnect()
+        except Exception:
+            pass
+
+def measure_join_latency(url, joins, transport):
+    """依次连接并加入 joins 次，返回每次从发出 join 到收到历史消息的耗时"""
+    timings = []
+    for i in range(joins):
+        sio = socketio.Client(reconnection=False)
+        received = threading.Event()
+        sio.on('history', lambda data: received.set())
+        sio.connect(url, transports=[transport])
+        start = time.perf_counter()
+        sio.emit('join', {'username': f'joiner-{i}-{random.randrange(10**6)}'})
+        if received.wait(30):
+            timings.append(time.perf_counter() - start)
+        sio.disconnect()
+    return timings
+
+def run_load(urls, args, pids):
+    """urls 中的每个地址轮流分配客户端，pids 为采样CPU和内存的服务器进程"""
+    url = urls[0]
+    stats = Stats()
+    rooms = [DEFAULT_ROOM] + [f'lt-room-{i}' for i in range(1, args.rooms)]
+    if args.rooms > 1:
+        # 先由一个客户端创建压测房间（已存在时服务端返回 room_error，忽略即可）
+        creator = socketio.Client(reconnection=False)
+        creator.connect(url, transports=[args.transport])
+        creator.emit('join', {'username': f'lt-creator-{random.randrange(10**6)}'})
+        for room in rooms[1:]:
+            creator.emit('create_room', {'room': room})
+        time.sleep(1)
+        creator.disconnect()
+
+    clients = [LoadClient(i, urls[i % len(urls)], rooms[i % len(rooms)], stats, args.transport, args)
+               for i in range(args.clients)]
+    print(f'连接 {args.clients} 个客户端（{len(rooms)} 个房间）...')
+    start = time.perf_counter()
+    for client in clients:
+        client.connect()
+        if args.ramp:
+            time.sleep(args.ramp / args.clients)
+    print(f'全部加入用时 {time.perf_counter() - start:.1f} 秒，加入延迟 {latency_summary(stats.join_latency)}')
+
+    sampler = ProcessSampler(pids).start() if pids else None
+    stop = threading.Event()
+    threads = [threading.Thread(target=client.run, args=(stop,), daemon=True) for client in clients]
+    with stats.lock:
+        stats.delivery_latency.clear()
+        stats.delivered = stats.sent = 0
+        stats.sent_by_room.clear()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    # 等待在途消息送达
+    time.sleep(args.drain)
+    elapsed = time.perf_counter() - start
+    if sampler:
+        sampler.stop()
+
+    # 每条消息应当送达房间里的每个客户端（包括发送者）
+    members = defaultdict(int)
+    for client in clients:
+        members[client.room] += 1
+    expected = sum(count * members[room] for room, count in stats.sent_by_room.items())
+    print(f'\n压测 {args.duration:.0f} 秒（另等待 {args.drain:.0f} 秒收尾）')
+    print(f'发送 {stats.sent} 条，{stats.sent / args.duration:.1f} 条/秒；'
+          f'送达 {stats.delivered}/{expected} 次，{stats.delivered / elapsed:.1f} 次/秒')
+    print(f'送达延迟   {latency_summary(stats.delivery_latency)}')
+    if args.ai_ratio:
+        print(f'助手回复   {latency_summary(stats.ai_latency)}')
+    if sampler:
+        print(sampler.summary())
+    if stats.errors:
+        print('错误:', dict(stats.errors))
+    for client in clients:
+        client.close()
+    return {
+        'clients': args.clients, 'rooms': len(rooms), 'duration': args.duration,
+        'sent': stats.sent, 'delivered': stats.delivered, 'expected_deliveries': expected,
+        'sent_per_second': stats.sent / args.duration, 'delivered_per_second': stats.delivered / elapsed,
+        'delivery_ms': {p: percentile(stats.delivery_latency, p) * 1000 for p in (50, 95, 99)},
+        'ai_ms': {p: percentile(stats.ai_latency, p) * 1000 for p in (50, 95, 99)},
+        'join_ms': {p: percentile(stats.join_latency, p) * 1000 for p in (50, 95, 99)},
+        'workers': len(urls),
+        'server': [{'cpu': c, 'rss': r} for c, r in sampler.samples] if sampler else [],
+        'errors': dict(stats.errors),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='聊天服务器压测')
+    parser.add_argument('--url', help='压测已启动的服务器（默认在临时目录中启动 app.py）')
+    parser.add_argument('--server-pid', type=int, help='配合 --url 使用，采样该进程的CPU和内存')
+    parser.add_argument('--clients', type=int, default=50, help='模拟客户端数')
+    parser.add_argument('--rooms', type=int, default=1, help='客户端平均分配到的房间数')
+    parser.add_argument('--duration', type=float, default=30, help='压测时长（秒）')
+    parser.add_argument('--drain', type=float, default=2, help='停止发送后等待在途消息的时间（秒）')
+    parser.add_argument('--ramp', type=float, default=0, help='在这段时间内（秒）逐步连接客户端')
+    parser.add_argument('--rate', type=float, default=0.2, help='每个客户端每秒发送的消息数')
+    parser.add_argument('--ai-ratio', type=float, default=0.05, help='@川小农 提问占消息的比例')
+    parser.add_argument('--history-sizes', default='0,1000,10000', help='测量加入延迟的历史消息数量（逗号分隔，留空跳过）')
+    parser.add_argument('--joins', type=int, default=20, help='每个历史消息数量下测量的加入次数')
+    parser.add_argument('--workers', default='',
+                        help='用 cluster.py 启动的工作进程数（逗号分隔时依次压测并比较，留空启动单进程 app.py）')
+    parser.add_argument('--transport', default='polling', choices=['polling', 'websocket'])
+    parser.add_argument('--output', help='把结果写入JSON文件')
+    args = parser.parse_args()
+
+    results = {'join_by_history': []}
+    with tempfile.TemporaryDirectory(prefix='chat-loadtest-') as tmp:
+        if args.history_sizes and not args.url:
+            print('加入延迟与历史消息数量：')
+            for size in [int(s) for s in args.history_sizes.split(',')]:
+                history_dir = os.path.join(tmp, f'history-{size}')
+                prefill_history(history_dir, size)
+                server = LocalServer(history_dir)
+                try:
+                    timings = measure_join_latency(server.url, args.joins, args.transport)
+                finally:
+                    server.stop()
+                print(f'  {size:>8} 条  {latency_summary(timings)}')
+                results['join_by_history'].append({'history': size, **{f'p{p}': percentile(timings, p) * 1000
+                                                                       for p in (50, 95, 99)}})
+
+        if args.clients and args.url:
+            pids = [args.server_pid] if args.server_pid else []
+            results['load'] = run_load([args.url], args, pids)
+        elif args.clients and not args.workers:
+            server = LocalServer(os.path.join(tmp, 'history-load'))
+            try:
+                results['load'] = run_load(server.urls, args, server.pids)
+            finally:
+                server.stop()
+        elif args.clients:
+            results['load_by_workers'] = []
+            worker_counts = [int(w) for w in args.workers.split(',')]
+            cpus = os.cpu_count() or 1
+            results['cpu_count'] = cpus
+            if max(worker_counts) > cpus:
+                # 压测客户端和服务器在同一台机器上，工作进程数超过核数时结果只反映多进程开销
+                print(f'注意：本机只有 {cpus} 个CPU核，超过核数的工作进程不能提高吞吐量，'
+                      f'需要在核数足够的机器上比较 1→N 的扩展')
+            for workers in worker_counts:
+                print(f'\n===== {workers} 个工作进程 =====')
+                server = LocalServer(os.path.join(tmp, f'history-workers-{workers}'), workers=workers)
+                try:
+                    results['load_by_workers'].append(run_load(server.urls, args, server.pids))
+                finally:
+                    server.stop()
+            print(f'\n{"工作进程":<8}{"发送/秒":>10}{"送达/秒":>10}{"送达率":>8}{"p50ms":>9}{"p99ms":>9}{"CPU%":>8}')
+            for load in results['load_by_workers']:
+                cpu = [sample['cpu'] for sample in load['server']]
+                print(f'{load["workers"]:<12}{load["sent_per_second"]:>10.1f}{load["delivered_per_second"]:>10.1f}'
+                      f'{load["delivered"] / max(load["expected_deliveries"], 1):>9.1%}'
+                      f'{load["delivery_ms"][50]:>9.1f}{load["delivery_ms"][99]:>9.1f}'
+                      f'{sum(cpu) / max(len(cpu), 1):>8.0f}')
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f'结果已写入 {args.output}')
+
+if __name__ == '__main__':
+    main()
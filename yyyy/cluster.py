@@ -0,0 +1,242 @@
+# 多进程部署：本地消息代理、Socket.IO跨进程广播适配器和多进程启动器
+#
+# 用法（在 yyyy 目录下）：
+#   python cluster.py --workers 4 --port 5000
+# 启动一个消息代理和4个工作进程，工作进程以SO_REUSEPORT共用5000端口，由内核分配连接。
+# 工作进程之间通过消息代理转发广播，在线用户和聊天记录保存在共享的SQLite文件中。
+#   python cluster.py --workers 4 --port 5000 --port-per-worker
+# 工作进程分别监听 5000-5003 端口，放在支持会话保持的反向代理后面（或由压测客户端直接分配），可以使用轮询传输。
+#
+# 多进程部署保证的是状态一致（在线用户、用户名唯一、聊天记录在各进程间共享），吞吐量随工作进程数
+# 增长多少取决于CPU核数和共享SQLite的写入量，尚未在多核机器上测量；部署前用
+#   python benchmarks/loadtest.py --workers 1,2,4 --history-sizes ''
+# 在目标机器上比较。
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import struct
+import signal
+import logging
+import argparse
+import threading
+import subprocess
+from urllib.parse import urlsplit
+from socketio import PubSubManager
+from flood import OutboundLimitManager
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 帧格式：4字节大端长度 + JSON
+_HEADER = struct.Struct('>I')
+
+# 单帧上限，防止异常数据导致分配过大的内存
+MAX_FRAME = 16 * 1024 * 1024
+
+logger = logging.getLogger('cluster')
+
+def send_frame(sock, payload):
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+def _recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError('连接已关闭')
+        data += chunk
+    return bytes(data)
+
+def recv_frame(sock):
+    size, = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    if size > MAX_FRAME:
+        raise ConnectionError(f'帧过大: {size} 字节')
+    return _recv_exact(sock, size)
+
+class MessageBroker:
+    """最简单的发布订阅代理：把任一连接发来的帧转发给所有连接（包括发送方）
+
+    每个连接有独立的发送队列和发送线程，队列满（工作进程处理不过来）时断开该连接，
+    不会拖慢其它工作进程；工作进程断开后会自动重连。
+    """
+
+    def __init__(self, host='127.0.0.1', port=5555, queue_size=10000):
+        self.queue_size = queue_size
+        self._server = socket.create_server((host, port))
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    @property
+    def address(self):
+        return self._server.getsockname()[:2]
+
+    def start(self):
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return self
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            outbox = queue.Queue(self.queue_size)
+            with self._lock:
+                self._clients[conn] = outbox
+            threading.Thread(target=self._read_loop, args=(conn,), daemon=True).start()
+            threading.Thread(target=self._write_loop, args=(conn, outbox), daemon=True).start()
+
+    def _read_loop(self, conn):
+        try:
+            while True:
+                payload = recv_frame(conn)
+                with self._lock:
+                    clients = list(self._clients.items())
+                for client, outbox in clients:
+                    try:
+                        outbox.put_nowait(payload)
+                    except queue.Full:
+                        logger.warning('工作进程处理过慢，断开连接')
+                        self._drop(client)
+        except (OSError, ConnectionError):
+            pass
+        self._drop(conn)
+
+    def _write_loop(self, conn, outbox):
+        try:
+            while True:
+                payload = outbox.get()
+                if payload is None:
+                    break
+                send_frame(conn, payload)
+        except OSError:
+            pass
+        self._drop(conn)
+
+    def _drop(self, conn):
+        with self._lock:
+            outbox = self._clients.pop(conn, None)
+        if outbox is None:
+            return
+        try:
+            outbox.put_nowait(None)
+        except queue.Full:
+            pass
+        try:
+            conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        conn.close()
+
+    def stop(self):
+        self._server.close()
+        with self._lock:
+            clients = list(self._clients)
+        for conn in clients:
+            self._drop(conn)
+
+class BrokerManager(PubSubManager, OutboundLimitManager):
+    """通过 MessageBroker 在工作进程之间转发Socket.IO广播
+
+    url 格式为 tcp://主机:端口。需要在eventlet打过补丁（monkey_patch）的进程中使用，
+    监听循环才不会阻塞事件循环。
+    各进程本地发送时由 OutboundLimitManager 限制慢客户端的发送队列。
+    """
+    name = 'broker'
+
+    def __init__(self, url='tcp://127.0.0.1:5555', channel='socketio', write_only=False, logger=None, json=None):
+        parts = urlsplit(url)
+        if parts.scheme != 'tcp' or not parts.port:
+            raise ValueError(f'不支持的消息队列地址: {url}')
+        self.address = (parts.hostname, parts.port)
+        self._sock = None
+        self._send_lock = threading.Lock()
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+
+    def _connect(self):
+        """连接消息代理，失败时按指数退避重试"""
+        delay = 0.1
+        while True:
+            try:
+                sock = socket.create_connection(self.address)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self._sock = sock
+                return sock
+            except OSError:
+                self._get_logger().warning(f'无法连接消息代理 {self.address}，{delay:.1f}秒后重试')
+                time.sleep(delay)
+                delay = min(delay * 2, 5.0)
+
+    def _publish(self, data):
+        payload = json.dumps({'channel': self.channel, 'data': data}, ensure_ascii=False).encode('utf-8')
+        with self._send_lock:
+            for _ in range(2):
+                sock = self._sock or self._connect()
+                try:
+                    send_frame(sock, payload)
+                    return
+                except OSError:
+                    # 连接断开时重连一次，监听循环会随后发现断开并使用新连接
+                    self._sock = None
+            self._get_logger().error('消息发布失败')
+
+    def _listen(self):
+        while True:
+            with self._send_lock:
+                sock = self._sock or self._connect()
+            try:
+                while True:
+                    message = json.loads(recv_frame(sock))
+                    if message.get('channel') == self.channel:
+                        yield message['data']
+            except (OSError, ConnectionError, ValueError):
+                if self._sock is sock:
+                    self._sock = None
+                sock.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='多进程启动聊天服务器')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='工作进程数（默认CPU核数）')
+    parser.add_argument('--host', default='0.0.0.0', help='监听地址')
+    parser.add_argument('--port', type=int, default=5000, help='监听端口（所有工作进程共用）')
+    parser.add_argument('--broker-port', type=int, default=5555, help='消息代理端口')
+    parser.add_argument('--port-per-worker', action='store_true', help='每个工作进程使用单独的端口（port+编号）')
+    parser.add_argument('--state-db', default=os.path.join(BASE_DIR, 'history', 'state.db'), help='共享状态SQLite文件')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    broker = MessageBroker('127.0.0.1', args.broker_port).start()
+    print(f'消息代理: tcp://127.0.0.1:{args.broker_port}')
+
+    env = dict(os.environ,
+               CHAT_HOST=args.host,
+               CHAT_PORT=str(args.port),
+               CHAT_MESSAGE_QUEUE=f'tcp://127.0.0.1:{args.broker_port}',
+               CHAT_STATE_DB=os.path.abspath(args.state_db))
+    if args.port_per_worker:
+        # 每个连接固定在一个工作进程上，轮询传输的后续请求不会落到别的进程
+        env.setdefault('CHAT_TRANSPORTS', 'polling,websocket')
+    ports = [args.port + i if args.port_per_worker else args.port for i in range(args.workers)]
+    workers = [subprocess.Popen([sys.executable, os.path.join(BASE_DIR, 'app.py')], cwd=BASE_DIR,
+                                env=dict(env, CHAT_WORKER=str(i), CHAT_PORT=str(port)))
+               for i, port in enumerate(ports)]
+    print(f'已启动 {args.workers} 个工作进程: ' + ', '.join(f'http://{args.host}:{port}' for port in sorted(set(ports))))
+
+    def shutdown(*_):
+        for worker in workers:
+            worker.terminate()
+    signal.signal(signal.SIGTERM, shutdown)
+    try:
+        for worker in workers:
+            worker.wait()
+    except KeyboardInterrupt:
+        shutdown()
+        for worker in workers:
+            worker.wait()
+    broker.stop()
+
+if __name__ == '__main__':
+    main()
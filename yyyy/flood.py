@@ -0,0 +1,145 @@
+import time
+import threading
+import socketio
+
+# 流量控制：
+#   FloodControl          每个连接一个令牌桶，限制客户端发送事件的速率
+#   OutboundLimitManager  限制每个连接待发送队列的长度，处理跟不上的慢客户端
+#
+# 慢客户端的处理方式：
+#   drop        队列超过上限时丢弃发给它的新事件，直到队列回落
+#   disconnect  断开连接（客户端重连后通过 history 补齐断线期间的消息）
+
+DROP = 'drop'
+DISCONNECT = 'disconnect'
+
+class TokenBucket:
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+class FloodControl:
+    """每个连接每秒最多 rate 个事件，允许突发 burst 个
+
+    连续被拒绝 max_strikes 次的连接视为恶意刷屏，allow 返回 None 由调用方断开。
+    """
+
+    def __init__(self, rate, burst, max_strikes=20, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_strikes = max_strikes
+        self.clock = clock
+        self._buckets = {}
+        self._strikes = {}
+        self._lock = threading.Lock()
+        # 统计
+        self.allowed = 0
+        self.rejected = 0
+        self.kicked = 0
+
+    def allow(self, sid):
+        """允许返回True，限流返回False，需要断开时返回None"""
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(sid)
+            if bucket is None:
+                bucket = self._buckets[sid] = TokenBucket(self.rate, self.burst, now)
+            if bucket.take(now):
+                self._strikes.pop(sid, None)
+                self.allowed += 1
+                return True
+            self.rejected += 1
+            strikes = self._strikes[sid] = self._strikes.get(sid, 0) + 1
+            if strikes >= self.max_strikes:
+                self.kicked += 1
+                return None
+            return False
+
+    def forget(self, sid):
+        with self._lock:
+            self._buckets.pop(sid, None)
+            self._strikes.pop(sid, None)
+
+    def stats(self):
+        return {'connections': len(self._buckets), 'allowed': self.allowed,
+                'rejected': self.rejected, 'kicked': self.kicked}
+
+class OutboundLimitManager(socketio.Manager):
+    """发送前检查每个接收者的 Engine.IO 发送队列，超过 max_queue 个数据包的按 policy 处理
+
+    放在 PubSubManager 子类的基类中（例如 cluster.BrokerManager）时，检查发生在各进程本地发送的时候。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_queue = None
+        self.policy = DROP
+        self._disconnecting = set()
+        # 统计
+        self.dropped = 0
+        self.disconnected = 0
+
+    def limit_outbound(self, max_queue, policy=DROP):
+        if policy not in (DROP, DISCONNECT):
+            raise ValueError(f'未知的慢客户端处理方式: {policy}')
+        self.max_queue = max_queue
+        self.policy = policy
+
+    def emit(self, event, data, namespace, room=None, skip_sid=None, callback=None, to=None, **kwargs):
+        room = to or room
+        if self.max_queue is not None:
+            slow = self._slow_participants(namespace, room)
+            if slow:
+                skip_sid = list(skip_sid) if isinstance(skip_sid, list) else [skip_sid]
+                skip_sid.extend(slow)
+        return super().emit(event, data, namespace, room=room, skip_sid=skip_sid, callback=callback, **kwargs)
+
+    def _slow_participants(self, namespace, room):
+        sockets = self.server.eio.sockets
+        slow = []
+        for sid, eio_sid in self.get_participants(namespace, room):
+            socket = sockets.get(eio_sid)
+            if socket is None or socket.queue.qsize() <= self.max_queue:
+                continue
+            slow.append(sid)
+            self.dropped += 1
+            if self.policy == DISCONNECT and eio_sid not in self._disconnecting:
+                self._disconnecting.add(eio_sid)
+                self.disconnected += 1
+                # 断开会触发 disconnect 事件（其中还会广播），放到后台执行
+                self.server.start_background_task(self._abort, eio_sid)
+        return slow
+
+    def _abort(self, eio_sid):
+        socket = self.server.eio.sockets.get(eio_sid)
+        try:
+            if socket is None:
+                return
+            # 丢弃积压的数据包后立即关闭，不等慢客户端收完
+            queue_empty = self.server.eio.get_queue_empty_exception()
+            try:
+                while True:
+                    socket.queue.get(block=False)
+                    socket.queue.task_done()
+            except queue_empty:
+                pass
+            socket.close(wait=False, abort=True)
+            self.server.eio.sockets.pop(eio_sid, None)
+        finally:
+            self._disconnecting.discard(eio_sid)
+
+    def stats(self):
+        sockets = self.server.eio.sockets if self.server else {}
+        queued = [socket.queue.qsize() for socket in list(sockets.values())]
+        return {'max_queue': self.max_queue, 'policy': self.policy, 'dropped': self.dropped,
+                'disconnected': self.disconnected, 'largest_queue': max(queued, default=0)}
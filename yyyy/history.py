@@ -0,0 +1,135 @@
+import os
+import json
+import threading
+from collections import deque
+from itertools import islice
+
+# 聊天记录：内存中用环形缓冲保留最近的消息，全部消息追加写入按大小轮转的分段日志
+#
+# 日志目录结构：
+#   <log_dir>/segment-<第一条消息id>.jsonl   每行一条消息，写满 segment_bytes 后开始新分段
+
+def _bisect_id(messages, message_id):
+    """按 id 有序的消息序列中第一条 id >= message_id 的位置"""
+    low, high = 0, len(messages)
+    while low < high:
+        middle = (low + high) // 2
+        if messages[middle]['id'] < message_id:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+class ChatHistory:
+    """带持久化的聊天记录
+
+    每条消息追加时分配递增的 id；最近 max_history 条保存在 deque 中，分页读取更早的消息时
+    按分段文件名中的起始id定位分段读取。分段超过 max_segments 个时删除最早的分段。
+    重启时从最后的分段恢复内存缓冲和下一个id。
+    """
+
+    def __init__(self, log_dir, max_history=1000, segment_bytes=4 * 1024 * 1024, max_segments=50):
+        self.log_dir = log_dir
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.recent = deque(maxlen=max_history)
+        self.next_id = 1
+        self._segments = []  # [(起始id, 路径)]，按id排序
+        self._file = None
+        self._lock = threading.Lock()
+        os.makedirs(log_dir, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        """扫描分段文件，从最后的分段开始恢复最近的消息"""
+        for name in os.listdir(self.log_dir):
+            if name.startswith('segment-') and name.endswith('.jsonl'):
+                self._segments.append((int(name[len('segment-'):-len('.jsonl')]), os.path.join(self.log_dir, name)))
+        self._segments.sort()
+
+        restored = []
+        for _, path in reversed(self._segments):
+            restored[:0] = self._read_segment(path)
+            if len(restored) >= self.recent.maxlen:
+                break
+        self.recent.extend(restored)
+        if restored:
+            self.next_id = restored[-1]['id'] + 1
+
+    @staticmethod
+    def _read_segment(path):
+        messages = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    messages.append(json.loads(line))
+                except ValueError:
+                    # 进程中断时最后一行可能不完整
+                    continue
+        return messages
+
+    def _open_segment(self, first_id):
+        """打开最后一个未写满的分段，或以 first_id 为起始id新建分段"""
+        if self._segments and os.path.getsize(self._segments[-1][1]) < self.segment_bytes:
+            path = self._segments[-1][1]
+        else:
+            path = os.path.join(self.log_dir, f'segment-{first_id:012d}.jsonl')
+            self._segments.append((first_id, path))
+            while len(self._segments) > self.max_segments:
+                _, oldest = self._segments.pop(0)
+                os.remove(oldest)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def append(self, message):
+        """追加一条消息，返回带 id 的消息"""
+        with self._lock:
+            message = dict(message, id=self.next_id)
+            self.next_id += 1
+            self.recent.append(message)
+
+            if self._file is None:
+                self._open_segment(message['id'])
+            self._file.write(json.dumps(message, ensure_ascii=False))
+            self._file.write('\n')
+            self._file.flush()
+            if self._file.tell() >= self.segment_bytes:
+                self._file.close()
+                self._file = None
+            return message
+
+    def page(self, before=None, limit=20):
+        """id 小于 before（为None时从最新开始）的最近 limit 条消息，按时间顺序返回 (消息列表, 是否还有更早的消息)"""
+        with self._lock:
+            end = self.next_id if before is None else min(before, self.next_id)
+            # 日志中损坏的行在加载时被跳过，id 可能不连续，按 id 二分查找位置而不是用下标推算
+            index = _bisect_id(self.recent, end)
+            count = min(limit, index)
+            # 从右端截取（最新的一页不需要遍历整个缓冲）
+            messages = list(islice(reversed(self.recent), len(self.recent) - index, len(self.recent) - index + count))
+            messages.reverse()
+            if index > count:
+                return messages, True
+
+            # 内存缓冲中没有更早的消息了，从分段文件中读取
+            oldest = messages[0]['id'] if messages else (self.recent[0]['id'] if index < len(self.recent) else end)
+            older, has_more = self._read_before(min(oldest, end), limit - count)
+            return older + messages, has_more
+
+    def _read_before(self, end, count):
+        """从分段文件读取 id < end 的最近 count 条消息，返回 (消息列表, 是否还有更早的消息)"""
+        if count <= 0:
+            return [], any(first < end for first, _ in self._segments)
+        messages = []
+        for first, path in reversed(self._segments):
+            if first >= end:
+                continue
+            messages[:0] = [m for m in self._read_segment(path) if m['id'] < end]
+            if len(messages) > count:
+                return messages[-count:], True
+        return messages, False
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,172 @@
+import re
+import threading
+from collections import OrderedDict
+
+# 意图匹配引擎：所有意图的关键词编译成一个 Aho-Corasick 自动机，一次扫描查询文本得到全部命中的关键词，
+# 再按优先级检查候选意图；正则在注册时预编译。处理函数返回None表示不处理，继续尝试下一个意图。
+
+class KeywordMatcher:
+    """Aho-Corasick 多关键词匹配"""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self._built = True
+
+    def add(self, keyword, value):
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][char] = next_state
+            state = next_state
+        self._output[state].append(value)
+        self._built = False
+
+    def build(self):
+        """按广度优先计算失败指针，并把失败链上的输出合并到每个状态"""
+        queue = list(self._goto[0].values())
+        for state in queue:
+            self._fail[state] = 0
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+        self._built = True
+
+    def find(self, text):
+        """返回 text 中出现的所有关键词对应的值（集合）"""
+        if not self._built:
+            self.build()
+        goto, fail, output = self._goto, self._fail, self._output
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+class Intent:
+    """一个意图
+
+    keywords 为关键词组列表，每组至少命中一个关键词才算匹配（组之间是“且”的关系）；
+    pattern 为正则，匹配结果作为 match 传给处理函数。handler(query, found, match) 返回回复文本或None，found 为查询中命中的全部关键词。
+    cacheable 为False的意图（回复依赖时间或在线人数等状态）不进入回复缓存。
+    """
+
+    def __init__(self, name, handler, keywords=(), pattern=None, priority=100, cacheable=True):
+        self.name = name
+        self.handler = handler
+        self.keywords = [[k.lower() for k in group] for group in keywords]
+        self.pattern = re.compile(pattern) if isinstance(pattern, str) else pattern
+        self.priority = priority
+        self.cacheable = cacheable
+
+    def match(self, query, found):
+        """检查关键词组和正则，返回处理函数的回复（不匹配时返回None）"""
+        if not all(found.intersection(group) for group in self.keywords):
+            return None
+        match = None
+        if self.pattern is not None:
+            match = self.pattern.search(query)
+            if match is None:
+                return None
+        return self.handler(query, found, match)
+
+class IntentEngine:
+    """按优先级匹配意图并缓存回复
+
+    优先级数字小的先匹配，相同优先级按注册顺序；没有意图处理时调用 fallback(query)。
+    """
+
+    def __init__(self, fallback, cache_size=1024):
+        self.fallback = fallback
+        self.cache_size = cache_size
+        self._intents = []
+        self._pattern_intents = []
+        self._by_keyword = {}
+        self._matcher = KeywordMatcher()
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, intent):
+        with self._lock:
+            order = (intent.priority, len(self._intents))
+            self._intents.append((order, intent))
+            # 只用第一组关键词找出候选意图，其余组在 Intent.match 中检查
+            for index, group in enumerate(intent.keywords):
+                for keyword in group:
+                    if keyword not in self._by_keyword:
+                        self._by_keyword[keyword] = []
+                        self._matcher.add(keyword, keyword)
+                    if index == 0:
+                        self._by_keyword[keyword].append((order, intent))
+            if not intent.keywords:
+                self._pattern_intents.append((order, intent))
+            self._cache.clear()
+        return intent
+
+    def intent(self, name, **options):
+        """装饰器形式注册处理函数"""
+        def decorator(handler):
+            self.register(Intent(name, handler, **options))
+            return handler
+        return decorator
+
+    def __len__(self):
+        return len(self._intents)
+
+    def __iter__(self):
+        """按匹配顺序遍历意图"""
+        return iter([intent for _, intent in sorted(self._intents, key=lambda item: item[0])])
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+    def respond(self, query):
+        """返回 (意图名, 回复)，没有意图处理时意图名为None"""
+        query = query.lower()
+        with self._lock:
+            cached = self._cache.get(query)
+            if cached is not None:
+                self._cache.move_to_end(query)
+                self.hits += 1
+                return cached
+            self.misses += 1
+            found = self._matcher.find(query)
+
+        candidates = list(self._pattern_intents)
+        for keyword in found:
+            candidates.extend(self._by_keyword[keyword])
+        result = None
+        cacheable = True
+        for _, intent in sorted(set(candidates), key=lambda item: item[0]):
+            response = intent.match(query, found)
+            if response is not None:
+                result = (intent.name, response)
+                cacheable = intent.cacheable
+                break
+        if result is None:
+            result = (None, self.fallback(query))
+
+        if cacheable and self.cache_size:
+            with self._lock:
+                self._cache[query] = result
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return result
@@ -0,0 +1,54 @@
+import threading
+from datetime import datetime
+
+# 在线状态：sid -> 用户名 和 用户名 -> sid 两个索引，加入和离开都是O(1)
+#
+# 每次变化版本号加1，客户端收到 user_joined/user_left 增量事件时检查版本号是否连续，
+# 发现缺失时请求完整快照（sync_presence）。
+
+class Presence:
+    """在线用户索引"""
+
+    def __init__(self):
+        self.version = 0
+        self._by_sid = {}
+        self._by_user = {}
+        self._lock = threading.Lock()
+
+    def join(self, username, sid):
+        """用户上线，返回新的版本号；用户名已被占用时返回None"""
+        with self._lock:
+            if username in self._by_user:
+                return None
+            self._by_user[username] = {'sid': sid, 'joined_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+            self._by_sid[sid] = username
+            self.version += 1
+            return self.version
+
+    def leave(self, sid):
+        """连接断开，返回 (用户名, 新的版本号)；该连接没有加入时返回None"""
+        with self._lock:
+            username = self._by_sid.pop(sid, None)
+            if username is None:
+                return None
+            del self._by_user[username]
+            self.version += 1
+            return username, self.version
+
+    def sid_of(self, username):
+        info = self._by_user.get(username)
+        return info['sid'] if info else None
+
+    def username_of(self, sid):
+        return self._by_sid.get(sid)
+
+    def snapshot(self):
+        """完整的在线用户列表和对应的版本号"""
+        with self._lock:
+            return {'users': list(self._by_user), 'version': self.version}
+
+    def __contains__(self, username):
+        return username in self._by_user
+
+    def __len__(self):
+        return len(self._by_user)
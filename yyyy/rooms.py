@@ -0,0 +1,132 @@
+import os
+import re
+import threading
+from collections import defaultdict
+from history import ChatHistory
+from presence import Presence
+
+# 房间：每个房间有自己的在线成员索引和聊天记录（各自加锁），一个房间繁忙不会阻塞其它房间。
+# 房间表本身只在新建和首次打开房间时加锁。
+#
+# 聊天记录目录结构：
+#   <history_dir>/                 默认房间（与单房间版本的目录相同）
+#   <history_dir>/rooms/<房间名>/   其它房间
+
+DEFAULT_ROOM = 'chatroom'
+
+# 房间名同时用作目录名，只允许文字、数字、下划线和连字符
+ROOM_NAME = re.compile(r'^[\w-]{1,32}$')
+
+class RoomError(Exception):
+    pass
+
+class Room:
+    def __init__(self, name, members, history):
+        self.name = name
+        self.members = members
+        self.history = history
+
+class RoomRegistry:
+    """本进程的房间表和每个连接加入的房间
+
+    子类可以重写 _stored_names、_is_stored、_store、_open 把房间保存到别处（见 shared_state.SharedRoomRegistry）。
+    """
+
+    def __init__(self, history_dir, max_history=1000, max_rooms=100):
+        self.history_dir = history_dir
+        self.max_history = max_history
+        self.max_rooms = max_rooms
+        self._rooms = {}
+        self._lock = threading.Lock()
+        # sid -> 该连接加入的房间名集合
+        self._sid_rooms = defaultdict(set)
+        self._sid_lock = threading.Lock()
+        self._store(DEFAULT_ROOM)
+
+    def _room_dir(self, name):
+        if name == DEFAULT_ROOM:
+            return self.history_dir
+        return os.path.join(self.history_dir, 'rooms', name)
+
+    def _stored_names(self):
+        rooms_dir = os.path.join(self.history_dir, 'rooms')
+        names = os.listdir(rooms_dir) if os.path.isdir(rooms_dir) else []
+        return [DEFAULT_ROOM] + sorted(name for name in names if ROOM_NAME.match(name))
+
+    def _is_stored(self, name):
+        return os.path.isdir(self._room_dir(name))
+
+    def _store(self, name):
+        """登记新房间，已存在时返回False"""
+        path = self._room_dir(name)
+        if name != DEFAULT_ROOM and os.path.isdir(path):
+            return False
+        os.makedirs(path, exist_ok=True)
+        return True
+
+    def _open(self, name):
+        return Room(name, Presence(), ChatHistory(self._room_dir(name), self.max_history))
+
+    def names(self):
+        return self._stored_names()
+
+    def get(self, name):
+        """返回房间，不存在时返回None"""
+        room = self._rooms.get(name)
+        if room is None and isinstance(name, str) and ROOM_NAME.match(name) and self._is_stored(name):
+            with self._lock:
+                room = self._rooms.get(name)
+                if room is None:
+                    room = self._rooms[name] = self._open(name)
+        return room
+
+    def create(self, name):
+        """新建房间；名称不合法、已存在或房间数已满时抛出 RoomError"""
+        if not isinstance(name, str) or not ROOM_NAME.match(name):
+            raise RoomError('房间名只能包含文字、数字、下划线和连字符，最长32个字符')
+        with self._lock:
+            if len(self._stored_names()) >= self.max_rooms:
+                raise RoomError('房间数量已达上限')
+            if not self._store(name):
+                raise RoomError('房间已存在')
+            room = self._rooms[name] = self._open(name)
+        return room
+
+    def join(self, room, username, sid):
+        """加入房间，返回新的版本号；已在房间中时返回None"""
+        version = room.members.join(username, sid)
+        if version is not None:
+            with self._sid_lock:
+                self._sid_rooms[sid].add(room.name)
+        return version
+
+    def leave(self, room, sid):
+        """离开房间，返回 (用户名, 新的版本号)；不在房间中时返回None"""
+        with self._sid_lock:
+            names = self._sid_rooms.get(sid)
+            if names is not None:
+                names.discard(room.name)
+                if not names:
+                    del self._sid_rooms[sid]
+        return room.members.leave(sid)
+
+    def rooms_of(self, sid):
+        with self._sid_lock:
+            return sorted(self._sid_rooms.get(sid, ()))
+
+    def leave_all(self, sid):
+        """连接断开时离开所有房间，返回 [(房间, 用户名, 版本号)]"""
+        with self._sid_lock:
+            names = self._sid_rooms.pop(sid, set())
+        left = []
+        for name in sorted(names):
+            room = self.get(name)
+            result = room.members.leave(sid) if room else None
+            if result is not None:
+                left.append((name,) + result)
+        return left
+
+    def close(self):
+        with self._lock:
+            for room in self._rooms.values():
+                room.history.close()
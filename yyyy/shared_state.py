@@ -0,0 +1,263 @@
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from rooms import DEFAULT_ROOM, Room, RoomRegistry
+
+# 多进程共享状态：房间、在线用户、聊天记录和用户名唯一性保存在同一个SQLite文件中（WAL模式），
+# 同一台机器上的所有工作进程打开同一个文件，不需要外部服务。
+#
+# 与单进程的 Presence、ChatHistory、RoomRegistry 接口相同，app.py 根据 CHAT_STATE_DB 选择实现。
+# 在线用户和聊天记录按房间划分，登录（用户名唯一性）使用房间名为空字符串的 LOBBY。
+
+LOBBY = ''
+
+# 表结构版本（PRAGMA user_version），进程启动时只在版本较低时执行一次迁移
+SCHEMA_VERSION = 1
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS room_presence (
+    room TEXT NOT NULL,
+    username TEXT NOT NULL,
+    sid TEXT NOT NULL,
+    worker TEXT NOT NULL,
+    joined_at TEXT NOT NULL,
+    PRIMARY KEY (room, username),
+    UNIQUE (room, sid)
+);
+CREATE TABLE IF NOT EXISTS room_versions (
+    room TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rooms (
+    name TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS workers (
+    worker TEXT PRIMARY KEY,
+    seen_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    data TEXT NOT NULL,
+    room TEXT NOT NULL DEFAULT 'chatroom'
+);
+CREATE INDEX IF NOT EXISTS messages_room ON messages (room, id)
+'''
+
+def _migrate(conn):
+    """在写事务中把表结构升级到 SCHEMA_VERSION（多个进程同时启动时只有第一个执行）"""
+    if conn.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+        return
+    # 单房间版本（没有版本号）：在线用户不分房间，聊天记录没有 room 列，归入默认房间
+    conn.execute('DROP TABLE IF EXISTS presence')
+    conn.execute('DROP TABLE IF EXISTS presence_version')
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(messages)')]
+    if columns and 'room' not in columns:
+        conn.execute("ALTER TABLE messages ADD COLUMN room TEXT NOT NULL DEFAULT 'chatroom'")
+    for statement in _SCHEMA.split(';'):
+        conn.execute(statement)
+    conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+def run_blocking(func, *args):
+    """执行会阻塞的调用（SQLite等）并返回结果
+
+    eventlet 打过补丁时（多进程部署）线程都是协程，放到 tpool 的系统线程中执行：
+    等待磁盘或其它进程的写锁时只挂起当前协程，不阻塞本进程的事件循环。
+    """
+    eventlet = sys.modules.get('eventlet')
+    if eventlet is not None and eventlet.patcher.is_monkey_patched('thread'):
+        from eventlet import tpool
+        return tpool.execute(func, *args)
+    return func(*args)
+
+class StateDB:
+    """进程内共享的SQLite连接（写操作使用 BEGIN IMMEDIATE 在进程间串行化）
+
+    worker 为本进程的标识，在线记录按进程登记，进程停止心跳后由其它进程清理。
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.worker = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._lock = threading.Lock()
+        self.transaction(_migrate)
+        self.heartbeat()
+
+    def read(self, sql, params=()):
+        with self._lock:
+            return run_blocking(lambda: self._conn.execute(sql, params).fetchall())
+
+    def transaction(self, func):
+        """在写事务中执行 func(connection)，返回其结果"""
+        with self._lock:
+            return run_blocking(self._transaction, func)
+
+    def _transaction(self, func):
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = func(self._conn)
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        self._conn.execute('COMMIT')
+        return result
+
+    def heartbeat(self):
+        self.transaction(lambda conn: conn.execute(
+            'INSERT INTO workers (worker, seen_at) VALUES (?, ?) '
+            'ON CONFLICT(worker) DO UPDATE SET seen_at = excluded.seen_at', (self.worker, time.time())))
+
+    def purge_stale(self, timeout):
+        """删除心跳超时的工作进程留下的在线记录，返回 [(房间, 用户名, 版本号)]"""
+        def purge(conn):
+            deadline = time.time() - timeout
+            stale = [row[0] for row in conn.execute('SELECT worker FROM workers WHERE seen_at < ?', (deadline,))]
+            left = []
+            for worker in stale:
+                rows = conn.execute('SELECT room, username FROM room_presence WHERE worker = ?', (worker,)).fetchall()
+                for room, username in rows:
+                    conn.execute('DELETE FROM room_presence WHERE room = ? AND username = ?', (room, username))
+                    left.append((room, username, _bump_version(conn, room)))
+                conn.execute('DELETE FROM workers WHERE worker = ?', (worker,))
+            return left
+        return self.transaction(purge)
+
+def _bump_version(conn, room):
+    conn.execute('INSERT INTO room_versions (room, version) VALUES (?, 1) '
+                 'ON CONFLICT(room) DO UPDATE SET version = version + 1', (room,))
+    return conn.execute('SELECT version FROM room_versions WHERE room = ?', (room,)).fetchone()[0]
+
+def _version(conn, room):
+    row = conn.execute('SELECT version FROM room_versions WHERE room = ?', (room,)).fetchone()
+    return row[0] if row else 0
+
+class SharedPresence:
+    """多进程共享的在线用户索引（一个房间）
+
+    (房间, 用户名) 是主键，不同进程同时以同一用户名加入时只有一个成功。
+    """
+
+    def __init__(self, db, room=LOBBY):
+        self.db = db
+        self.room = room
+
+    @property
+    def version(self):
+        return self.db.transaction(lambda conn: _version(conn, self.room))
+
+    def join(self, username, sid):
+        """用户上线，返回新的版本号；用户名已被占用时返回None"""
+        def insert(conn):
+            cursor = conn.execute('INSERT OR IGNORE INTO room_presence (room, username, sid, worker, joined_at) '
+                                  'VALUES (?, ?, ?, ?, ?)',
+                                  (self.room, username, sid, self.db.worker, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            if cursor.rowcount == 0:
+                return None
+            return _bump_version(conn, self.room)
+        return self.db.transaction(insert)
+
+    def leave(self, sid):
+        """连接断开，返回 (用户名, 新的版本号)；该连接没有加入时返回None"""
+        def delete(conn):
+            row = conn.execute('SELECT username FROM room_presence WHERE room = ? AND sid = ?',
+                               (self.room, sid)).fetchone()
+            if row is None:
+                return None
+            conn.execute('DELETE FROM room_presence WHERE room = ? AND sid = ?', (self.room, sid))
+            return row[0], _bump_version(conn, self.room)
+        return self.db.transaction(delete)
+
+    def sid_of(self, username):
+        rows = self.db.read('SELECT sid FROM room_presence WHERE room = ? AND username = ?', (self.room, username))
+        return rows[0][0] if rows else None
+
+    def username_of(self, sid):
+        rows = self.db.read('SELECT username FROM room_presence WHERE room = ? AND sid = ?', (self.room, sid))
+        return rows[0][0] if rows else None
+
+    def snapshot(self):
+        def read(conn):
+            users = [row[0] for row in conn.execute('SELECT username FROM room_presence WHERE room = ? '
+                                                    'ORDER BY rowid', (self.room,))]
+            return {'users': users, 'version': _version(conn, self.room)}
+        # 在同一个事务中读取，保证列表与版本号一致
+        return self.db.transaction(read)
+
+    def __contains__(self, username):
+        return bool(self.db.read('SELECT 1 FROM room_presence WHERE room = ? AND username = ?', (self.room, username)))
+
+    def __len__(self):
+        return self.db.read('SELECT COUNT(*) FROM room_presence WHERE room = ?', (self.room,))[0][0]
+
+class SharedHistory:
+    """多进程共享的一个房间的聊天记录，消息id由自增主键分配（所有房间共用，递增但不连续）
+
+    超过 max_rows 条时删除该房间最早的消息（每追加 1000 条检查一次）。
+    """
+
+    def __init__(self, db, room, max_rows=200000):
+        self.db = db
+        self.room = room
+        self.max_rows = max_rows
+        self._appended = 0
+
+    def append(self, message):
+        """追加一条消息，返回带 id 的消息"""
+        data = json.dumps(message, ensure_ascii=False)
+        message_id = self.db.transaction(
+            lambda conn: conn.execute('INSERT INTO messages (room, data) VALUES (?, ?)', (self.room, data)).lastrowid)
+        self._appended += 1
+        if self._appended % 1000 == 0:
+            self.db.transaction(lambda conn: conn.execute(
+                'DELETE FROM messages WHERE room = ? AND id <= (SELECT id FROM messages WHERE room = ? '
+                'ORDER BY id DESC LIMIT 1 OFFSET ?)', (self.room, self.room, self.max_rows)))
+        return dict(message, id=message_id)
+
+    def page(self, before=None, limit=20):
+        """id 小于 before 的最近 limit 条消息，按时间顺序返回 (消息列表, 是否还有更早的消息)"""
+        if before is None:
+            rows = self.db.read('SELECT id, data FROM messages WHERE room = ? ORDER BY id DESC LIMIT ?',
+                                (self.room, limit + 1))
+        else:
+            rows = self.db.read('SELECT id, data FROM messages WHERE room = ? AND id < ? ORDER BY id DESC LIMIT ?',
+                                (self.room, before, limit + 1))
+        has_more = len(rows) > limit
+        messages = [dict(json.loads(data), id=message_id) for message_id, data in reversed(rows[:limit])]
+        return messages, has_more
+
+    def close(self):
+        pass
+
+class SharedRoomRegistry(RoomRegistry):
+    """房间表保存在共享的SQLite文件中，任一进程新建的房间其它进程都能加入"""
+
+    def __init__(self, db, max_rows=200000, max_rooms=100):
+        self.db = db
+        self.max_rows = max_rows
+        super().__init__(None, max_rooms=max_rooms)
+
+    def _stored_names(self):
+        rows = self.db.read('SELECT name FROM rooms ORDER BY name != ?, name', (DEFAULT_ROOM,))
+        return [row[0] for row in rows]
+
+    def _is_stored(self, name):
+        return bool(self.db.read('SELECT 1 FROM rooms WHERE name = ?', (name,)))
+
+    def _store(self, name):
+        created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return self.db.transaction(lambda conn: conn.execute(
+            'INSERT OR IGNORE INTO rooms (name, created_at) VALUES (?, ?)', (name, created_at)).rowcount == 1)
+
+    def _open(self, name):
+        return Room(name, SharedPresence(self.db, name), SharedHistory(self.db, name, self.max_rows))
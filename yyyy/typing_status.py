@@ -0,0 +1,68 @@
+import time
+import uuid
+import threading
+
+# 输入状态合并：客户端的 typing/stop_typing 只更新服务端状态，不再逐条转发，
+# 由后台任务按固定间隔（tick）把有变化的房间的“正在输入”列表一次性广播出去。
+#
+# 客户端持续输入时按 TYPING_REFRESH 间隔重复发送 typing 续期，超过 ttl 没有续期的用户自动过期，
+# 客户端掉线或漏发 stop_typing 也不会一直显示“正在输入”。
+
+class TypingAggregator:
+    """按房间汇总正在输入的用户
+
+    同一用户在 ttl 内重复发送 typing 只刷新过期时间，不会使房间变为“有变化”；
+    collect() 返回自上次调用以来列表发生变化的房间。
+    """
+
+    def __init__(self, ttl=3.0, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        # 多进程部署时每个进程只汇总自己的连接，客户端按 source 合并各进程的列表
+        self.source = uuid.uuid4().hex[:8]
+        self._rooms = {}  # 房间 -> {用户名: 过期时间}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        # 统计：收到的 typing/stop_typing 事件数和实际广播次数
+        self.received = 0
+        self.broadcasts = 0
+
+    def start(self, room, username):
+        with self._lock:
+            self.received += 1
+            users = self._rooms.setdefault(room, {})
+            if username not in users:
+                self._dirty.add(room)
+            users[username] = self.clock() + self.ttl
+
+    def stop(self, room, username):
+        with self._lock:
+            self.received += 1
+            self._discard(room, username)
+
+    def _discard(self, room, username):
+        users = self._rooms.get(room)
+        if users and users.pop(username, None) is not None:
+            self._dirty.add(room)
+            if not users:
+                del self._rooms[room]
+
+    def discard(self, room, username):
+        """用户发送消息或离开时清除输入状态（不计入收到的事件数）"""
+        with self._lock:
+            self._discard(room, username)
+
+    def collect(self):
+        """清理过期状态，返回有变化的房间 [(房间, 正在输入的用户列表)]"""
+        now = self.clock()
+        with self._lock:
+            for room, users in list(self._rooms.items()):
+                for username in [u for u, expires in users.items() if expires <= now]:
+                    self._discard(room, username)
+            changed = [(room, sorted(self._rooms.get(room, ()))) for room in self._dirty]
+            self._dirty.clear()
+            self.broadcasts += len(changed)
+            return changed
+
+    def stats(self):
+        return {'received': self.received, 'broadcasts': self.broadcasts}
@@ -0,0 +1,104 @@
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    # 没有安装 msgpack 时只能使用JSON，WireFormats 不会启用紧凑格式
+    msgpack = None
+
+# 紧凑传输格式：事件数据的字段名替换为短代码后用 msgpack 编码，较大的数据（例如加入时的历史消息）再用 deflate 压缩。
+# 以二进制参数发送（Socket.IO 二进制事件），客户端在 join 时声明 wire: 'compact' 后才会收到这种格式，
+# 其它客户端仍然收到JSON。
+#
+# 编码结果的第一个字节为格式标记：
+#   0x00  后面是 msgpack
+#   0x01  后面是 raw deflate 压缩的 msgpack
+
+JSON = 'json'
+COMPACT = 'compact'
+
+# 超过这个大小（字节）的 msgpack 数据再压缩
+DEFLATE_THRESHOLD = 1024
+
+# 字段名 -> 短代码（chat.html 使用同一张表解码）
+FIELD_CODES = {
+    'room': 'r',
+    'type': 't',
+    'username': 'u',
+    'content': 'c',
+    'timestamp': 's',
+    'mentions': 'm',
+    'command_data': 'd',
+    'id': 'i',
+    'reply_to': 'p',
+    'reply_user': 'q',
+    'messages': 'M',
+    'has_more': 'h',
+    'users': 'U',
+    'version': 'v',
+    'source': 'S',
+    'url': 'l',
+    'query': 'k',
+    'results': 'R',
+}
+FIELD_NAMES = {code: name for name, code in FIELD_CODES.items()}
+
+_MSGPACK = b'\x00'
+_DEFLATE = b'\x01'
+
+def _rename(value, table):
+    if isinstance(value, dict):
+        return {table.get(key, key): _rename(item, table) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_rename(item, table) for item in value]
+    return value
+
+def encode(payload):
+    packed = msgpack.packb(_rename(payload, FIELD_CODES), use_bin_type=True)
+    if len(packed) > DEFLATE_THRESHOLD:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        return _DEFLATE + compressor.compress(packed) + compressor.flush()
+    return _MSGPACK + packed
+
+def decode(data):
+    marker, body = data[:1], data[1:]
+    if marker == _DEFLATE:
+        body = zlib.decompress(body, -15)
+    elif marker != _MSGPACK:
+        raise ValueError(f'未知的数据格式标记: {marker!r}')
+    return _rename(msgpack.unpackb(body, raw=False), FIELD_NAMES)
+
+class WireFormats:
+    """每个连接协商的传输格式，以及按格式划分的 Socket.IO 房间
+
+    紧凑格式的客户端加入 "<房间>#compact"，JSON 客户端加入房间本身，
+    广播时每种格式只编码一次。
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled and msgpack is not None
+        self._formats = {}
+
+    def negotiate(self, sid, requested):
+        """记录客户端请求的格式，返回实际使用的格式"""
+        wire = COMPACT if self.enabled and requested == COMPACT else JSON
+        self._formats[sid] = wire
+        return wire
+
+    def format_of(self, sid):
+        return self._formats.get(sid, JSON)
+
+    def forget(self, sid):
+        self._formats.pop(sid, None)
+
+    @staticmethod
+    def compact_room(room):
+        # 房间名不允许包含 #，不会与其它房间重名
+        return f'{room}#compact'
+
+    def room_for(self, room, sid):
+        """该连接应当加入的 Socket.IO 房间"""
+        return self.compact_room(room) if self.format_of(sid) == COMPACT else room
+
+    def payload_for(self, sid, payload):
+        return encode(payload) if self.format_of(sid) == COMPACT else payload